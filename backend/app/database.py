@@ -4,7 +4,9 @@ Supports both SQLite (development) and PostgreSQL (Supabase production).
 """
 import os
 import json
+import hashlib
 import sqlite3
+import time
 from typing import Optional, Dict, Any, List
 from contextlib import contextmanager
 from datetime import datetime
@@ -13,16 +15,36 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
-# Try to import psycopg2 for PostgreSQL support
-try:
-    import psycopg2
-    from psycopg2.extras import RealDictCursor
-    PSYCOPG2_AVAILABLE = True
-except ImportError:
-    PSYCOPG2_AVAILABLE = False
+from app.services.metrics import REGISTRY
+from app.services.slow_queries import SlowQueryLog
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./burnout_detection.db")
 IS_POSTGRES = DATABASE_URL.startswith("postgresql://") or DATABASE_URL.startswith("postgres://")
+# Supabase requires SSL; set to "disable" or "prefer" for a local PostgreSQL
+DATABASE_SSLMODE = os.getenv("DATABASE_SSLMODE", "require")
+# Apply the schema on every boot instead of only when schema file changed
+SCHEMA_FORCE_INIT = os.getenv("SCHEMA_FORCE_INIT", "false").lower() in ("1", "true", "yes")
+# Enforce foreign keys on SQLite (PostgreSQL always does) when writes rely on them to reject unknown users
+SQLITE_FOREIGN_KEYS = os.getenv("USER_EXISTENCE_CHECK", "cache").lower() == "foreign_key"
+
+# Import psycopg2 only when PostgreSQL is configured, so SQLite boots skip it
+PSYCOPG2_AVAILABLE = False
+if IS_POSTGRES:
+    try:
+        import psycopg2
+        import psycopg2.extras
+        from psycopg2.extras import RealDictCursor
+        PSYCOPG2_AVAILABLE = True
+    except ImportError:
+        pass
+
+DB_QUERY_LATENCY = REGISTRY.histogram(
+    "db_query_duration_seconds", "execute_query latency by named query", ("query",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+DB_CONNECTIONS_OPENED = REGISTRY.counter(
+    "db_connections_opened_total", "Database connections opened by dialect", ("dialect",)
+).labels("postgresql" if IS_POSTGRES else "sqlite")
 
 
 def get_connection():
@@ -30,16 +52,19 @@ def get_connection():
     Get database connection based on DATABASE_URL.
     Returns SQLite or PostgreSQL connection.
     """
+    DB_CONNECTIONS_OPENED.inc()
     if IS_POSTGRES:
         if not PSYCOPG2_AVAILABLE:
             raise ImportError(
                 "psycopg2 is required for PostgreSQL. Install with: pip install psycopg2-binary"
             )
-        return psycopg2.connect(DATABASE_URL, sslmode="require")
+        return psycopg2.connect(DATABASE_URL, sslmode=DATABASE_SSLMODE)
     else:
         # SQLite connection
         conn = sqlite3.connect(DATABASE_URL.replace("sqlite:///", ""), check_same_thread=False)
         conn.row_factory = sqlite3.Row  # Return rows as dict-like objects
+        if SQLITE_FOREIGN_KEYS:
+            conn.execute("PRAGMA foreign_keys=ON")
         return conn
 
 
@@ -60,7 +85,8 @@ def get_db():
         conn.close()
 
 
-def execute_query(query: str, params: tuple = None, fetch_one: bool = False, fetch_all: bool = False):
+def execute_query(query: str, params: tuple = None, fetch_one: bool = False, fetch_all: bool = False,
+                  name: str = "unnamed"):
     """
     Execute a SQL query and return results.
     
@@ -69,10 +95,54 @@ def execute_query(query: str, params: tuple = None, fetch_one: bool = False, fet
         params: Query parameters tuple
         fetch_one: Return single row
         fetch_all: Return all rows
+        name: Query name used to label timing metrics, e.g. "users.get_by_id"
         
     Returns:
         Query results based on fetch flags
     """
+    return _timed_execute(query, params, fetch_one, fetch_all, name)
+
+
+def execute_insert(query: str, params: tuple = None, name: str = "unnamed") -> int:
+    """
+    Execute an INSERT on SQLite and return the new row id.
+    The id is read from the inserting cursor; last_insert_rowid() is per connection,
+    so a follow-up query on a new connection cannot see it.
+    PostgreSQL callers use INSERT ... RETURNING with execute_query instead.
+    
+    Args:
+        query: SQL INSERT statement
+        params: Query parameters tuple
+        name: Query name used to label timing metrics
+        
+    Returns:
+        Row id of the inserted row
+    """
+    return _timed_execute(query, params, False, False, name, lastrowid=True)
+
+
+def _timed_execute(query: str, params: tuple, fetch_one: bool, fetch_all: bool, name: str,
+                   lastrowid: bool = False):
+    start = time.perf_counter()
+    result = None
+    try:
+        result = _execute(query, params, fetch_one, fetch_all, lastrowid)
+        return result
+    finally:
+        elapsed = time.perf_counter() - start
+        DB_QUERY_LATENCY.labels(name).observe(elapsed)
+
+        if elapsed * 1000 >= SlowQueryLog.THRESHOLD_MS:
+            if fetch_all:
+                rows = len(result or [])
+            elif fetch_one or lastrowid:
+                rows = 1 if result else 0
+            else:
+                rows = result
+            SlowQueryLog.record(name, query, params, elapsed * 1000, rows, explain=explain_query)
+
+
+def _execute(query: str, params: tuple, fetch_one: bool, fetch_all: bool, lastrowid: bool = False):
     with get_db() as conn:
         cursor = conn.cursor()
         
@@ -81,7 +151,9 @@ def execute_query(query: str, params: tuple = None, fetch_one: bool = False, fet
         
         cursor.execute(query, params or ())
         
-        if fetch_one:
+        if lastrowid:
+            return cursor.lastrowid
+        elif fetch_one:
             result = cursor.fetchone()
             if result and not IS_POSTGRES:
                 # Convert SQLite Row to dict
@@ -97,10 +169,105 @@ def execute_query(query: str, params: tuple = None, fetch_one: bool = False, fet
             return cursor.rowcount
 
 
-def init_db():
+def explain_query(query: str, params: tuple = None) -> List[str]:
+    """
+    Get the execution plan of a statement.
+    Uses EXPLAIN (ANALYZE, BUFFERS) for reads on PostgreSQL (plain EXPLAIN for writes)
+    and EXPLAIN QUERY PLAN on SQLite. Always rolled back.
+    
+    Args:
+        query: SQL query string
+        params: Query parameters tuple
+        
+    Returns:
+        Plan lines
+    """
+    statement = query.strip()
+    is_read = statement.split(None, 1)[0].upper() in ("SELECT", "WITH")
+    if IS_POSTGRES:
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) " if is_read else "EXPLAIN "
+    else:
+        prefix = "EXPLAIN QUERY PLAN "
+    
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(prefix + statement, params or ())
+        rows = cursor.fetchall()
+    finally:
+        conn.rollback()
+        conn.close()
+    
+    # PostgreSQL returns one text column; SQLite returns (id, parent, notused, detail)
+    return [row[0] if IS_POSTGRES else row[3] for row in rows]
+
+
+def execute_batch(statements: List[tuple], name: str = "unnamed_batch") -> int:
+    """
+    Execute several parameterized statements, each against many parameter sets,
+    in a single transaction.
+    
+    Args:
+        statements: List of (query, list of params tuples)
+        name: Batch name used to label timing metrics
+        
+    Returns:
+        Total number of affected rows
+    """
+    start = time.perf_counter()
+    affected = 0
+    with get_db() as conn:
+        cursor = conn.cursor()
+        for query, params_seq in statements:
+            if not params_seq:
+                continue
+            if IS_POSTGRES and PSYCOPG2_AVAILABLE:
+                # Sends statements in pages instead of one round trip per row
+                psycopg2.extras.execute_batch(cursor, query, params_seq, page_size=100)
+                affected += len(params_seq)
+            else:
+                cursor.executemany(query, params_seq)
+                affected += cursor.rowcount
+    DB_QUERY_LATENCY.labels(name).observe(time.perf_counter() - start)
+    return affected
+
+
+def applied_schema_checksum(schema_name: str) -> Optional[str]:
+    """
+    Get the checksum of the schema file last applied to this database.
+    
+    Args:
+        schema_name: Schema file name, e.g. "schema.sql"
+        
+    Returns:
+        SHA-256 hex digest, or None if the schema was never applied
+    """
+    placeholder = "%s" if IS_POSTGRES else "?"
+    try:
+        row = execute_query(
+            f"SELECT checksum FROM schema_checksums WHERE schema_file = {placeholder}",
+            (schema_name,),
+            fetch_one=True,
+            name="schema.get_checksum"
+        )
+    except Exception:
+        # Table missing: new database or one created before checksums were recorded
+        return None
+    return row["checksum"] if row else None
+
+
+def init_db(force: bool = False) -> bool:
     """
     Initialize database by creating all tables.
     Reads SQL schema from schema.sql (SQLite) or schema_postgresql.sql (PostgreSQL).
+    The schema file's checksum is recorded once it is applied, and later boots
+    skip the DDL while the file is unchanged.
+    
+    Args:
+        force: Apply the schema even if its checksum matches (or set SCHEMA_FORCE_INIT)
+        
+    Returns:
+        True if the schema was applied, False if it was already up to date
     """
     # Choose schema file based on database type
     if IS_POSTGRES:
@@ -114,6 +281,11 @@ def init_db():
     with open(schema_file, "r", encoding="utf-8") as f:
         schema_sql = f.read()
     
+    schema_name = os.path.basename(schema_file)
+    checksum = hashlib.sha256(schema_sql.encode("utf-8")).hexdigest()
+    if not (force or SCHEMA_FORCE_INIT) and applied_schema_checksum(schema_name) == checksum:
+        return False
+    
     with get_db() as conn:
         cursor = conn.cursor()
         
@@ -164,7 +336,18 @@ def init_db():
                     # Re-raise other errors
                     raise
         
+        placeholder = "%s" if IS_POSTGRES else "?"
+        cursor.execute(
+            f"""
+            INSERT INTO schema_checksums (schema_file, checksum, applied_at)
+            VALUES ({placeholder}, {placeholder}, CURRENT_TIMESTAMP)
+            ON CONFLICT (schema_file) DO UPDATE
+            SET checksum = excluded.checksum, applied_at = excluded.applied_at
+            """,
+            (schema_name, checksum)
+        )
         conn.commit()
+    return True
 
 
 def dict_to_json(value: Any) -> str:
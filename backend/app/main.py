@@ -2,10 +2,26 @@
 FastAPI main application.
 AI-Powered Burnout Detection and Recovery Planning Agent
 """
+# Imported first so the boot phases below are timed
+from app.services.startup_profile import StartupProfiler
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import init_db
-from app.routes import users, assessments, recovery, progress
+from fastapi.responses import PlainTextResponse
+
+StartupProfiler.mark("import fastapi")
+
+from app.database import init_db, IS_POSTGRES
+from app.migrations.runner import MigrationRunner
+from app.middleware.admission import AdmissionMiddleware
+from app.middleware.metrics import MetricsMiddleware, register_routes
+from app.routes import users, assessments, recovery, progress, admin
+from app.services.adaptive_sweep import AdaptiveSweep
+from app.services.metrics import REGISTRY
+from app.services.plan_library import PlanLibrary
+from app.services.retention import HistoryRetention
+
+StartupProfiler.mark("import app modules")
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -26,6 +42,9 @@ else:
     # Default to localhost for development
     allowed_origins = ["http://localhost:3000", "http://127.0.0.1:3000"]
 
+# Rate limits and load shedding (innermost, so rejections carry CORS headers and are counted)
+app.add_middleware(AdmissionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
@@ -34,11 +53,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request metrics (outermost, so latency includes CORS handling)
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(users.router)
 app.include_router(assessments.router)
 app.include_router(recovery.router)
 app.include_router(progress.router)
+app.include_router(admin.router)
+
+StartupProfiler.mark("create app")
 
 
 @app.on_event("startup")
@@ -46,11 +71,51 @@ async def startup_event():
     """
     Initialize database on startup.
     """
+    StartupProfiler.mark("until startup event")
     try:
-        init_db()
-        print("Database initialized successfully")
+        if init_db():
+            print("Database initialized successfully")
+        else:
+            print("Database schema unchanged, initialization skipped")
+        StartupProfiler.mark("init_db")
     except Exception as e:
         print("Database initialization skipped or failed:", e)
+        StartupProfiler.mark("init_db", error=type(e).__name__)
+    
+    # Deployments that migrate in a release step can turn this off
+    if os.getenv("MIGRATE_ON_STARTUP", "true").lower() in ("1", "true", "yes"):
+        try:
+            applied = MigrationRunner.upgrade()
+            StartupProfiler.mark("migrations", applied=len(applied))
+        except Exception as e:
+            print("Database migrations failed:", e)
+            StartupProfiler.mark("migrations", error=type(e).__name__)
+    
+    # Create upcoming history partitions and archive expired months, daily
+    if IS_POSTGRES or HistoryRetention.RETENTION_MONTHS > 0:
+        HistoryRetention.start_background_maintenance()
+    
+    # Nightly adaptive sweep in-process (opt-in; or run it from cron)
+    if AdaptiveSweep.INTERVAL_HOURS > 0:
+        AdaptiveSweep.start_background_sweep()
+    
+    # Pre-register per-route metric labels and start cross-worker snapshots
+    register_routes(app.routes)
+    REGISTRY.start_flusher()
+    
+    # Warm the precomputed plan library in the background (opt-in, uses LLM quota)
+    if os.getenv("PLAN_LIBRARY_WARMUP", "false").lower() in ("1", "true", "yes"):
+        PlanLibrary.start_background_refresh()
+    
+    StartupProfiler.complete()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Write a final metrics snapshot so counters survive worker restarts.
+    """
+    REGISTRY.flush()
 
 
 @app.get("/")
@@ -71,3 +136,15 @@ def health_check():
     Health check endpoint.
     """
     return {"status": "healthy"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Prometheus metrics endpoint (text exposition format).
+    Merges all worker processes when METRICS_MULTIPROC_DIR is set.
+    """
+    return PlainTextResponse(
+        REGISTRY.render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,270 @@
+"""
+Admission control middleware.
+Rejects work early instead of letting bursts queue behind the threadpool and
+LLM calls until everything times out:
+- each user gets a token bucket per route, sized by the route's endpoint
+  class, and each client address a larger one shared by the users behind
+  it; an empty bucket answers 429 with Retry-After
+- each endpoint class (cheap reads, writes, LLM-backed writes) has a
+  concurrency limit; requests wait for a slot up to the class's queue time
+  and are shed with 503 and Retry-After after that, or at once when too many
+  are already waiting
+
+Limits are per worker process.
+"""
+import asyncio
+import json
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.services.metrics import REGISTRY
+from app.services.user_existence import UserExistence
+
+ADMISSION_DECISIONS = REGISTRY.counter(
+    "admission_decisions_total",
+    "Admission control decisions by endpoint class (admitted, rate_limited, shed_queue_full, shed_queue_timeout)",
+    ("endpoint_class", "decision")
+)
+ADMISSION_QUEUE_WAIT = REGISTRY.histogram(
+    "admission_queue_wait_seconds", "Time admitted requests waited for a concurrency slot", ("endpoint_class",)
+)
+ADMISSION_IN_FLIGHT = REGISTRY.gauge(
+    "admission_in_flight", "Requests holding a concurrency slot, by endpoint class", ("endpoint_class",)
+)
+
+DECISIONS = ("admitted", "rate_limited", "shed_queue_full", "shed_queue_timeout")
+
+
+def _env(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+# Endpoint class settings: per-client token bucket (rate per second, burst), concurrency slots,
+# longest wait for a slot and most requests waiting for one
+ENDPOINT_CLASSES = {
+    name: {
+        "rate": _env(f"ADMISSION_{name.upper()}_RATE", rate),
+        "burst": _env(f"ADMISSION_{name.upper()}_BURST", burst),
+        "concurrency": int(_env(f"ADMISSION_{name.upper()}_CONCURRENCY", concurrency)),
+        "queue_seconds": _env(f"ADMISSION_{name.upper()}_QUEUE_MS", queue_ms) / 1000,
+        "max_waiting": int(_env(f"ADMISSION_{name.upper()}_MAX_WAITING", max_waiting)),
+    }
+    for name, rate, burst, concurrency, queue_ms, max_waiting in (
+        ("read", 50, 100, 32, 500, 256),
+        ("write", 10, 30, 16, 1000, 128),
+        ("llm", 0.5, 10, 8, 5000, 32),
+    )
+}
+
+# Requests that generate plans with the LLM; other POST/PUT/PATCH/DELETE requests are writes
+LLM_ROUTES = re.compile(r"^/api/recovery/(generate|regenerate-batch|\d+/regenerate)/?$")
+ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+PATH_USER_ID = re.compile(r"^/api/(?:users|[a-z]+/user)/(\d+)")
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate tokens per second, up to burst.
+    """
+
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst: float):
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, rate: float, burst: float) -> float:
+        """
+        Take one token.
+
+        Returns:
+            0 if a token was taken, otherwise seconds until one is available
+        """
+        now = time.monotonic()
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / rate if rate > 0 else 60.0
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying per-client rate limits and per-class concurrency limits to /api requests.
+    """
+
+    ENABLED = os.getenv("ADMISSION_CONTROL", "true").lower() in ("1", "true", "yes")
+    MAX_BUCKETS = 50_000  # Least recently used client buckets are dropped beyond this
+    # Rate and burst of an address's bucket as a multiple of a user's
+    ADDRESS_FACTOR = _env("ADMISSION_ADDRESS_FACTOR", 10)
+    # Same for the address of an untrusted proxy, which every client behind it shares
+    PROXY_FACTOR = _env("ADMISSION_PROXY_FACTOR", 100)
+
+    def __init__(self, app):
+        self.app = app
+        self._buckets: "OrderedDict[Tuple[str, str, str], TokenBucket]" = OrderedDict()
+        # Created lazily inside the event loop
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._waiting = {name: 0 for name in ENDPOINT_CLASSES}
+        self._decisions = {
+            (name, decision): ADMISSION_DECISIONS.labels(name, decision)
+            for name in ENDPOINT_CLASSES for decision in DECISIONS
+        }
+        self._queue_wait = {name: ADMISSION_QUEUE_WAIT.labels(name) for name in ENDPOINT_CLASSES}
+        self._in_flight = {name: ADMISSION_IN_FLIGHT.labels(name) for name in ENDPOINT_CLASSES}
+        self._warned_untrusted_proxy = False
+
+    @staticmethod
+    def endpoint_class(method: str, path: str) -> Optional[str]:
+        """
+        Endpoint class of a request, or None if admission control does not apply.
+        """
+        if not path.startswith("/api/") or method == "OPTIONS":
+            return None
+        if method in ("GET", "HEAD"):
+            return "read"
+        if method == "POST" and LLM_ROUTES.match(path):
+            return "llm"
+        return "write"
+
+    @staticmethod
+    def claimed_user_id(scope) -> Optional[int]:
+        """
+        User id the request is made for: the X-User-Id header, else a user id in the path.
+        """
+        for name, value in scope.get("headers", ()):
+            if name == b"x-user-id":
+                try:
+                    return int(value)
+                except ValueError:
+                    return None
+        match = PATH_USER_ID.match(scope["path"])
+        return int(match.group(1)) if match else None
+
+    @staticmethod
+    def client_address(scope) -> Tuple[str, bool]:
+        """
+        Client address, and whether it is an untrusted proxy's: the request has
+        X-Forwarded-For but the server kept the peer's address (a trusted proxy's
+        header replaces it, with port 0), so every client behind it shares the address.
+        """
+        client = scope.get("client")
+        if client is None:
+            return "unknown", False
+        proxied = bool(client[1]) and any(name == b"x-forwarded-for" for name, _ in scope.get("headers", ()))
+        return client[0], proxied
+
+    async def client_buckets(self, scope) -> List[Tuple[str, float]]:
+        """
+        Buckets a request draws from, with their size as a multiple of the class's.
+
+        A request for an existing user draws from that user's bucket. Ids are not
+        authenticated, so the address's bucket (ADDRESS_FACTOR times larger) caps
+        what one address gets by cycling user ids. Without a known user, the address
+        bucket is the client's own. Behind an untrusted proxy every client shares the
+        address, so its bucket is PROXY_FACTOR times larger: a ceiling for the proxy
+        rather than a per-client limit. Set FORWARDED_ALLOW_IPS to the proxy instead.
+        """
+        buckets = []
+        user_id = self.claimed_user_id(scope)
+        if user_id is not None:
+            try:
+                known = await run_in_threadpool(UserExistence.exists, user_id)
+            except Exception as e:
+                print("Admission user lookup failed:", e)
+                known = False
+            if known:
+                buckets.append((f"user:{user_id}", 1.0))
+
+        address, proxied = self.client_address(scope)
+        if proxied:
+            if not self._warned_untrusted_proxy:
+                self._warned_untrusted_proxy = True
+                print(f"Admission control: X-Forwarded-For from untrusted proxy {address}; its clients share "
+                      "one address bucket until FORWARDED_ALLOW_IPS includes it")
+            factor = self.PROXY_FACTOR
+        else:
+            factor = self.ADDRESS_FACTOR if buckets else 1.0
+        buckets.append((f"addr:{address}", factor))
+        return buckets
+
+    def _take_token(self, key: Tuple[str, str, str], settings: Dict[str, float], factor: float = 1.0) -> float:
+        rate, burst = settings["rate"] * factor, settings["burst"] * factor
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(burst)
+            if len(self._buckets) > self.MAX_BUCKETS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.take(rate, burst)
+
+    @staticmethod
+    async def _reject(send, status: int, detail: str, retry_after: float):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        name = self.endpoint_class(scope["method"], scope["path"]) if scope["type"] == "http" and self.ENABLED else None
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+        settings = ENDPOINT_CLASSES[name]
+
+        # Per-user and per-address, per-route rate limits (ids in the path are folded into one route)
+        route = ID_SEGMENT.sub("/{id}", scope["path"])
+        wait = 0.0
+        for client, factor in await self.client_buckets(scope):
+            wait = max(wait, self._take_token((client, scope["method"], route), settings, factor))
+        if wait:
+            self._decisions[(name, "rate_limited")].inc()
+            await self._reject(send, 429, "Too many requests, retry later", wait)
+            return
+
+        # Per-class concurrency limit with bounded queueing
+        slots = self._slots.get(name)
+        if slots is None:
+            slots = self._slots[name] = asyncio.Semaphore(settings["concurrency"])
+        if slots.locked():
+            if self._waiting[name] >= settings["max_waiting"]:
+                self._decisions[(name, "shed_queue_full")].inc()
+                await self._reject(send, 503, "Server is busy, retry later", 1)
+                return
+            start = time.perf_counter()
+            self._waiting[name] += 1
+            try:
+                await asyncio.wait_for(slots.acquire(), settings["queue_seconds"])
+            except asyncio.TimeoutError:
+                self._decisions[(name, "shed_queue_timeout")].inc()
+                await self._reject(send, 503, "Server is busy, retry later", 1)
+                return
+            finally:
+                self._waiting[name] -= 1
+            self._queue_wait[name].observe(time.perf_counter() - start)
+        else:
+            await slots.acquire()
+            self._queue_wait[name].observe(0.0)
+
+        self._decisions[(name, "admitted")].inc()
+        self._in_flight[name].inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._in_flight[name].dec()
+            slots.release()
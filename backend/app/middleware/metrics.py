@@ -0,0 +1,86 @@
+"""
+Request metrics middleware.
+Records per-route latency histograms, status counters and in-flight requests
+as a pure ASGI middleware, so responses are not buffered or copied.
+"""
+import time
+from typing import Dict, Tuple
+
+from fastapi.routing import APIRoute
+
+from app.services.metrics import REGISTRY
+
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by method and route template", ("method", "route")
+)
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "HTTP requests by method, route template and status code", ("method", "route", "status")
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "http_requests_in_flight", "HTTP requests currently being served"
+).labels()
+
+UNMATCHED_ROUTE = "unmatched"
+
+# Bound metrics by (method, route) and (method, route, status)
+_latency: Dict[Tuple[str, str], object] = {}
+_requests: Dict[Tuple[str, str, str], object] = {}
+
+
+def register_routes(routes):
+    """
+    Pre-register latency label sets for the API routes so requests only do dict lookups.
+    Docs routes and status counters are created on first use, so idle label sets
+    don't take memory and exposition space.
+    """
+    for route in routes:
+        if not isinstance(route, APIRoute):
+            continue
+        for method in route.methods or ():
+            _latency[(method, route.path)] = HTTP_LATENCY.labels(method, route.path)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request metrics labelled by route template
+    (e.g. /api/users/{user_id}) rather than raw path, keeping label sets bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = ["500"]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            path = route.path if route is not None else UNMATCHED_ROUTE
+            method = scope["method"]
+
+            latency = _latency.get((method, path))
+            if latency is None:
+                latency = _latency.setdefault((method, path), HTTP_LATENCY.labels(method, path))
+            latency.observe(elapsed)
+
+            key = (method, path, status[0])
+            counter = _requests.get(key)
+            if counter is None:
+                counter = _requests.setdefault(key, HTTP_REQUESTS.labels(*key))
+            counter.inc()
@@ -0,0 +1,32 @@
+"""
+Composite (user_id, newest first) indexes for per-user history queries.
+
+History endpoints filter by user_id and sort by created_at/timestamp DESC. With
+single-column indexes that needs a sort of the user's rows (or a bitmap merge on
+PostgreSQL); these indexes return the rows already in order, so LIMIT stops early.
+- assessments: also carries burnout_score and burnout_stage, so score series
+  are answered from the index alone
+- recovery_plans: ends with plan_id, the tie-breaker of the latest-plan-per-user
+  query, which is then index-only
+- progress: ordered by timestamp, the column its history is sorted by
+"""
+from app.migrations.runner import create_index, drop_index
+
+TRANSACTIONAL = False
+
+INDEXES = [
+    ("idx_assessments_user_created", "assessments", ["user_id", "created_at DESC"],
+     ["burnout_score", "burnout_stage"]),
+    ("idx_recovery_plans_user_created", "recovery_plans", ["user_id", "created_at DESC", "plan_id DESC"], []),
+    ("idx_progress_user_timestamp", "progress", ["user_id", "timestamp DESC"], []),
+]
+
+
+def upgrade(cursor, dialect: str):
+    for name, table, columns, include in INDEXES:
+        create_index(cursor, dialect, name, table, columns, include)
+
+
+def downgrade(cursor, dialect: str):
+    for name, _, _, _ in INDEXES:
+        drop_index(cursor, dialect, name)
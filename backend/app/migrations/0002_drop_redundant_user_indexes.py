@@ -0,0 +1,25 @@
+"""
+Drop the single-column user_id indexes covered by the 0001 composite indexes.
+
+Every composite index leads with user_id, so it serves the same lookups
+(including ON DELETE CASCADE from users); the old indexes only added write cost.
+"""
+from app.migrations.runner import create_index, drop_index
+
+TRANSACTIONAL = False
+
+INDEXES = [
+    ("idx_assessments_user_id", "assessments"),
+    ("idx_recovery_plans_user_id", "recovery_plans"),
+    ("idx_progress_user_id", "progress"),
+]
+
+
+def upgrade(cursor, dialect: str):
+    for name, _ in INDEXES:
+        drop_index(cursor, dialect, name)
+
+
+def downgrade(cursor, dialect: str):
+    for name, table in INDEXES:
+        create_index(cursor, dialect, name, table, ["user_id"])
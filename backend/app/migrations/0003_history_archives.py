@@ -0,0 +1,39 @@
+"""
+Manifest of archived history months and the users each archive contains.
+
+The retention job records every exported month here, so archived history can
+be found per user without opening archive files the user has no rows in.
+"""
+
+
+def upgrade(cursor, dialect: str):
+    if dialect == "postgresql":
+        archive_id = "archive_id SERIAL PRIMARY KEY"
+        timestamp = "TIMESTAMP WITH TIME ZONE"
+    else:
+        archive_id = "archive_id INTEGER PRIMARY KEY AUTOINCREMENT"
+        timestamp = "TIMESTAMP"
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS history_archives (
+            {archive_id},
+            table_name VARCHAR(50) NOT NULL,
+            period CHAR(7) NOT NULL,
+            path TEXT NOT NULL,
+            row_count INTEGER NOT NULL,
+            sha256 CHAR(64) NOT NULL,
+            archived_at {timestamp} DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS history_archive_users (
+            user_id INTEGER NOT NULL,
+            archive_id INTEGER NOT NULL REFERENCES history_archives(archive_id) ON DELETE CASCADE,
+            row_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, archive_id)
+        )
+    """)
+
+
+def downgrade(cursor, dialect: str):
+    cursor.execute("DROP TABLE IF EXISTS history_archive_users")
+    cursor.execute("DROP TABLE IF EXISTS history_archives")
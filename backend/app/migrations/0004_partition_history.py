@@ -0,0 +1,179 @@
+"""
+Monthly range partitions for assessments (created_at) and progress (timestamp).
+
+Index size and vacuum cost then follow one month of data, and the retention job
+drops whole months instead of deleting rows. PostgreSQL only: SQLite has no
+partitioning, so this does nothing there and retention deletes rows instead.
+
+Existing rows are copied into the partitioned tables inside this migration's
+transaction, so writes to both tables wait until it commits. On large databases
+run it in a release step (MIGRATE_ON_STARTUP=false, then
+python -m app.migrations.runner upgrade). Later months are created ahead of
+time by HistoryRetention.ensure_partitions.
+
+Assessments created from a schema with typed response columns (or converted
+by migration 0008 before a downgrade) are copied with those columns instead
+of the responses document.
+"""
+from datetime import datetime, timezone
+
+MONTHS_AHEAD = 3
+
+# Typed questionnaire columns of assessments replacing responses, see migration 0008
+RESPONSE_COLUMNS = {
+    "daily_work_hours": "REAL",
+    "sleep_duration": "REAL",
+    "sleep_quality": "SMALLINT",
+    "emotional_exhaustion": "SMALLINT",
+    "motivation_level": "SMALLINT",
+    "screen_time": "REAL",
+    "perceived_stress": "SMALLINT",
+}
+
+TABLES = {
+    "assessments": {
+        "id": "assessment_id",
+        "order_column": "created_at",
+        "columns": ["assessment_id", "user_id", "responses", "burnout_score", "burnout_stage", "created_at"],
+        "definition": """
+            assessment_id INTEGER NOT NULL DEFAULT nextval('{sequence}'),
+            user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            responses JSONB NOT NULL,
+            burnout_score REAL NOT NULL,
+            burnout_stage VARCHAR(50) NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+        """,
+        "indexes": [
+            "CREATE INDEX idx_assessments_user_created ON assessments (user_id, created_at DESC) "
+            "INCLUDE (burnout_score, burnout_stage)",
+            "CREATE INDEX idx_assessments_created_at ON assessments (created_at)",
+        ],
+    },
+    "progress": {
+        "id": "progress_id",
+        "order_column": "timestamp",
+        "columns": ["progress_id", "user_id", "weekly_score", "completion_status", "user_notes", "timestamp"],
+        "definition": """
+            progress_id INTEGER NOT NULL DEFAULT nextval('{sequence}'),
+            user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            weekly_score REAL NOT NULL,
+            completion_status JSONB,
+            user_notes TEXT,
+            timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+        """,
+        "indexes": [
+            "CREATE INDEX idx_progress_user_timestamp ON progress (user_id, timestamp DESC)",
+            "CREATE INDEX idx_progress_timestamp ON progress (timestamp)",
+        ],
+    },
+}
+
+
+def _months(first: datetime, last: datetime):
+    """First day of every month from first to last, in UTC."""
+    year, month = first.year, first.month
+    while (year, month) <= (last.year, last.month):
+        yield datetime(year, month, 1, tzinfo=timezone.utc)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _next_month(start: datetime) -> datetime:
+    return start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+
+
+def _is_partitioned(cursor, table: str) -> bool:
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def _layout(cursor, table: str, spec: dict) -> dict:
+    """The spec of a table, with typed response columns when it has no responses document."""
+    if "responses" not in spec["columns"]:
+        return spec
+    cursor.execute(
+        "SELECT 1 FROM information_schema.columns WHERE table_name = %s "
+        "AND table_schema = current_schema() AND column_name = 'responses'",
+        (table,)
+    )
+    if cursor.fetchone():
+        return spec
+    position = spec["columns"].index("responses")
+    return dict(
+        spec,
+        columns=spec["columns"][:position] + list(RESPONSE_COLUMNS) + spec["columns"][position + 1:],
+        definition=spec["definition"].replace(
+            "responses JSONB NOT NULL,",
+            "".join(f"{column} {column_type} NOT NULL,\n" for column, column_type in RESPONSE_COLUMNS.items())
+        ),
+        indexes=spec["indexes"] + [
+            f"CREATE INDEX idx_{table}_{column} ON {table} ({column})"
+            for column, column_type in RESPONSE_COLUMNS.items() if column_type == "SMALLINT"
+        ],
+    )
+
+
+def _swap(cursor, table: str, spec: dict, partitioned: bool):
+    """Replace a table with a partitioned (or plain) copy holding the same rows and id sequence."""
+    old = f"{table}_{'unpartitioned' if partitioned else 'partitioned'}"
+    spec = _layout(cursor, table, spec)
+    id_column, order_column = spec["id"], spec["order_column"]
+    columns = ", ".join(spec["columns"])
+
+    cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", (table, id_column))
+    sequence = cursor.fetchone()[0] or f"{table}_{id_column}_seq"
+
+    cursor.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+    cursor.execute(f"ALTER TABLE {table} RENAME TO {old}")
+    # Primary key index names are schema-wide, so free the name for the new table
+    cursor.execute(f"ALTER TABLE {old} RENAME CONSTRAINT {table}_pkey TO {old}_pkey")
+    for statement in spec["indexes"]:
+        cursor.execute(f"DROP INDEX IF EXISTS {statement.split()[2]}")
+    # Keep the id sequence when the old table is dropped
+    cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+
+    definition = spec["definition"].format(sequence=sequence)
+    if partitioned:
+        cursor.execute(
+            f"CREATE TABLE {table} ({definition}, PRIMARY KEY ({id_column}, {order_column})) "
+            f"PARTITION BY RANGE ({order_column})"
+        )
+        cursor.execute(f"SELECT MIN({order_column}) FROM {old}")
+        now = datetime.now(timezone.utc)
+        first = cursor.fetchone()[0] or now
+        last = now.replace(year=now.year + (now.month - 1 + MONTHS_AHEAD) // 12,
+                           month=(now.month - 1 + MONTHS_AHEAD) % 12 + 1, day=1)
+        for start in _months(first.astimezone(timezone.utc), last):
+            cursor.execute(
+                f"CREATE TABLE {table}_p{start:%Y_%m} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)",
+                (start, _next_month(start))
+            )
+        # Catches rows outside the created months until HistoryRetention moves them out
+        cursor.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+        select = columns.replace(order_column, f"COALESCE({order_column}, CURRENT_TIMESTAMP)")
+    else:
+        cursor.execute(f"CREATE TABLE {table} ({definition}, PRIMARY KEY ({id_column}))")
+        select = columns
+
+    cursor.execute(f"INSERT INTO {table} ({columns}) SELECT {select} FROM {old}")
+    cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.{id_column}")
+    cursor.execute(f"DROP TABLE {old}")
+    for statement in spec["indexes"]:
+        cursor.execute(statement)
+    cursor.execute(f"ANALYZE {table}")
+
+
+def upgrade(cursor, dialect: str):
+    if dialect != "postgresql":
+        return
+    for table, spec in TABLES.items():
+        if not _is_partitioned(cursor, table):
+            _swap(cursor, table, spec, partitioned=True)
+
+
+def downgrade(cursor, dialect: str):
+    if dialect != "postgresql":
+        return
+    for table, spec in TABLES.items():
+        if _is_partitioned(cursor, table):
+            _swap(cursor, table, spec, partitioned=False)
@@ -0,0 +1,35 @@
+"""
+Per-user running trend statistics for assessment and progress scores.
+
+TrendEngine keeps one row per (user, series) with exponentially decayed sums,
+so each new score updates the trend in O(1) instead of re-reading history.
+Rows are derived data: python -m app.services.trends recompute rebuilds them.
+"""
+
+
+def upgrade(cursor, dialect: str):
+    timestamp = "TIMESTAMP WITH TIME ZONE" if dialect == "postgresql" else "TIMESTAMP"
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS user_trends (
+            user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            series VARCHAR(20) NOT NULL,
+            observations INTEGER NOT NULL DEFAULT 0,
+            last_at DOUBLE PRECISION,
+            last_score REAL,
+            previous_score REAL,
+            weight DOUBLE PRECISION NOT NULL DEFAULT 0,
+            sum_t DOUBLE PRECISION NOT NULL DEFAULT 0,
+            sum_tt DOUBLE PRECISION NOT NULL DEFAULT 0,
+            sum_x DOUBLE PRECISION NOT NULL DEFAULT 0,
+            sum_tx DOUBLE PRECISION NOT NULL DEFAULT 0,
+            sum_xx DOUBLE PRECISION NOT NULL DEFAULT 0,
+            streak_direction VARCHAR(10),
+            streak_length INTEGER NOT NULL DEFAULT 0,
+            updated_at {timestamp} DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, series)
+        )
+    """)
+
+
+def downgrade(cursor, dialect: str):
+    cursor.execute("DROP TABLE IF EXISTS user_trends")
@@ -0,0 +1,53 @@
+"""
+Results of the set-based adaptive sweep over all users.
+
+adaptive_sweeps records each run; adaptive_sweep_results keeps the latest
+progress analysis per user, so the dashboard and batch regeneration can list
+the users needing a plan adjustment without analyzing everyone per request.
+"""
+
+
+def upgrade(cursor, dialect: str):
+    if dialect == "postgresql":
+        sweep_id = "sweep_id SERIAL PRIMARY KEY"
+        timestamp = "TIMESTAMP WITH TIME ZONE"
+    else:
+        sweep_id = "sweep_id INTEGER PRIMARY KEY AUTOINCREMENT"
+        timestamp = "TIMESTAMP"
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS adaptive_sweeps (
+            {sweep_id},
+            status VARCHAR(20) NOT NULL,
+            started_at {timestamp} DEFAULT CURRENT_TIMESTAMP,
+            finished_at {timestamp},
+            users INTEGER NOT NULL DEFAULT 0,
+            needs_adjustment INTEGER NOT NULL DEFAULT 0,
+            trend_counts TEXT,
+            duration_ms REAL,
+            error TEXT
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS adaptive_sweep_results (
+            user_id INTEGER PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
+            sweep_id INTEGER NOT NULL,
+            trend VARCHAR(20) NOT NULL,
+            score_change REAL NOT NULL,
+            needs_adjustment BOOLEAN NOT NULL,
+            current_score REAL,
+            previous_score REAL,
+            slope_per_week REAL,
+            volatility REAL,
+            analyzed_at {timestamp} DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # Keyset pages of the users needing adjustment (dashboard, batch regeneration)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_adaptive_sweep_results_needs "
+        "ON adaptive_sweep_results (needs_adjustment, user_id)"
+    )
+
+
+def downgrade(cursor, dialect: str):
+    cursor.execute("DROP TABLE IF EXISTS adaptive_sweep_results")
+    cursor.execute("DROP TABLE IF EXISTS adaptive_sweeps")
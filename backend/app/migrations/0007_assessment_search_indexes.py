@@ -0,0 +1,80 @@
+"""
+Indexes for filtered assessment search (GET /api/assessments/search).
+
+- (burnout_stage, created_at DESC): stage filters, returned newest first
+- PostgreSQL: a jsonb_path_ops GIN index on responses. Filters on the 1-5
+  scale answers are sent as containment predicates (responses @> ...),
+  which this index answers.
+- SQLite: expression indexes on json_extract() of the 1-5 scale answers.
+  Search queries use the same expressions.
+
+Partitioned tables cannot be indexed CONCURRENTLY; the index is then built
+on every partition in one statement. Databases created from a schema with
+typed response columns have no responses document; only the stage index is
+built there, and migration 0008 indexes the scale columns.
+"""
+from app.migrations.runner import create_index, drop_index
+
+TRANSACTIONAL = False
+
+SCALE_FIELDS = ["sleep_quality", "emotional_exhaustion", "motivation_level", "perceived_stress"]
+
+
+def _is_partitioned(cursor, table: str) -> bool:
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def _has_responses(cursor, dialect: str) -> bool:
+    if dialect == "postgresql":
+        cursor.execute(
+            "SELECT 1 FROM information_schema.columns WHERE table_name = 'assessments' "
+            "AND table_schema = current_schema() AND column_name = 'responses'"
+        )
+    else:
+        cursor.execute("SELECT 1 FROM pragma_table_info('assessments') WHERE name = 'responses'")
+    return cursor.fetchone() is not None
+
+
+def upgrade(cursor, dialect: str):
+    has_responses = _has_responses(cursor, dialect)
+    if dialect == "postgresql":
+        if _is_partitioned(cursor, "assessments"):
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_assessments_stage_created ON assessments (burnout_stage, created_at DESC)"
+            )
+            if has_responses:
+                cursor.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_assessments_responses "
+                    "ON assessments USING GIN (responses jsonb_path_ops)"
+                )
+        else:
+            create_index(cursor, dialect, "idx_assessments_stage_created", "assessments",
+                         ["burnout_stage", "created_at DESC"])
+            if has_responses:
+                cursor.execute(
+                    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_assessments_responses "
+                    "ON assessments USING GIN (responses jsonb_path_ops)"
+                )
+        return
+
+    create_index(cursor, dialect, "idx_assessments_stage_created", "assessments", ["burnout_stage", "created_at DESC"])
+    if not has_responses:
+        return
+    for field in SCALE_FIELDS:
+        create_index(cursor, dialect, f"idx_assessments_{field}", "assessments",
+                     [f"json_extract(responses, '$.{field}')"])
+
+
+def downgrade(cursor, dialect: str):
+    if dialect == "postgresql":
+        for name in ("idx_assessments_stage_created", "idx_assessments_responses"):
+            if _is_partitioned(cursor, "assessments"):
+                cursor.execute(f"DROP INDEX IF EXISTS {name}")
+            else:
+                drop_index(cursor, dialect, name)
+    else:
+        drop_index(cursor, dialect, "idx_assessments_stage_created")
+        for field in SCALE_FIELDS:
+            drop_index(cursor, dialect, f"idx_assessments_{field}")
@@ -0,0 +1,184 @@
+"""
+Store questionnaire responses in typed columns instead of a JSON document.
+
+Each of the seven answers gets its own column: REAL for the hour answers and
+SMALLINT for the 1-5 scales. Existing rows are converted in batches of
+BATCH_ROWS, each committed on its own, so a large table is never locked by one
+long UPDATE; an interrupted run resumes with the rows still unconverted. The
+responses column and the indexes built on it in 0007 are then dropped, and
+the scale answers are indexed directly.
+
+Databases created from the current schema files already have the typed
+columns; there this only adds the scale indexes and the view.
+
+The assessments_with_responses view rebuilds `responses` as JSON for reports
+and ad-hoc SQL written against the old layout.
+
+Code from before this migration cannot insert assessments once it has
+finished, so on rolling deploys run it as the release step of the new code
+(MIGRATE_ON_STARTUP=false, then python -m app.migrations.runner upgrade).
+
+PostgreSQL reclaims the space of the dropped column as rows are rewritten
+(or at once with VACUUM FULL); SQLite reuses the freed pages for new rows.
+"""
+TRANSACTIONAL = False
+
+BATCH_ROWS = 10_000
+
+HOUR_FIELDS = ["daily_work_hours", "sleep_duration", "screen_time"]
+SCALE_FIELDS = ["sleep_quality", "emotional_exhaustion", "motivation_level", "perceived_stress"]
+# Column order of the responses dict
+FIELDS = ["daily_work_hours", "sleep_duration", "sleep_quality", "emotional_exhaustion",
+          "motivation_level", "screen_time", "perceived_stress"]
+
+VIEW = "assessments_with_responses"
+
+
+def _is_partitioned(cursor, table: str) -> bool:
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def _columns(cursor, dialect: str) -> set:
+    if dialect == "postgresql":
+        cursor.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = 'assessments' "
+            "AND table_schema = current_schema()"
+        )
+    else:
+        cursor.execute("SELECT name FROM pragma_table_info('assessments')")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _in_batches(cursor, dialect: str, statement: str) -> int:
+    """
+    Run an UPDATE over assessment_id ranges of BATCH_ROWS, committing each range.
+    statement has two placeholders for the range bounds.
+
+    Returns:
+        The id after the last range
+    """
+    cursor.execute("SELECT MIN(assessment_id), MAX(assessment_id) FROM assessments")
+    first, last = cursor.fetchone()
+    if first is None:
+        return 0
+    for low in range(first, last + 1, BATCH_ROWS):
+        cursor.execute(statement, (low, low + BATCH_ROWS))
+        if dialect != "postgresql":
+            # PostgreSQL runs this migration in autocommit mode
+            cursor.connection.commit()
+    return low + BATCH_ROWS
+
+
+def _responses_json(dialect: str) -> str:
+    """SQL expression rebuilding the responses document from the typed columns."""
+    pairs = ", ".join(f"'{field}', {field}" for field in FIELDS)
+    return f"{'jsonb_build_object' if dialect == 'postgresql' else 'json_object'}({pairs})"
+
+
+def _create_scale_indexes(cursor, dialect: str, expression):
+    partitioned = dialect == "postgresql" and _is_partitioned(cursor, "assessments")
+    concurrently = " CONCURRENTLY" if dialect == "postgresql" and not partitioned else ""
+    for field in SCALE_FIELDS:
+        cursor.execute(
+            f"CREATE INDEX{concurrently} IF NOT EXISTS idx_assessments_{field} ON assessments ({expression(field)})"
+        )
+
+
+def _drop_scale_indexes(cursor, dialect: str):
+    partitioned = dialect == "postgresql" and _is_partitioned(cursor, "assessments")
+    concurrently = " CONCURRENTLY" if dialect == "postgresql" and not partitioned else ""
+    for field in SCALE_FIELDS:
+        cursor.execute(f"DROP INDEX{concurrently} IF EXISTS idx_assessments_{field}")
+
+
+def upgrade(cursor, dialect: str):
+    existing = _columns(cursor, dialect)
+    for field in FIELDS:
+        if field not in existing:
+            column_type = "REAL" if field in HOUR_FIELDS else "SMALLINT"
+            cursor.execute(f"ALTER TABLE assessments ADD COLUMN {field} {column_type}")
+
+    if "responses" in existing:
+        if dialect == "postgresql":
+            assignments = ", ".join(
+                f"{field} = (responses->>'{field}')::{'real' if field in HOUR_FIELDS else 'smallint'}"
+                for field in FIELDS
+            )
+            placeholder = "%s"
+        else:
+            assignments = ", ".join(f"{field} = json_extract(responses, '$.{field}')" for field in FIELDS)
+            placeholder = "?"
+        statement = f"""
+            UPDATE assessments SET {assignments}
+            WHERE assessment_id >= {placeholder} AND assessment_id < {placeholder}
+              AND {FIELDS[0]} IS NULL
+        """
+        converted = _in_batches(cursor, dialect, statement)
+
+        # Rows inserted while the batches ran are converted under a lock, in the transaction dropping the column
+        if dialect == "postgresql":
+            cursor.execute("BEGIN")
+            cursor.execute("LOCK TABLE assessments IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(statement, (converted, 2 ** 62))
+        # 0007's indexes on the JSON document go with the column
+        if dialect == "postgresql":
+            cursor.execute("DROP INDEX IF EXISTS idx_assessments_responses")
+        else:
+            _drop_scale_indexes(cursor, dialect)
+        cursor.execute(f"DROP VIEW IF EXISTS {VIEW}")
+        cursor.execute("ALTER TABLE assessments DROP COLUMN responses")
+        if dialect == "postgresql":
+            for field in FIELDS:
+                cursor.execute(f"ALTER TABLE assessments ALTER COLUMN {field} SET NOT NULL")
+            cursor.execute("COMMIT")
+        else:
+            cursor.connection.commit()
+
+    _create_scale_indexes(cursor, dialect, lambda field: field)
+
+    cursor.execute(f"DROP VIEW IF EXISTS {VIEW}")
+    cursor.execute(
+        f"""
+        CREATE VIEW {VIEW} AS
+        SELECT assessment_id, user_id, {_responses_json(dialect)} AS responses,
+               burnout_score, burnout_stage, created_at
+        FROM assessments
+        """
+    )
+
+
+def downgrade(cursor, dialect: str):
+    cursor.execute(f"DROP VIEW IF EXISTS {VIEW}")
+    existing = _columns(cursor, dialect)
+    if "responses" not in existing:
+        if dialect == "postgresql":
+            cursor.execute("ALTER TABLE assessments ADD COLUMN responses JSONB NOT NULL DEFAULT '{}'")
+        else:
+            cursor.execute("ALTER TABLE assessments ADD COLUMN responses TEXT NOT NULL DEFAULT '{}'")
+    if FIELDS[0] not in existing:
+        return
+
+    placeholder = "%s" if dialect == "postgresql" else "?"
+    _in_batches(
+        cursor, dialect,
+        f"UPDATE assessments SET responses = {_responses_json(dialect)} "
+        f"WHERE assessment_id >= {placeholder} AND assessment_id < {placeholder}"
+    )
+    if dialect == "postgresql":
+        cursor.execute("ALTER TABLE assessments ALTER COLUMN responses DROP DEFAULT")
+
+    _drop_scale_indexes(cursor, dialect)
+    for field in FIELDS:
+        cursor.execute(f"ALTER TABLE assessments DROP COLUMN {field}")
+
+    # Back to the indexes of 0007
+    if dialect == "postgresql":
+        partitioned = _is_partitioned(cursor, "assessments")
+        cursor.execute(
+            f"CREATE INDEX{'' if partitioned else ' CONCURRENTLY'} IF NOT EXISTS idx_assessments_responses "
+            "ON assessments USING GIN (responses jsonb_path_ops)"
+        )
+    else:
+        _create_scale_indexes(cursor, dialect, lambda field: f"json_extract(responses, '$.{field}')")
@@ -0,0 +1 @@
+# Versioned schema migrations (NNNN_name.py modules, applied in order by runner.py)
@@ -0,0 +1,259 @@
+"""
+Versioned migration runner.
+Migrations are modules in this package named NNNN_description.py, applied in
+version order after schema.sql and recorded in the schema_migrations table.
+
+Each module defines:
+    upgrade(cursor, dialect)    apply the change ("postgresql" or "sqlite")
+    downgrade(cursor, dialect)  revert it
+    TRANSACTIONAL               False for statements that cannot run in a
+                                transaction, e.g. CREATE INDEX CONCURRENTLY
+
+Usage (from the backend directory):
+    python -m app.migrations.runner status
+    python -m app.migrations.runner upgrade [--to VERSION]
+    python -m app.migrations.runner downgrade --to VERSION
+"""
+import argparse
+import importlib
+import pkgutil
+import re
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.database import get_connection, IS_POSTGRES
+
+DIALECT = "postgresql" if IS_POSTGRES else "sqlite"
+
+# Arbitrary key for pg_advisory_lock, so concurrently booting workers migrate one at a time
+ADVISORY_LOCK_KEY = 703_712_037
+
+_MODULE_NAME = re.compile(r"^(\d{4})_(\w+)$")
+
+
+def create_index(cursor, dialect: str, name: str, table: str, columns: Sequence[str],
+                 include: Sequence[str] = ()):
+    """
+    Create an index without blocking writes where the database allows it.
+    PostgreSQL builds it CONCURRENTLY (the migration must not be TRANSACTIONAL)
+    and stores include columns as INCLUDE payload; SQLite appends them to the key,
+    which makes the index covering as well.
+
+    Args:
+        cursor: Migration cursor
+        dialect: "postgresql" or "sqlite"
+        name: Index name
+        table: Table name
+        columns: Key columns, e.g. ["user_id", "created_at DESC"]
+        include: Extra columns stored in the index for index-only scans
+    """
+    if dialect == "postgresql":
+        # A failed concurrent build leaves an INVALID index that IF NOT EXISTS would keep
+        cursor.execute(
+            """
+            SELECT i.indisvalid FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = %s
+            """,
+            (name,)
+        )
+        row = cursor.fetchone()
+        if row and not row[0]:
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        include_sql = f" INCLUDE ({', '.join(include)})" if include else ""
+        cursor.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({', '.join(columns)}){include_sql}"
+        )
+    else:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(list(columns) + list(include))})")
+
+
+def drop_index(cursor, dialect: str, name: str):
+    """
+    Drop an index if it exists, CONCURRENTLY on PostgreSQL.
+    """
+    if dialect == "postgresql":
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    else:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class MigrationRunner:
+    """
+    Applies and reverts the migrations in app.migrations.
+    """
+
+    PACKAGE = "app.migrations"
+
+    @classmethod
+    def discover(cls) -> List[Dict[str, Any]]:
+        """
+        Get all migrations, ordered by version.
+
+        Returns:
+            List of dicts with version, name and module
+        """
+        package = importlib.import_module(cls.PACKAGE)
+        migrations = []
+        for info in pkgutil.iter_modules(package.__path__):
+            match = _MODULE_NAME.match(info.name)
+            if not match:
+                continue
+            migrations.append({
+                "version": int(match.group(1)),
+                "name": match.group(2),
+                "module": importlib.import_module(f"{cls.PACKAGE}.{info.name}"),
+            })
+        migrations.sort(key=lambda m: m["version"])
+        versions = [m["version"] for m in migrations]
+        if len(versions) != len(set(versions)):
+            raise RuntimeError(f"Duplicate migration versions in {cls.PACKAGE}: {versions}")
+        return migrations
+
+    @classmethod
+    def applied(cls, cursor) -> Dict[int, Dict[str, Any]]:
+        """Applied migrations by version, read from schema_migrations."""
+        cursor.execute("SELECT version, name, applied_at, duration_ms FROM schema_migrations")
+        return {
+            row[0]: {"version": row[0], "name": row[1], "applied_at": row[2], "duration_ms": row[3]}
+            for row in cursor.fetchall()
+        }
+
+    @classmethod
+    def status(cls) -> List[Dict[str, Any]]:
+        """
+        Get every known migration with whether and when it was applied.
+        """
+        conn = get_connection()
+        try:
+            applied = cls.applied(conn.cursor())
+        finally:
+            conn.rollback()
+            conn.close()
+        return [
+            {
+                "version": m["version"],
+                "name": m["name"],
+                "description": (m["module"].__doc__ or "").strip().split("\n")[0],
+                "applied": m["version"] in applied,
+                "applied_at": applied.get(m["version"], {}).get("applied_at"),
+                "duration_ms": applied.get(m["version"], {}).get("duration_ms"),
+            }
+            for m in cls.discover()
+        ]
+
+    @classmethod
+    def upgrade(cls, target: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Apply pending migrations in order.
+
+        Args:
+            target: Highest version to apply (default: all)
+
+        Returns:
+            Migrations applied by this call, with their duration
+        """
+        migrations = [m for m in cls.discover() if target is None or m["version"] <= target]
+        return cls._run(migrations, "upgrade")
+
+    @classmethod
+    def downgrade(cls, target: int) -> List[Dict[str, Any]]:
+        """
+        Revert applied migrations above a version, newest first.
+
+        Args:
+            target: Version to revert to (0 reverts all)
+
+        Returns:
+            Migrations reverted by this call, with their duration
+        """
+        migrations = [m for m in reversed(cls.discover()) if m["version"] > target]
+        return cls._run(migrations, "downgrade")
+
+    @classmethod
+    def _run(cls, migrations: List[Dict[str, Any]], direction: str) -> List[Dict[str, Any]]:
+        placeholder = "%s" if IS_POSTGRES else "?"
+        done = []
+        conn = get_connection()
+        try:
+            if IS_POSTGRES:
+                # Non-transactional migrations (CONCURRENTLY) need autocommit;
+                # transactional ones open their own transaction below
+                conn.autocommit = True
+            cursor = conn.cursor()
+            if IS_POSTGRES:
+                cursor.execute("SELECT pg_advisory_lock(%s)", (ADVISORY_LOCK_KEY,))
+            try:
+                # Read after taking the lock, so another worker's work is not repeated
+                applied = cls.applied(cursor)
+                for migration in migrations:
+                    is_applied = migration["version"] in applied
+                    if is_applied == (direction == "upgrade"):
+                        continue
+                    start = time.perf_counter()
+                    transactional = getattr(migration["module"], "TRANSACTIONAL", True)
+                    if IS_POSTGRES and transactional:
+                        cursor.execute("BEGIN")
+                    try:
+                        getattr(migration["module"], direction)(cursor, DIALECT)
+                        duration_ms = round((time.perf_counter() - start) * 1000, 1)
+                        if direction == "upgrade":
+                            cursor.execute(
+                                f"""
+                                INSERT INTO schema_migrations (version, name, applied_at, duration_ms)
+                                VALUES ({placeholder}, {placeholder}, CURRENT_TIMESTAMP, {placeholder})
+                                ON CONFLICT (version) DO NOTHING
+                                """,
+                                (migration["version"], migration["name"], duration_ms)
+                            )
+                        else:
+                            cursor.execute(
+                                f"DELETE FROM schema_migrations WHERE version = {placeholder}",
+                                (migration["version"],)
+                            )
+                        if IS_POSTGRES and transactional:
+                            cursor.execute("COMMIT")
+                        elif not IS_POSTGRES:
+                            conn.commit()
+                    except Exception:
+                        if IS_POSTGRES and transactional:
+                            cursor.execute("ROLLBACK")
+                        elif not IS_POSTGRES:
+                            conn.rollback()
+                        raise
+                    print(f"Migration {migration['version']:04d}_{migration['name']} {direction}d "
+                          f"in {duration_ms:.0f}ms")
+                    done.append({"version": migration["version"], "name": migration["name"],
+                                 "duration_ms": duration_ms})
+            finally:
+                if IS_POSTGRES:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_KEY,))
+        finally:
+            conn.close()
+        return done
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Apply or revert versioned schema migrations")
+    parser.add_argument("command", choices=["status", "upgrade", "downgrade"])
+    parser.add_argument("--to", type=int, help="Target version (required for downgrade)")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        for m in MigrationRunner.status():
+            state = f"applied {m['applied_at']} ({m['duration_ms']:.0f}ms)" if m["applied"] else "pending"
+            print(f"{m['version']:04d}_{m['name']:<40} {state}")
+    elif args.command == "upgrade":
+        applied = MigrationRunner.upgrade(args.to)
+        print(f"Applied {len(applied)} migration(s)")
+    else:
+        if args.to is None:
+            parser.error("downgrade requires --to")
+        reverted = MigrationRunner.downgrade(args.to)
+        print(f"Reverted {len(reverted)} migration(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,16 +9,24 @@ USERS_TABLE = "users"
 ASSESSMENTS_TABLE = "assessments"
 RECOVERY_PLANS_TABLE = "recovery_plans"
 PROGRESS_TABLE = "progress"
+PLAN_LIBRARY_TABLE = "plan_library"
+IDEMPOTENCY_KEYS_TABLE = "idempotency_keys"
 
 # Field names for reference
 USER_FIELDS = ["user_id", "name", "age_range", "occupation_type", "created_at"]
-ASSESSMENT_FIELDS = ["assessment_id", "user_id", "responses", "burnout_score", "burnout_stage", "created_at"]
-RECOVERY_PLAN_FIELDS = ["plan_id", "user_id", "recommendations", "created_at", "updated_at"]
+ASSESSMENT_FIELDS = [
+    "assessment_id", "user_id", "daily_work_hours", "sleep_duration", "sleep_quality", "emotional_exhaustion",
+    "motivation_level", "screen_time", "perceived_stress", "burnout_score", "burnout_stage", "created_at"
+]
+RECOVERY_PLAN_FIELDS = ["plan_id", "user_id", "recommendations", "provenance", "created_at", "updated_at"]
 PROGRESS_FIELDS = ["progress_id", "user_id", "weekly_score", "completion_status", "user_notes", "timestamp"]
+PLAN_LIBRARY_FIELDS = ["library_key", "stage_key", "top_factors", "recommendations", "created_at", "updated_at"]
+IDEMPOTENCY_KEY_FIELDS = ["idempotency_key", "request_hash", "status_code", "response", "created_at"]
 
 # JSON fields that need conversion
 JSON_FIELDS = {
-    ASSESSMENTS_TABLE: ["responses"],
-    RECOVERY_PLANS_TABLE: ["recommendations"],
-    PROGRESS_TABLE: ["completion_status"]
+    RECOVERY_PLANS_TABLE: ["recommendations", "provenance"],
+    PROGRESS_TABLE: ["completion_status"],
+    PLAN_LIBRARY_TABLE: ["recommendations"],
+    IDEMPOTENCY_KEYS_TABLE: ["response"]
 }
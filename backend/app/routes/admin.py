@@ -0,0 +1,136 @@
+"""
+Admin and operational routes.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Path, Query
+from app.migrations.runner import MigrationRunner
+from app.services.adaptive_sweep import AdaptiveSweep
+from app.services.ai_agent import AIRecoveryAgent
+from app.services.dedup import PLAN_GENERATION_REQUESTS, dedup_rate
+from app.services.hot_cache import UserHotCache
+from app.services.llm_accounting import LLMAccounting
+from app.services.shared_cache import SharedCache
+from app.services.slow_queries import SlowQueryLog
+from app.services.startup_profile import StartupProfiler
+from app.services.user_existence import UserExistence
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+
+@router.get("/llm/report")
+def get_llm_report():
+    """
+    Token, latency and outcome report for recent LLM calls,
+    including the savings from prompt compaction.
+    """
+    ai_agent = AIRecoveryAgent()
+    report = LLMAccounting.report(prompt_estimate=ai_agent.prompt_compaction_estimate())
+    report["prompt_compaction_enabled"] = ai_agent.PROMPT_COMPACTION
+    return report
+
+
+@router.get("/dedup")
+def get_dedup_stats():
+    """
+    Plan generation requests of the worker that serves this request by dedup
+    outcome, and the fraction served without a new generation.
+    """
+    return {
+        "requests": {
+            outcome: int(PLAN_GENERATION_REQUESTS.get(outcome))
+            for outcome in ("computed", "coalesced", "replayed")
+        },
+        "dedup_rate": dedup_rate(),
+    }
+
+
+@router.get("/queries/slow")
+def get_slow_queries(
+    limit: int = Query(10, ge=1, le=100),
+    sort_by: str = Query("max_ms", pattern="^(max_ms|total_ms|avg_ms|count)$")
+):
+    """
+    Top-N slowest query fingerprints recorded by the slow-query log,
+    with their execution plans.
+    """
+    return {
+        "threshold_ms": SlowQueryLog.THRESHOLD_MS,
+        "queries": SlowQueryLog.top(limit, sort_by)
+    }
+
+
+@router.get("/startup")
+def get_startup_profile():
+    """
+    Boot phase timings of the worker that serves this request.
+    """
+    return StartupProfiler.report()
+
+
+@router.get("/cache")
+def get_cache_stats():
+    """
+    Entries per namespace in the cache shared by this host's workers,
+    and the hit rates of this worker's user existence and hot caches.
+    """
+    return {**SharedCache.stats(), "user_existence": UserExistence.stats(), "hot_cache": UserHotCache.stats()}
+
+
+@router.delete("/cache/{namespace}")
+def clear_cache(namespace: str = Path(..., pattern="^(user|plan|latest_plan|user_version|llm|all)$")):
+    """
+    Invalidate a cache namespace (or all) for every worker on this host.
+    Clearing user_version makes every worker's hot cache entries stale.
+    """
+    removed = SharedCache.clear(None if namespace == "all" else namespace)
+    return {"namespace": namespace, "removed": removed}
+
+
+@router.get("/migrations")
+def get_migrations():
+    """
+    Versioned schema migrations and whether each is applied.
+    """
+    return {"migrations": MigrationRunner.status()}
+
+
+@router.post("/adaptive-sweep", status_code=202)
+def start_adaptive_sweep():
+    """
+    Start an adaptive sweep over all users in the background.
+    """
+    sweep_id = AdaptiveSweep.claim()
+    if sweep_id is None:
+        raise HTTPException(status_code=409, detail="An adaptive sweep is already running")
+    AdaptiveSweep.start_background(sweep_id)
+    return {"sweep_id": sweep_id, "status": "running"}
+
+
+@router.get("/adaptive-sweep")
+def get_adaptive_sweep():
+    """
+    Status and trend counts of the most recent adaptive sweep.
+    """
+    sweep = AdaptiveSweep.latest()
+    if not sweep:
+        raise HTTPException(status_code=404, detail="No adaptive sweep has run yet")
+    return sweep
+
+
+@router.get("/adaptive-sweep/results")
+def get_adaptive_sweep_results(
+    needs_adjustment: Optional[bool] = None,
+    trend: Optional[str] = Query(None, pattern="^(improving|declining|stagnant|stable|insufficient_data)$"),
+    after_user_id: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    Per-user results of the latest sweep, ordered by user_id.
+    Pass the last user_id of a page as after_user_id to get the next one.
+    """
+    results = AdaptiveSweep.results(needs_adjustment, trend, after_user_id, limit)
+    return {
+        "results": results,
+        "next_after_user_id": results[-1]["user_id"] if len(results) == limit else None
+    }
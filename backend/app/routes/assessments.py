@@ -1,16 +1,30 @@
 """
 Assessment routes for burnout evaluation using raw SQL.
 """
-from fastapi import APIRouter, HTTPException
-from app.database import execute_query, row_to_dict, dict_to_json
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from app.database import execute_query, execute_insert, row_to_dict
 from app import schemas, models
+from app.services.retention import HistoryRetention
 from app.services.scoring import BurnoutScoringEngine
 from app.services.classification import BurnoutClassifier
+from app.services.assessment_responses import AssessmentResponses, RESPONSE_COLUMNS
+from app.services.assessment_search import AssessmentSearch, InvalidCursor
+from app.services.fieldsets import Fieldsets
+from app.services.hot_cache import UserHotCache
+from app.services.multi_get import MultiGet
+from app.services.trends import TrendEngine
+from app.services.user_existence import UserExistence
 import os
 import json
 
 router = APIRouter(prefix="/api/assessments", tags=["assessments"])
 
+FIELDS_HELP = "Comma-separated fields to return (default: the response model's fields; `responses` on request)"
+IDS_HELP = "Comma-separated ids (at most MULTI_GET_MAX_IDS, default 100)"
+
 IS_POSTGRES = os.getenv("DATABASE_URL", "").startswith(("postgresql://", "postgres://"))
 
 
@@ -21,11 +35,8 @@ def create_assessment(assessment: schemas.AssessmentCreate):
     Calculates score and classifies burnout stage.
     """
     # Verify user exists
-    user_query = "SELECT * FROM users WHERE user_id = " + ("%s" if IS_POSTGRES else "?")
-    user = execute_query(user_query, params=(assessment.user_id,), fetch_one=True)
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    UserExistence.require(assessment.user_id)
+    version = UserHotCache.version(assessment.user_id)
     
     # Calculate burnout score
     scoring_engine = BurnoutScoringEngine()
@@ -35,73 +46,139 @@ def create_assessment(assessment: schemas.AssessmentCreate):
     classifier = BurnoutClassifier()
     classification = classifier.classify(score_result["score"])
     
-    # Store assessment
-    responses_json = dict_to_json(assessment.responses.dict())
+    # Store assessment, one column per answer
+    params = (assessment.user_id, *AssessmentResponses.values(assessment.responses),
+              score_result["score"], classification["stage"])
     
     if IS_POSTGRES:
-        insert_query = """
-            INSERT INTO assessments (user_id, responses, burnout_score, burnout_stage, created_at)
-            VALUES (%s, %s::jsonb, %s, %s, CURRENT_TIMESTAMP)
+        insert_query = f"""
+            INSERT INTO assessments (user_id, {AssessmentResponses.select_list()}, burnout_score, burnout_stage, created_at)
+            VALUES (%s, {', '.join('%s' for _ in RESPONSE_COLUMNS)}, %s, %s, CURRENT_TIMESTAMP)
             RETURNING assessment_id, user_id, burnout_score, burnout_stage, created_at
         """
-        result = execute_query(
-            insert_query,
-            params=(assessment.user_id, responses_json, score_result["score"], classification["stage"]),
-            fetch_one=True
-        )
-        return row_to_dict(result, json_fields=["responses"])
+        with UserExistence.missing_user_as_404(assessment.user_id):
+            result = execute_query(insert_query, params=params, fetch_one=True, name="assessments.insert")
+        result = row_to_dict(result)
     else:
-        insert_query = """
-            INSERT INTO assessments (user_id, responses, burnout_score, burnout_stage, created_at)
-            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        insert_query = f"""
+            INSERT INTO assessments (user_id, {AssessmentResponses.select_list()}, burnout_score, burnout_stage, created_at)
+            VALUES (?, {', '.join('?' for _ in RESPONSE_COLUMNS)}, ?, ?, CURRENT_TIMESTAMP)
         """
-        execute_query(
-            insert_query,
-            params=(assessment.user_id, responses_json, score_result["score"], classification["stage"])
-        )
+        with UserExistence.missing_user_as_404(assessment.user_id):
+            assessment_id = execute_insert(insert_query, params=params, name="assessments.insert")
         
         # Get the inserted assessment
-        get_query = "SELECT * FROM assessments WHERE assessment_id = (SELECT last_insert_rowid())"
-        result = execute_query(get_query, fetch_one=True)
-        return row_to_dict(result, json_fields=["responses"])
+        columns = Fieldsets.columns("assessment")
+        get_query = f"SELECT {Fieldsets.select_list(columns)} FROM assessments WHERE assessment_id = ?"
+        result = execute_query(get_query, params=(assessment_id,), fetch_one=True, name="assessments.get_by_id")
+        result = Fieldsets.to_dict("assessment", result, columns)
+    
+    TrendEngine.observe(result["user_id"], "assessment", result["burnout_score"], result["created_at"])
+    UserHotCache.written(
+        result["user_id"], version,
+        {"latest_assessment": {**result, "responses": assessment.responses.model_dump()}},
+        drop=("analysis",)
+    )
+    return result
+
+
+@router.get("/", response_model=schemas.AssessmentBatch)
+def get_assessments(ids: str = Query(..., description=IDS_HELP),
+                    fields: Optional[str] = Query(None, description=FIELDS_HELP)):
+    """
+    Get several assessments by ID in one query, in the order requested.
+    Ids that do not exist are listed in `missing`.
+    """
+    columns = Fieldsets.columns("assessment", fields)
+    return Fieldsets.respond(MultiGet.fetch("assessment", MultiGet.parse_ids(ids), columns), fields)
+
+
+@router.get("/search")
+def search_assessments(
+    user_id: Optional[int] = None,
+    stage: Optional[str] = Query(None, pattern="^(Healthy|Early Burnout|Moderate Burnout|Severe Burnout)$"),
+    min_score: Optional[float] = Query(None, ge=0, le=100),
+    max_score: Optional[float] = Query(None, ge=0, le=100),
+    created_after: Optional[datetime] = Query(None, description="Inclusive, UTC unless an offset is given"),
+    created_before: Optional[datetime] = Query(None, description="Exclusive, UTC unless an offset is given"),
+    daily_work_hours_min: Optional[float] = Query(None, ge=0, le=24),
+    daily_work_hours_max: Optional[float] = Query(None, ge=0, le=24),
+    sleep_duration_min: Optional[float] = Query(None, ge=0, le=24),
+    sleep_duration_max: Optional[float] = Query(None, ge=0, le=24),
+    sleep_quality_min: Optional[int] = Query(None, ge=1, le=5),
+    sleep_quality_max: Optional[int] = Query(None, ge=1, le=5),
+    emotional_exhaustion_min: Optional[int] = Query(None, ge=1, le=5),
+    emotional_exhaustion_max: Optional[int] = Query(None, ge=1, le=5),
+    motivation_level_min: Optional[int] = Query(None, ge=1, le=5),
+    motivation_level_max: Optional[int] = Query(None, ge=1, le=5),
+    screen_time_min: Optional[float] = Query(None, ge=0, le=24),
+    screen_time_max: Optional[float] = Query(None, ge=0, le=24),
+    perceived_stress_min: Optional[int] = Query(None, ge=1, le=5),
+    perceived_stress_max: Optional[int] = Query(None, ge=1, le=5),
+    limit: int = Query(50, ge=1, le=AssessmentSearch.MAX_LIMIT),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description=FIELDS_HELP)
+):
+    """
+    Search assessments by score, stage, date, user and questionnaire answers, newest first.
+    Bounds are inclusive; pass next_cursor as cursor to get the next page.
+    """
+    answers = {
+        "daily_work_hours": (daily_work_hours_min, daily_work_hours_max),
+        "sleep_duration": (sleep_duration_min, sleep_duration_max),
+        "sleep_quality": (sleep_quality_min, sleep_quality_max),
+        "emotional_exhaustion": (emotional_exhaustion_min, emotional_exhaustion_max),
+        "motivation_level": (motivation_level_min, motivation_level_max),
+        "screen_time": (screen_time_min, screen_time_max),
+        "perceived_stress": (perceived_stress_min, perceived_stress_max),
+    }
+    answers = {field: bounds for field, bounds in answers.items() if bounds != (None, None)}
+    filters = {
+        "user_id": user_id, "stage": stage, "min_score": min_score, "max_score": max_score,
+        "created_after": created_after, "created_before": created_before,
+    }
+    try:
+        return AssessmentSearch.search(filters, answers, Fieldsets.columns("assessment", fields), limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/{assessment_id}", response_model=schemas.AssessmentResult)
-def get_assessment(assessment_id: int):
+def get_assessment(assessment_id: int, fields: Optional[str] = Query(None, description=FIELDS_HELP)):
     """
     Get assessment by ID.
     """
-    query = "SELECT * FROM assessments WHERE assessment_id = " + ("%s" if IS_POSTGRES else "?")
-    result = execute_query(query, params=(assessment_id,), fetch_one=True)
+    columns = Fieldsets.columns("assessment", fields)
+    query = f"SELECT {Fieldsets.select_list(columns)} FROM assessments WHERE assessment_id = " + ("%s" if IS_POSTGRES else "?")
+    result = execute_query(query, params=(assessment_id,), fetch_one=True, name="assessments.get_by_id")
     
     if not result:
         raise HTTPException(status_code=404, detail="Assessment not found")
     
-    return row_to_dict(result, json_fields=["responses"])
+    return Fieldsets.respond(Fieldsets.to_dict("assessment", result, columns), fields)
 
 
 @router.get("/user/{user_id}", response_model=list[schemas.AssessmentResult])
-def get_user_assessments(user_id: int, skip: int = 0, limit: int = 10):
+def get_user_assessments(user_id: int, skip: int = 0, limit: int = 10, include_archived: bool = False,
+                         fields: Optional[str] = Query(None, description=FIELDS_HELP)):
     """
     Get all assessments for a user, ordered by most recent first.
+    With include_archived, the history continues into months moved to archive files.
+    """
+    columns = Fieldsets.columns("assessment", fields)
+    placeholder = "%s" if IS_POSTGRES else "?"
+    query = f"""
+        SELECT {Fieldsets.select_list(columns)} FROM assessments 
+        WHERE user_id = {placeholder} 
+        ORDER BY created_at DESC 
+        LIMIT {placeholder} OFFSET {placeholder}
     """
-    if IS_POSTGRES:
-        query = """
-            SELECT * FROM assessments 
-            WHERE user_id = %s 
-            ORDER BY created_at DESC 
-            LIMIT %s OFFSET %s
-        """
-    else:
-        query = """
-            SELECT * FROM assessments 
-            WHERE user_id = ? 
-            ORDER BY created_at DESC 
-            LIMIT ? OFFSET ?
-        """
     
-    results = execute_query(query, params=(user_id, limit, skip), fetch_all=True)
-    return [row_to_dict(row, json_fields=["responses"]) for row in results]
+    results = execute_query(query, params=(user_id, limit, skip), fetch_all=True, name="assessments.list_by_user")
+    if include_archived:
+        results = list(results or [])
+        results += HistoryRetention.continue_page("assessments", user_id, skip, limit, len(results))
+    return Fieldsets.respond([Fieldsets.to_dict("assessment", row, columns) for row in results], fields)
 
 
 @router.get("/{assessment_id}/details")
@@ -110,12 +187,12 @@ def get_assessment_details(assessment_id: int):
     Get detailed assessment information including score breakdown and classification.
     """
     query = "SELECT * FROM assessments WHERE assessment_id = " + ("%s" if IS_POSTGRES else "?")
-    result = execute_query(query, params=(assessment_id,), fetch_one=True)
+    result = execute_query(query, params=(assessment_id,), fetch_one=True, name="assessments.get_by_id")
     
     if not result:
         raise HTTPException(status_code=404, detail="Assessment not found")
     
-    assessment = row_to_dict(result, json_fields=["responses"])
+    assessment = AssessmentResponses.to_dict(result)
     
     # Recalculate to get breakdown
     scoring_engine = BurnoutScoringEngine()
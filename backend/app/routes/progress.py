@@ -1,14 +1,26 @@
 """
 Progress tracking routes using raw SQL.
 """
-from fastapi import APIRouter, HTTPException
-from app.database import execute_query, row_to_dict, dict_to_json
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from app.database import execute_query, execute_insert, row_to_dict, dict_to_json
 from app import schemas, models
+from app.services.retention import HistoryRetention
 from app.services.adaptive import AdaptiveFollowUp
+from app.services.fieldsets import Fieldsets
+from app.services.hot_cache import UserHotCache
+from app.services.multi_get import MultiGet
+from app.services.trends import TrendEngine
+from app.services.user_existence import UserExistence
+from app.services.write_buffer import ProgressWriteBuffer, WriteBufferFull
 import os
 
 router = APIRouter(prefix="/api/progress", tags=["progress"])
 
+FIELDS_HELP = "Comma-separated fields to return (default: all fields)"
+IDS_HELP = "Comma-separated ids (at most MULTI_GET_MAX_IDS, default 100)"
+
 IS_POSTGRES = os.getenv("DATABASE_URL", "").startswith(("postgresql://", "postgres://"))
 
 
@@ -18,127 +30,145 @@ def create_progress_record(progress: schemas.ProgressCreate):
     Create a new progress record.
     """
     # Verify user exists
-    user_query = "SELECT * FROM users WHERE user_id = " + ("%s" if IS_POSTGRES else "?")
-    user = execute_query(user_query, params=(progress.user_id,), fetch_one=True)
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    UserExistence.require(progress.user_id)
+    version = UserHotCache.version(progress.user_id)
     
     # Create progress record
     completion_status_json = dict_to_json(progress.completion_status) if progress.completion_status else None
     
+    if ProgressWriteBuffer.ENABLED:
+        # Committed, with its trend statistics, in one transaction with other queued records
+        try:
+            with UserExistence.missing_user_as_404(progress.user_id):
+                result = ProgressWriteBuffer.submit(
+                    progress.user_id, progress.weekly_score, completion_status_json, progress.user_notes
+                )
+        except WriteBufferFull as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+        UserHotCache.written(progress.user_id, version, drop=("analysis",))
+        return result
+    
     if IS_POSTGRES:
         insert_query = """
             INSERT INTO progress (user_id, weekly_score, completion_status, user_notes, timestamp)
             VALUES (%s, %s, %s::jsonb, %s, CURRENT_TIMESTAMP)
             RETURNING progress_id, user_id, weekly_score, completion_status, user_notes, timestamp
         """
-        result = execute_query(
-            insert_query,
-            params=(progress.user_id, progress.weekly_score, completion_status_json, progress.user_notes),
-            fetch_one=True
-        )
-        return row_to_dict(result, json_fields=["completion_status"])
+        with UserExistence.missing_user_as_404(progress.user_id):
+            result = execute_query(
+                insert_query,
+                params=(progress.user_id, progress.weekly_score, completion_status_json, progress.user_notes),
+                fetch_one=True,
+                name="progress.insert"
+            )
+        result = row_to_dict(result, json_fields=["completion_status"])
     else:
         insert_query = """
             INSERT INTO progress (user_id, weekly_score, completion_status, user_notes, timestamp)
             VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
         """
-        execute_query(
-            insert_query,
-            params=(progress.user_id, progress.weekly_score, completion_status_json, progress.user_notes)
-        )
+        with UserExistence.missing_user_as_404(progress.user_id):
+            progress_id = execute_insert(
+                insert_query,
+                params=(progress.user_id, progress.weekly_score, completion_status_json, progress.user_notes),
+                name="progress.insert"
+            )
         
         # Get the inserted progress record
-        get_query = "SELECT * FROM progress WHERE progress_id = (SELECT last_insert_rowid())"
-        result = execute_query(get_query, fetch_one=True)
-        return row_to_dict(result, json_fields=["completion_status"])
+        get_query = "SELECT * FROM progress WHERE progress_id = ?"
+        result = execute_query(get_query, params=(progress_id,), fetch_one=True, name="progress.get_by_id")
+        result = row_to_dict(result, json_fields=["completion_status"])
+    
+    TrendEngine.observe(result["user_id"], "progress", result["weekly_score"], result["timestamp"])
+    UserHotCache.written(progress.user_id, version, drop=("analysis",))
+    return result
+
+
+@router.get("/", response_model=schemas.ProgressBatch)
+def get_progress_records(ids: str = Query(..., description=IDS_HELP),
+                         fields: Optional[str] = Query(None, description=FIELDS_HELP)):
+    """
+    Get several progress records by ID in one query, in the order requested.
+    Ids that do not exist are listed in `missing`.
+    """
+    columns = Fieldsets.columns("progress", fields)
+    return Fieldsets.respond(MultiGet.fetch("progress", MultiGet.parse_ids(ids), columns), fields)
 
 
 @router.get("/user/{user_id}", response_model=list[schemas.ProgressResponse])
-def get_user_progress(user_id: int, skip: int = 0, limit: int = 20):
+def get_user_progress(user_id: int, skip: int = 0, limit: int = 20, include_archived: bool = False,
+                      fields: Optional[str] = Query(None, description=FIELDS_HELP)):
     """
     Get all progress records for a user, ordered by most recent first.
+    With include_archived, the history continues into months moved to archive files.
+    """
+    columns = Fieldsets.columns("progress", fields)
+    placeholder = "%s" if IS_POSTGRES else "?"
+    query = f"""
+        SELECT {Fieldsets.select_list(columns)} FROM progress 
+        WHERE user_id = {placeholder} 
+        ORDER BY timestamp DESC 
+        LIMIT {placeholder} OFFSET {placeholder}
     """
-    if IS_POSTGRES:
-        query = """
-            SELECT * FROM progress 
-            WHERE user_id = %s 
-            ORDER BY timestamp DESC 
-            LIMIT %s OFFSET %s
-        """
-    else:
-        query = """
-            SELECT * FROM progress 
-            WHERE user_id = ? 
-            ORDER BY timestamp DESC 
-            LIMIT ? OFFSET ?
-        """
     
-    results = execute_query(query, params=(user_id, limit, skip), fetch_all=True)
-    return [row_to_dict(row, json_fields=["completion_status"]) for row in results]
+    results = execute_query(query, params=(user_id, limit, skip), fetch_all=True, name="progress.list_by_user")
+    if include_archived:
+        results = list(results or [])
+        results += HistoryRetention.continue_page("progress", user_id, skip, limit, len(results))
+    return Fieldsets.respond([Fieldsets.to_dict("progress", row, columns) for row in results], fields)
 
 
 @router.get("/user/{user_id}/analysis")
 def get_progress_analysis(user_id: int):
     """
     Get progress analysis including trend and recommendations.
+    Served from the per-user hot cache until the user's next assessment or progress record.
     """
-    # Get latest assessment
-    if IS_POSTGRES:
-        assessment_query = """
-            SELECT * FROM assessments 
-            WHERE user_id = %s 
-            ORDER BY created_at DESC 
-            LIMIT 1
-        """
-    else:
-        assessment_query = """
-            SELECT * FROM assessments 
-            WHERE user_id = ? 
-            ORDER BY created_at DESC 
-            LIMIT 1
-        """
+    def load():
+        latest_assessment = UserHotCache.latest_assessment(user_id)
+        if not latest_assessment:
+            return None
+        
+        # Analyze progress
+        adaptive = AdaptiveFollowUp()
+        analysis = adaptive.analyze_progress(user_id, latest_assessment["burnout_score"])
+        
+        # Get progress history
+        progress_history = adaptive.get_user_progress_history(user_id, limit=10)
+        
+        return {
+            "current_score": latest_assessment["burnout_score"],
+            "current_stage": latest_assessment["burnout_stage"],
+            "progress_analysis": analysis,
+            "progress_history": [
+                {
+                    "progress_id": p["progress_id"],
+                    "weekly_score": p["weekly_score"],
+                    "timestamp": p["timestamp"],
+                    "user_notes": p.get("user_notes")
+                }
+                for p in progress_history
+            ]
+        }
     
-    latest_assessment = execute_query(assessment_query, params=(user_id,), fetch_one=True)
+    result = UserHotCache.get(user_id, "analysis", load)
     
-    if not latest_assessment:
+    if not result:
         raise HTTPException(status_code=404, detail="No assessments found for user")
     
-    assessment_dict = row_to_dict(latest_assessment, json_fields=["responses"])
-    
-    # Analyze progress
-    adaptive = AdaptiveFollowUp()
-    analysis = adaptive.analyze_progress(user_id, assessment_dict["burnout_score"])
-    
-    # Get progress history
-    progress_history = adaptive.get_user_progress_history(user_id, limit=10)
-    
-    return {
-        "current_score": assessment_dict["burnout_score"],
-        "current_stage": assessment_dict["burnout_stage"],
-        "progress_analysis": analysis,
-        "progress_history": [
-            {
-                "progress_id": p["progress_id"],
-                "weekly_score": p["weekly_score"],
-                "timestamp": p["timestamp"],
-                "user_notes": p.get("user_notes")
-            }
-            for p in progress_history
-        ]
-    }
+    return result
 
 
 @router.get("/{progress_id}", response_model=schemas.ProgressResponse)
-def get_progress_record(progress_id: int):
+def get_progress_record(progress_id: int, fields: Optional[str] = Query(None, description=FIELDS_HELP)):
     """
     Get progress record by ID.
     """
-    query = "SELECT * FROM progress WHERE progress_id = " + ("%s" if IS_POSTGRES else "?")
-    result = execute_query(query, params=(progress_id,), fetch_one=True)
+    columns = Fieldsets.columns("progress", fields)
+    query = f"SELECT {Fieldsets.select_list(columns)} FROM progress WHERE progress_id = " + ("%s" if IS_POSTGRES else "?")
+    result = execute_query(query, params=(progress_id,), fetch_one=True, name="progress.get_by_id")
     
     if not result:
         raise HTTPException(status_code=404, detail="Progress record not found")
     
-    return row_to_dict(result, json_fields=["completion_status"])
+    return Fieldsets.respond(Fieldsets.to_dict("progress", result, columns), fields)
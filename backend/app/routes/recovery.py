@@ -1,41 +1,95 @@
 """
 Recovery plan routes using raw SQL.
 """
-from fastapi import APIRouter, HTTPException
-from app.database import execute_query, row_to_dict, dict_to_json
+from fastapi import APIRouter, HTTPException, Header, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from typing import Optional
+from app.database import execute_query, execute_insert, row_to_dict, dict_to_json
 from app import schemas, models
 from app.services.ai_agent import AIRecoveryAgent
 from app.services.adaptive import AdaptiveFollowUp
+from app.services.assessment_responses import AssessmentResponses
 from app.services.classification import BurnoutClassifier
+from app.services.entity_cache import EntityCache
+from app.services.fieldsets import Fieldsets
+from app.services.hot_cache import UserHotCache
+from app.services.multi_get import MultiGet
+from app.services.scoring import BurnoutScoringEngine
+from app.services.plan_library import PlanLibrary
+from app.services.dedup import SingleFlight, IdempotencyStore, PLAN_GENERATION_REQUESTS
+from app.services.batch_regeneration import BatchPlanRegenerator
+from app.services.user_existence import UserExistence
 import os
 
 router = APIRouter(prefix="/api/recovery", tags=["recovery"])
 
+FIELDS_HELP = "Comma-separated fields to return (default: all fields)"
+IDS_HELP = "Comma-separated ids (at most MULTI_GET_MAX_IDS, default 100)"
+
 IS_POSTGRES = os.getenv("DATABASE_URL", "").startswith(("postgresql://", "postgres://"))
 
+# Concurrent identical generate requests share one in-flight generation (per worker process)
+plan_generation_flight = SingleFlight()
+
 
 @router.post("/generate", response_model=schemas.RecoveryPlanResponse, status_code=201)
-def generate_recovery_plan(plan_request: schemas.RecoveryPlanCreate):
+def generate_recovery_plan(plan_request: schemas.RecoveryPlanCreate,
+                           idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     """
     Generate a new AI-powered recovery plan based on assessment.
+    Retries with the same Idempotency-Key replay the stored result, and concurrent
+    identical requests share a single generation.
     """
-    # Verify user exists
-    user_query = "SELECT * FROM users WHERE user_id = " + ("%s" if IS_POSTGRES else "?")
-    user = execute_query(user_query, params=(plan_request.user_id,), fetch_one=True)
+    payload = plan_request.dict()
+    request_hash = IdempotencyStore.request_hash(payload)
     
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    if idempotency_key:
+        stored = IdempotencyStore.get(idempotency_key)
+        if stored:
+            if stored["request_hash"] != request_hash:
+                raise HTTPException(
+                    status_code=409,
+                    detail="Idempotency-Key was already used with a different request"
+                )
+            PLAN_GENERATION_REQUESTS.inc("replayed")
+            return JSONResponse(status_code=stored["status_code"], content=stored["response"])
     
-    # Get assessment
-    assessment_query = "SELECT * FROM assessments WHERE assessment_id = " + ("%s" if IS_POSTGRES else "?")
-    assessment = execute_query(assessment_query, params=(plan_request.assessment_id,), fetch_one=True)
+    flight_key = (plan_request.user_id, plan_request.assessment_id, plan_request.personalized)
+    plan, shared = plan_generation_flight.do(flight_key, lambda: _generate_recovery_plan(plan_request))
+    PLAN_GENERATION_REQUESTS.inc("coalesced" if shared else "computed")
     
-    if not assessment:
-        raise HTTPException(status_code=404, detail="Assessment not found")
+    if idempotency_key:
+        IdempotencyStore.store(idempotency_key, request_hash, 201, jsonable_encoder(plan))
+    
+    return plan
+
+
+def _generate_recovery_plan(plan_request: schemas.RecoveryPlanCreate):
+    """
+    Generate and store a recovery plan for an assessment.
+    """
+    # Verify user exists
+    UserExistence.require(plan_request.user_id)
+    version = UserHotCache.version(plan_request.user_id)
     
-    assessment_dict = row_to_dict(assessment, json_fields=["responses"])
+    # Get assessment; plans are usually generated for the user's latest one
+    assessment_dict = UserHotCache.latest_assessment(plan_request.user_id)
+    if not assessment_dict or assessment_dict["assessment_id"] != plan_request.assessment_id:
+        assessment_query = "SELECT * FROM assessments WHERE assessment_id = " + ("%s" if IS_POSTGRES else "?")
+        assessment = execute_query(assessment_query, params=(plan_request.assessment_id,), fetch_one=True, name="assessments.get_by_id")
+        
+        if not assessment:
+            # Without a pre-check (foreign_key mode), tell an unknown user from an unknown assessment
+            if not UserExistence.exists(plan_request.user_id):
+                raise HTTPException(status_code=404, detail="User not found")
+            raise HTTPException(status_code=404, detail="Assessment not found")
+        
+        assessment_dict = AssessmentResponses.to_dict(assessment)
     
     if assessment_dict["user_id"] != plan_request.user_id:
+        if not UserExistence.exists(plan_request.user_id):
+            raise HTTPException(status_code=404, detail="User not found")
         raise HTTPException(status_code=400, detail="Assessment does not belong to user")
     
     # Get classification details
@@ -51,123 +105,151 @@ def generate_recovery_plan(plan_request: schemas.RecoveryPlanCreate):
         "description": classification["description"]
     }
     
-    # Check for progress and adapt if needed
-    adaptive = AdaptiveFollowUp()
-    progress_analysis = adaptive.analyze_progress(plan_request.user_id, assessment_dict["burnout_score"])
+    # Score breakdown drives library lookup and section provenance
+    score_result = BurnoutScoringEngine.calculate_score(schemas.AssessmentResponse(**assessment_dict["responses"]))
     
-    if progress_analysis["needs_adjustment"]:
-        burnout_context = adaptive.generate_adjusted_plan_context(progress_analysis, burnout_context)
+    # Serve a precomputed library plan when personalization isn't required
+    recommendations = None
+    if not plan_request.personalized:
+        top_factors = BurnoutScoringEngine.top_factors(score_result["breakdown"], PlanLibrary.TOP_FACTOR_COUNT)
+        recommendations = PlanLibrary.lookup(classification["stage_key"], top_factors)
     
-    # Generate recovery plan using AI
-    ai_agent = AIRecoveryAgent()
-    recommendations = ai_agent.generate_recovery_plan(burnout_context)
+    if recommendations is None:
+        # Check for progress and adapt if needed
+        adaptive = AdaptiveFollowUp()
+        progress_analysis = adaptive.analyze_progress(plan_request.user_id, assessment_dict["burnout_score"])
+        
+        if progress_analysis["needs_adjustment"]:
+            burnout_context = adaptive.generate_adjusted_plan_context(progress_analysis, burnout_context)
+        
+        # Generate recovery plan using AI
+        ai_agent = AIRecoveryAgent()
+        recommendations = ai_agent.generate_recovery_plan(burnout_context)
     
-    # Store recovery plan
+    # Store recovery plan with the assessment and factors each section came from
     recommendations_json = dict_to_json(recommendations.dict())
+    provenance_json = dict_to_json(AdaptiveFollowUp.build_plan_provenance(
+        assessment_dict["assessment_id"],
+        classification["stage_key"],
+        score_result["breakdown"],
+        list(AIRecoveryAgent.SECTION_FACTORS)
+    ))
     
     if IS_POSTGRES:
         insert_query = """
-            INSERT INTO recovery_plans (user_id, recommendations, created_at)
-            VALUES (%s, %s::jsonb, CURRENT_TIMESTAMP)
-            RETURNING plan_id, user_id, recommendations, created_at, updated_at
+            INSERT INTO recovery_plans (user_id, recommendations, provenance, created_at)
+            VALUES (%s, %s::jsonb, %s::jsonb, CURRENT_TIMESTAMP)
+            RETURNING plan_id, user_id, recommendations, provenance, created_at, updated_at
         """
-        result = execute_query(
-            insert_query,
-            params=(plan_request.user_id, recommendations_json),
-            fetch_one=True
-        )
-        return row_to_dict(result, json_fields=["recommendations"])
+        with UserExistence.missing_user_as_404(plan_request.user_id):
+            result = execute_query(
+                insert_query,
+                params=(plan_request.user_id, recommendations_json, provenance_json),
+                fetch_one=True,
+                name="recovery_plans.insert"
+            )
+        EntityCache.invalidate_plans(user_ids=[plan_request.user_id])
+        plan = row_to_dict(result, json_fields=["recommendations", "provenance"])
+        UserHotCache.written(plan_request.user_id, version, {"latest_plan": plan})
+        return plan
     else:
         insert_query = """
-            INSERT INTO recovery_plans (user_id, recommendations, created_at)
-            VALUES (?, ?, CURRENT_TIMESTAMP)
+            INSERT INTO recovery_plans (user_id, recommendations, provenance, created_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
         """
-        execute_query(insert_query, params=(plan_request.user_id, recommendations_json))
+        with UserExistence.missing_user_as_404(plan_request.user_id):
+            plan_id = execute_insert(
+                insert_query, params=(plan_request.user_id, recommendations_json, provenance_json),
+                name="recovery_plans.insert"
+            )
         
         # Get the inserted plan
-        get_query = "SELECT * FROM recovery_plans WHERE plan_id = (SELECT last_insert_rowid())"
-        result = execute_query(get_query, fetch_one=True)
-        return row_to_dict(result, json_fields=["recommendations"])
+        get_query = "SELECT * FROM recovery_plans WHERE plan_id = ?"
+        result = execute_query(get_query, params=(plan_id,), fetch_one=True, name="recovery_plans.get_by_id")
+        EntityCache.invalidate_plans(user_ids=[plan_request.user_id])
+        plan = row_to_dict(result, json_fields=["recommendations", "provenance"])
+        UserHotCache.written(plan_request.user_id, version, {"latest_plan": plan})
+        return plan
+
+
+@router.post("/regenerate-batch", response_model=schemas.RecoveryPlanBatchResult)
+def regenerate_recovery_plans_batch(batch_request: schemas.RecoveryPlanBatchRegenerate):
+    """
+    Regenerate recovery plans for a cohort of users in one call.
+    Users can be selected by id and/or by filter (e.g. needs_adjustment).
+    """
+    try:
+        return BatchPlanRegenerator.regenerate(
+            user_ids=batch_request.user_ids,
+            only_needing_adjustment=batch_request.filter == "needs_adjustment"
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/", response_model=schemas.RecoveryPlanBatch)
+def get_recovery_plans(ids: str = Query(..., description=IDS_HELP),
+                       fields: Optional[str] = Query(None, description=FIELDS_HELP)):
+    """
+    Get several recovery plans by ID in one query, in the order requested.
+    Ids that do not exist are listed in `missing`.
+    """
+    columns = Fieldsets.columns("plan", fields)
+    return Fieldsets.respond(MultiGet.fetch("plan", MultiGet.parse_ids(ids), columns), fields)
 
 
 @router.get("/user/{user_id}/latest", response_model=schemas.RecoveryPlanResponse)
-def get_latest_recovery_plan(user_id: int):
+def get_latest_recovery_plan(user_id: int, fields: Optional[str] = Query(None, description=FIELDS_HELP)):
     """
     Get the most recent recovery plan for a user.
     """
-    if IS_POSTGRES:
-        query = """
-            SELECT * FROM recovery_plans 
-            WHERE user_id = %s 
-            ORDER BY created_at DESC 
-            LIMIT 1
-        """
-    else:
-        query = """
-            SELECT * FROM recovery_plans 
-            WHERE user_id = ? 
-            ORDER BY created_at DESC 
-            LIMIT 1
-        """
+    columns = Fieldsets.columns("plan", fields)
+    plan = UserHotCache.latest_plan(user_id)
     
-    result = execute_query(query, params=(user_id,), fetch_one=True)
-    
-    if not result:
+    if not plan:
         raise HTTPException(status_code=404, detail="No recovery plan found for user")
     
-    return row_to_dict(result, json_fields=["recommendations"])
+    return Fieldsets.respond(Fieldsets.to_dict("plan", plan, columns), fields)
 
 
 @router.get("/{plan_id}", response_model=schemas.RecoveryPlanResponse)
-def get_recovery_plan(plan_id: int):
+def get_recovery_plan(plan_id: int, fields: Optional[str] = Query(None, description=FIELDS_HELP)):
     """
     Get recovery plan by ID.
     """
-    query = "SELECT * FROM recovery_plans WHERE plan_id = " + ("%s" if IS_POSTGRES else "?")
-    result = execute_query(query, params=(plan_id,), fetch_one=True)
+    columns = Fieldsets.columns("plan", fields)
+    plan = EntityCache.get_plan(plan_id)
     
-    if not result:
+    if not plan:
         raise HTTPException(status_code=404, detail="Recovery plan not found")
     
-    return row_to_dict(result, json_fields=["recommendations"])
+    return Fieldsets.respond(Fieldsets.to_dict("plan", plan, columns), fields)
 
 
 @router.post("/{plan_id}/regenerate")
 def regenerate_recovery_plan(plan_id: int):
     """
     Regenerate a recovery plan (useful for adaptive updates).
+    Only sections whose driving factors changed since the plan's assessment are regenerated,
+    plus the sections a progress adjustment changes when the trend calls for one.
     """
     plan_query = "SELECT * FROM recovery_plans WHERE plan_id = " + ("%s" if IS_POSTGRES else "?")
-    plan = execute_query(plan_query, params=(plan_id,), fetch_one=True)
+    plan = execute_query(plan_query, params=(plan_id,), fetch_one=True, name="recovery_plans.get_by_id")
     
     if not plan:
         raise HTTPException(status_code=404, detail="Recovery plan not found")
     
-    plan_dict = row_to_dict(plan, json_fields=["recommendations"])
+    plan_dict = row_to_dict(plan, json_fields=["recommendations", "provenance"])
+    user_id = plan_dict["user_id"]
+    version = UserHotCache.version(user_id)
+    latest_plan = UserHotCache.latest_plan(user_id)
     
     # Get latest assessment for user
-    if IS_POSTGRES:
-        assessment_query = """
-            SELECT * FROM assessments 
-            WHERE user_id = %s 
-            ORDER BY created_at DESC 
-            LIMIT 1
-        """
-    else:
-        assessment_query = """
-            SELECT * FROM assessments 
-            WHERE user_id = ? 
-            ORDER BY created_at DESC 
-            LIMIT 1
-        """
-    
-    assessment = execute_query(assessment_query, params=(plan_dict["user_id"],), fetch_one=True)
+    assessment_dict = UserHotCache.latest_assessment(user_id)
     
-    if not assessment:
+    if not assessment_dict:
         raise HTTPException(status_code=404, detail="No assessment found for user")
     
-    assessment_dict = row_to_dict(assessment, json_fields=["responses"])
-    
     # Regenerate with adaptive logic
     classifier = BurnoutClassifier()
     classification = classifier.classify(assessment_dict["burnout_score"])
@@ -181,39 +263,74 @@ def regenerate_recovery_plan(plan_id: int):
     }
     
     adaptive = AdaptiveFollowUp()
-    progress_analysis = adaptive.analyze_progress(plan_dict["user_id"], assessment_dict["burnout_score"])
+    progress_analysis = adaptive.analyze_progress(user_id, assessment_dict["burnout_score"])
     
     if progress_analysis["needs_adjustment"]:
         burnout_context = adaptive.generate_adjusted_plan_context(progress_analysis, burnout_context)
     
+    # Diff the new assessment against the one the plan was built from
+    score_result = BurnoutScoringEngine.calculate_score(schemas.AssessmentResponse(**assessment_dict["responses"]))
+    stale_sections = adaptive.stale_sections(
+        plan_dict.get("provenance"), score_result["breakdown"], classification["stage_key"]
+    )
+    if progress_analysis["needs_adjustment"]:
+        # A declining or stagnant trend changes the goals and suggestions even when the factors did not
+        stale_sections = [
+            section for section in AIRecoveryAgent.SECTION_FACTORS
+            if section in stale_sections or section in AIRecoveryAgent.ADJUSTMENT_SECTIONS
+        ]
+    
     ai_agent = AIRecoveryAgent()
-    recommendations = ai_agent.generate_recovery_plan(burnout_context)
+    if len(stale_sections) == len(AIRecoveryAgent.SECTION_FACTORS):
+        recommendations = ai_agent.generate_recovery_plan(burnout_context)
+    elif stale_sections:
+        recommendations = ai_agent.regenerate_sections(
+            burnout_context, stale_sections, plan_dict["recommendations"]
+        )
+    else:
+        # Nothing relevant changed; reuse the whole plan
+        recommendations = schemas.RecoveryRecommendations(**plan_dict["recommendations"])
     
     # Update existing plan
     recommendations_json = dict_to_json(recommendations.dict())
+    provenance_json = dict_to_json(adaptive.build_plan_provenance(
+        assessment_dict["assessment_id"],
+        classification["stage_key"],
+        score_result["breakdown"],
+        stale_sections,
+        previous_provenance=plan_dict.get("provenance")
+    ))
     
     if IS_POSTGRES:
         update_query = """
             UPDATE recovery_plans 
-            SET recommendations = %s::jsonb, updated_at = CURRENT_TIMESTAMP
+            SET recommendations = %s::jsonb, provenance = %s::jsonb, updated_at = CURRENT_TIMESTAMP
             WHERE plan_id = %s
-            RETURNING plan_id, user_id, recommendations, created_at, updated_at
+            RETURNING plan_id, user_id, recommendations, provenance, created_at, updated_at
         """
         result = execute_query(
             update_query,
-            params=(recommendations_json, plan_id),
-            fetch_one=True
+            params=(recommendations_json, provenance_json, plan_id),
+            fetch_one=True,
+            name="recovery_plans.update"
         )
-        return row_to_dict(result, json_fields=["recommendations"])
+        EntityCache.invalidate_plans(plan_ids=[plan_id], user_ids=[user_id])
+        updated = row_to_dict(result, json_fields=["recommendations", "provenance"])
     else:
         update_query = """
             UPDATE recovery_plans 
-            SET recommendations = ?, updated_at = CURRENT_TIMESTAMP
+            SET recommendations = ?, provenance = ?, updated_at = CURRENT_TIMESTAMP
             WHERE plan_id = ?
         """
-        execute_query(update_query, params=(recommendations_json, plan_id))
+        execute_query(update_query, params=(recommendations_json, provenance_json, plan_id), name="recovery_plans.update")
         
         # Get updated plan
         get_query = "SELECT * FROM recovery_plans WHERE plan_id = " + ("%s" if IS_POSTGRES else "?")
-        result = execute_query(get_query, params=(plan_id,), fetch_one=True)
-        return row_to_dict(result, json_fields=["recommendations"])
+        result = execute_query(get_query, params=(plan_id,), fetch_one=True, name="recovery_plans.get_by_id")
+        EntityCache.invalidate_plans(plan_ids=[plan_id], user_ids=[user_id])
+        updated = row_to_dict(result, json_fields=["recommendations", "provenance"])
+    
+    # Only the user's latest plan is held in the hot cache
+    is_latest = latest_plan is not None and latest_plan["plan_id"] == plan_id
+    UserHotCache.written(user_id, version, {"latest_plan": updated} if is_latest else {})
+    return updated
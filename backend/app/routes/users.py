@@ -1,14 +1,21 @@
 """
 User management routes using raw SQL.
 """
-from fastapi import APIRouter, HTTPException
-from app.database import get_db, execute_query, row_to_dict, IS_POSTGRES
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from app.database import get_db, execute_query, execute_insert, row_to_dict, IS_POSTGRES
 from app import schemas, models
+from app.services.entity_cache import EntityCache
+from app.services.user_existence import UserExistence
+from app.services.fieldsets import Fieldsets
 from datetime import datetime
 import json
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
+FIELDS_HELP = "Comma-separated fields to return (default: all fields)"
+
 
 @router.post("/", response_model=schemas.UserResponse, status_code=201)
 def create_user(user: schemas.UserCreate):
@@ -25,10 +32,12 @@ def create_user(user: schemas.UserCreate):
             result = execute_query(
                 query,
                 params=(user.name, user.age_range, user.occupation_type),
-                fetch_one=True
+                fetch_one=True,
+                name="users.insert"
             )
             if not result:
                 raise HTTPException(status_code=500, detail="Failed to create user")
+            UserExistence.remember(result["user_id"])
             return row_to_dict(result)
         else:
             # SQLite
@@ -36,13 +45,16 @@ def create_user(user: schemas.UserCreate):
                 INSERT INTO users (name, age_range, occupation_type, created_at)
                 VALUES (?, ?, ?, CURRENT_TIMESTAMP)
             """
-            execute_query(query, params=(user.name, user.age_range, user.occupation_type))
+            user_id = execute_insert(
+                query, params=(user.name, user.age_range, user.occupation_type), name="users.insert"
+            )
             
             # Get the inserted user
-            get_query = "SELECT * FROM users WHERE user_id = (SELECT last_insert_rowid())"
-            result = execute_query(get_query, fetch_one=True)
+            get_query = "SELECT * FROM users WHERE user_id = ?"
+            result = execute_query(get_query, params=(user_id,), fetch_one=True, name="users.get_by_id")
             if not result:
                 raise HTTPException(status_code=500, detail="Failed to create user")
+            UserExistence.remember(user_id)
             return row_to_dict(result)
     except HTTPException:
         raise
@@ -51,32 +63,27 @@ def create_user(user: schemas.UserCreate):
 
 
 @router.get("/{user_id}", response_model=schemas.UserResponse)
-def get_user(user_id: int):
+def get_user(user_id: int, fields: Optional[str] = Query(None, description=FIELDS_HELP)):
     """
     Get user by ID.
     """
-    if IS_POSTGRES:
-        query = "SELECT * FROM users WHERE user_id = %s"
-    else:
-        query = "SELECT * FROM users WHERE user_id = ?"
-    
-    result = execute_query(query, params=(user_id,), fetch_one=True)
+    columns = Fieldsets.columns("user", fields)
+    user = EntityCache.get_user(user_id)
     
-    if not result:
+    if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return row_to_dict(result)
+    return Fieldsets.respond(Fieldsets.to_dict("user", user, columns), fields)
 
 
 @router.get("/", response_model=list[schemas.UserResponse])
-def list_users(skip: int = 0, limit: int = 100):
+def list_users(skip: int = 0, limit: int = 100, fields: Optional[str] = Query(None, description=FIELDS_HELP)):
     """
     List all users (for testing/admin purposes).
     """
-    if IS_POSTGRES:
-        query = "SELECT * FROM users ORDER BY user_id LIMIT %s OFFSET %s"
-    else:
-        query = "SELECT * FROM users ORDER BY user_id LIMIT ? OFFSET ?"
+    columns = Fieldsets.columns("user", fields)
+    placeholder = "%s" if IS_POSTGRES else "?"
+    query = f"SELECT {Fieldsets.select_list(columns)} FROM users ORDER BY user_id LIMIT {placeholder} OFFSET {placeholder}"
     
-    results = execute_query(query, params=(limit, skip), fetch_all=True)
-    return [row_to_dict(row) for row in results]
+    results = execute_query(query, params=(limit, skip), fetch_all=True, name="users.list")
+    return Fieldsets.respond([Fieldsets.to_dict("user", row, columns) for row in results], fields)
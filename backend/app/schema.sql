@@ -14,7 +14,14 @@ CREATE TABLE IF NOT EXISTS users (
 CREATE TABLE IF NOT EXISTS assessments (
     assessment_id INTEGER PRIMARY KEY AUTOINCREMENT,  -- PostgreSQL: SERIAL PRIMARY KEY
     user_id INTEGER NOT NULL,
-    responses TEXT NOT NULL,  -- JSON stored as TEXT
+    -- Questionnaire answers, one column each (see migration 0008)
+    daily_work_hours REAL NOT NULL,
+    sleep_duration REAL NOT NULL,
+    sleep_quality SMALLINT NOT NULL,
+    emotional_exhaustion SMALLINT NOT NULL,
+    motivation_level SMALLINT NOT NULL,
+    screen_time REAL NOT NULL,
+    perceived_stress SMALLINT NOT NULL,
     burnout_score REAL NOT NULL,
     burnout_stage VARCHAR(50) NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -26,6 +33,7 @@ CREATE TABLE IF NOT EXISTS recovery_plans (
     plan_id INTEGER PRIMARY KEY AUTOINCREMENT,  -- PostgreSQL: SERIAL PRIMARY KEY
     user_id INTEGER NOT NULL,
     recommendations TEXT NOT NULL,  -- JSON stored as TEXT
+    provenance TEXT,  -- JSON stored as TEXT (nullable)
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
@@ -42,10 +50,46 @@ CREATE TABLE IF NOT EXISTS progress (
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
 );
 
+-- Plan library table (precomputed plans per stage and dominant factors)
+CREATE TABLE IF NOT EXISTS plan_library (
+    library_key VARCHAR(200) PRIMARY KEY,
+    stage_key VARCHAR(50) NOT NULL,
+    top_factors VARCHAR(150) NOT NULL,  -- Comma-separated, sorted factor names
+    recommendations TEXT NOT NULL,  -- JSON stored as TEXT
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP
+);
+
+-- Idempotency keys table (stored responses for retried plan generation requests)
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    idempotency_key VARCHAR(255) PRIMARY KEY,
+    request_hash VARCHAR(64) NOT NULL,
+    status_code INTEGER NOT NULL,
+    response TEXT NOT NULL,  -- JSON stored as TEXT
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Checksums of applied schema files (startup skips the DDL while unchanged)
+CREATE TABLE IF NOT EXISTS schema_checksums (
+    schema_file VARCHAR(100) PRIMARY KEY,
+    checksum VARCHAR(64) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Versioned migrations applied after this schema (see app/migrations)
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    duration_ms REAL
+);
+
+-- Add provenance to databases created before it existed (duplicate column error is ignored)
+ALTER TABLE recovery_plans ADD COLUMN provenance TEXT;
+
 -- Create indexes for better query performance
-CREATE INDEX IF NOT EXISTS idx_assessments_user_id ON assessments(user_id);
+-- (per-user history indexes are created by versioned migrations, see app/migrations)
 CREATE INDEX IF NOT EXISTS idx_assessments_created_at ON assessments(created_at);
-CREATE INDEX IF NOT EXISTS idx_recovery_plans_user_id ON recovery_plans(user_id);
 CREATE INDEX IF NOT EXISTS idx_recovery_plans_created_at ON recovery_plans(created_at);
-CREATE INDEX IF NOT EXISTS idx_progress_user_id ON progress(user_id);
 CREATE INDEX IF NOT EXISTS idx_progress_timestamp ON progress(timestamp);
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys(created_at);
@@ -1,7 +1,7 @@
 """
 Pydantic schemas for request/response validation.
 """
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
@@ -57,6 +57,11 @@ class AssessmentResult(BaseModel):
         from_attributes = True
 
 
+class AssessmentBatch(BaseModel):
+    items: List[AssessmentResult]
+    missing: List[int]
+
+
 class AssessmentCreate(BaseModel):
     user_id: int
     responses: AssessmentResponse
@@ -67,6 +72,7 @@ class RecoveryPlanResponse(BaseModel):
     plan_id: int
     user_id: int
     recommendations: Dict[str, Any]
+    provenance: Optional[Dict[str, Any]] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -74,9 +80,40 @@ class RecoveryPlanResponse(BaseModel):
         from_attributes = True
 
 
+class RecoveryPlanBatch(BaseModel):
+    items: List[RecoveryPlanResponse]
+    missing: List[int]
+
+
 class RecoveryPlanCreate(BaseModel):
     user_id: int
     assessment_id: int
+    personalized: bool = Field(
+        True,
+        description="Generate a personalized plan; when false a precomputed library plan may be served"
+    )
+
+
+class RecoveryPlanBatchRegenerate(BaseModel):
+    """
+    Select users for batch regeneration by id list and/or filter.
+    """
+    user_ids: Optional[List[int]] = Field(None, min_length=1)
+    filter: Optional[str] = Field(None, pattern="^needs_adjustment$")
+
+    @model_validator(mode="after")
+    def validate_selection(self):
+        if self.user_ids is None and self.filter is None:
+            raise ValueError("Provide user_ids, filter, or both")
+        return self
+
+
+class RecoveryPlanBatchResult(BaseModel):
+    regenerated: int
+    updated: int
+    created: int
+    llm_requests: int
+    skipped_user_ids: List[int]
 
 
 # Progress Schemas
@@ -99,6 +136,11 @@ class ProgressResponse(BaseModel):
         from_attributes = True
 
 
+class ProgressBatch(BaseModel):
+    items: List[ProgressResponse]
+    missing: List[int]
+
+
 # AI Agent Schemas
 class RecoveryRecommendations(BaseModel):
     """
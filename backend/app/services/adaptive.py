@@ -1,9 +1,12 @@
 """
 Adaptive follow-up logic using raw SQL.
-Compares current and previous burnout scores to adjust recovery plans.
+Classifies burnout score trends from per-user running statistics to adjust recovery plans.
 """
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from app.database import execute_query, row_to_dict
+from app.services.ai_agent import AIRecoveryAgent
+from app.services.assessment_responses import AssessmentResponses
+from app.services.trends import TrendEngine, epoch_seconds
 import os
 
 IS_POSTGRES = os.getenv("DATABASE_URL", "").startswith(("postgresql://", "postgres://"))
@@ -17,6 +20,9 @@ class AdaptiveFollowUp:
     IMPROVEMENT_THRESHOLD = 5.0  # Points improvement considered significant
     REGRESSION_THRESHOLD = 5.0   # Points decline considered regression
     STAGNATION_WEEKS = 2          # Weeks without improvement before adjustment
+    FACTOR_CHANGE_THRESHOLD = 1.0  # Breakdown points change that makes a plan section stale
+    HISTORY_LIMIT = 5             # Assessments loaded per user for batch contexts
+    USER_ID_CHUNK_SIZE = 500      # User ids per IN (...) clause for set-based loads
 
     @staticmethod
     def get_user_assessment_history(user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
@@ -38,36 +44,87 @@ class AdaptiveFollowUp:
                 LIMIT ?
             """
         
-        results = execute_query(query, params=(user_id, limit), fetch_all=True)
-        return [row_to_dict(row, json_fields=["responses"]) for row in results]
+        results = execute_query(query, params=(user_id, limit), fetch_all=True, name="assessments.recent_by_user")
+        return [AssessmentResponses.to_dict(row) for row in results]
+
+    @classmethod
+    def get_recent_assessments_for_users(cls, user_ids: Optional[List[int]] = None,
+                                         per_user: int = None) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Get the most recent assessments for many users with set-based queries.
+        
+        Args:
+            user_ids: Users to load, or None for all users
+            per_user: Assessments per user (default: HISTORY_LIMIT)
+            
+        Returns:
+            Dict mapping user_id to assessments, most recent first
+        """
+        per_user = per_user or cls.HISTORY_LIMIT
+        placeholder = "%s" if IS_POSTGRES else "?"
+        
+        if user_ids is None:
+            chunks = [None]
+        else:
+            chunks = [user_ids[i:i + cls.USER_ID_CHUNK_SIZE] for i in range(0, len(user_ids), cls.USER_ID_CHUNK_SIZE)]
+        
+        history: Dict[int, List[Dict[str, Any]]] = {}
+        for chunk in chunks:
+            if chunk is None:
+                where, params = "", ()
+            elif IS_POSTGRES:
+                where, params = "WHERE user_id = ANY(%s)", (list(chunk),)
+            else:
+                where, params = f"WHERE user_id IN ({', '.join('?' for _ in chunk)})", tuple(chunk)
+            
+            query = f"""
+                SELECT * FROM (
+                    SELECT a.*, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY created_at DESC) AS rn
+                    FROM assessments a
+                    {where}
+                ) ranked
+                WHERE rn <= {placeholder}
+                ORDER BY user_id, rn
+            """
+            results = execute_query(
+                query, params=params + (per_user,), fetch_all=True, name="assessments.recent_for_users"
+            )
+            for row in results or []:
+                assessment = AssessmentResponses.to_dict(row)
+                assessment.pop("rn", None)
+                history.setdefault(assessment["user_id"], []).append(assessment)
+        
+        return history
 
     @staticmethod
     def get_user_progress_history(user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
         """
-        Get user's progress history, ordered by most recent first.
+        Get user's progress history, ordered by most recent first
+        (without completion_status, which the analysis does not use).
         """
         if IS_POSTGRES:
             query = """
-                SELECT * FROM progress 
+                SELECT progress_id, user_id, weekly_score, user_notes, timestamp FROM progress 
                 WHERE user_id = %s 
                 ORDER BY timestamp DESC 
                 LIMIT %s
             """
         else:
             query = """
-                SELECT * FROM progress 
+                SELECT progress_id, user_id, weekly_score, user_notes, timestamp FROM progress 
                 WHERE user_id = ? 
                 ORDER BY timestamp DESC 
                 LIMIT ?
             """
         
-        results = execute_query(query, params=(user_id, limit), fetch_all=True)
-        return [row_to_dict(row, json_fields=["completion_status"]) for row in results]
+        results = execute_query(query, params=(user_id, limit), fetch_all=True, name="progress.recent_by_user")
+        return [row_to_dict(row) for row in results]
 
     @classmethod
     def analyze_progress(cls, user_id: int, current_score: float) -> Dict[str, Any]:
         """
         Analyze user's progress and determine if recovery plan needs adjustment.
+        Reads the user's running trend statistics instead of their history.
         
         Args:
             user_id: User ID
@@ -75,57 +132,110 @@ class AdaptiveFollowUp:
             
         Returns:
             Dict containing:
-                - trend: str (improving, declining, stagnant)
+                - trend: str (improving, declining, stagnant, stable, insufficient_data)
                 - change: float (score change from previous)
                 - recommendation: str (adjustment recommendation)
                 - needs_adjustment: bool
+                - statistics: dict (assessment ewma, slope_per_week, volatility, streak)
+                - progress_statistics: dict (the same for weekly progress scores)
+        """
+        trends = TrendEngine.get(user_id)
+        return cls.analyze_trend(trends["assessment"], current_score, trends["progress"])
+
+    @classmethod
+    def analyze_history(cls, assessments: List[Dict[str, Any]], current_score: float,
+                        trend: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Analyze progress from an already loaded assessment history.
+        
+        Args:
+            assessments: Assessment history, most recent first
+            current_score: Current burnout score
+            trend: Stored assessment trend state, if already loaded; otherwise
+                   it is computed from the given history
+            
+        Returns:
+            Same structure as analyze_progress, without progress_statistics
+        """
+        if trend is None:
+            trend = TrendEngine.fold([
+                (a["burnout_score"], epoch_seconds(a["created_at"])) for a in reversed(assessments)
+            ])
+        return cls.analyze_trend(trend, current_score)
+
+    @classmethod
+    def analyze_trend(cls, trend: Dict[str, Any], current_score: float,
+                      progress_trend: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Classify the trend of an assessment trend state (see TrendEngine).
+        
+        The fitted change of the time-weighted slope must exceed both the
+        threshold and the score's volatility, so a single noisy assessment does
+        not flip the trend; consecutive steps in one direction count as well.
+        
+        Args:
+            trend: Assessment trend state
+            current_score: Current burnout score
+            progress_trend: Progress trend state, reported as progress_statistics
+            
+        Returns:
+            Same structure as analyze_progress
         """
-        assessments = cls.get_user_assessment_history(user_id, limit=5)
+        statistics = TrendEngine.summarize(trend)
+        extra = {"statistics": statistics}
+        if progress_trend is not None:
+            extra["progress_statistics"] = TrendEngine.summarize(progress_trend)
         
-        if len(assessments) < 2:
+        if statistics["observations"] < 2:
             return {
                 "trend": "insufficient_data",
                 "change": 0.0,
                 "recommendation": "Continue with current plan. More data needed for trend analysis.",
-                "needs_adjustment": False
+                "needs_adjustment": False,
+                **extra
             }
         
-        previous_score = assessments[1]["burnout_score"]  # Second most recent
+        previous_score = statistics["previous_score"]  # Second most recent
         change = current_score - previous_score
+        if statistics["fitted_change"] is not None:
+            fitted_change, noise = statistics["fitted_change"], statistics["volatility"]
+        else:
+            # Scores too close together in time have no slope; fall back to the last step
+            fitted_change, noise = change, 0.0
+        streak = statistics["streak"]
         
-        if change <= -cls.IMPROVEMENT_THRESHOLD:
+        if (fitted_change <= -max(cls.IMPROVEMENT_THRESHOLD, noise)
+                or (streak["direction"] == "down" and streak["length"] >= cls.STAGNATION_WEEKS)):
             trend = "improving"
             recommendation = (
                 "Great progress! Your burnout score has improved. "
                 "Continue with current recovery plan and consider maintaining these positive changes."
             )
             needs_adjustment = False
-        elif change >= cls.REGRESSION_THRESHOLD:
+        elif (fitted_change >= max(cls.REGRESSION_THRESHOLD, noise)
+                or (streak["direction"] == "up" and streak["length"] >= cls.STAGNATION_WEEKS)):
             trend = "declining"
             recommendation = (
                 "Your burnout score has increased. This may indicate increased stress or challenges. "
                 "Consider intensifying recovery efforts or consulting a healthcare professional if symptoms persist."
             )
             needs_adjustment = True
+        elif streak["direction"] == "flat" and streak["length"] >= cls.STAGNATION_WEEKS:
+            # No significant step over multiple weeks
+            trend = "stagnant"
+            recommendation = (
+                "Your burnout score has remained relatively stable. "
+                "Consider trying different recovery strategies or increasing intervention intensity."
+            )
+            needs_adjustment = True
+        elif statistics["observations"] >= cls.STAGNATION_WEEKS + 1:
+            trend = "stable"
+            recommendation = "Your score is relatively stable. Continue monitoring and maintaining current efforts."
+            needs_adjustment = False
         else:
-            # Check for stagnation over multiple weeks
-            if len(assessments) >= cls.STAGNATION_WEEKS + 1:
-                recent_scores = [a["burnout_score"] for a in assessments[:cls.STAGNATION_WEEKS + 1]]
-                if all(abs(s - recent_scores[0]) < cls.IMPROVEMENT_THRESHOLD for s in recent_scores):
-                    trend = "stagnant"
-                    recommendation = (
-                        "Your burnout score has remained relatively stable. "
-                        "Consider trying different recovery strategies or increasing intervention intensity."
-                    )
-                    needs_adjustment = True
-                else:
-                    trend = "stable"
-                    recommendation = "Your score is relatively stable. Continue monitoring and maintaining current efforts."
-                    needs_adjustment = False
-            else:
-                trend = "stable"
-                recommendation = "Continue monitoring your progress. More time is needed to assess trends."
-                needs_adjustment = False
+            trend = "stable"
+            recommendation = "Continue monitoring your progress. More time is needed to assess trends."
+            needs_adjustment = False
         
         return {
             "trend": trend,
@@ -133,7 +243,8 @@ class AdaptiveFollowUp:
             "recommendation": recommendation,
             "needs_adjustment": needs_adjustment,
             "previous_score": previous_score,
-            "current_score": current_score
+            "current_score": current_score,
+            **extra
         }
 
     @classmethod
@@ -156,3 +267,63 @@ class AdaptiveFollowUp:
         adjusted_context["progress_recommendation"] = progress_analysis["recommendation"]
         
         return adjusted_context
+
+    @classmethod
+    def changed_factors(cls, previous_breakdown: Dict[str, float],
+                        current_breakdown: Dict[str, float]) -> List[str]:
+        """
+        Get the scoring factors whose contribution changed between two score breakdowns.
+        """
+        return [
+            factor for factor, value in current_breakdown.items()
+            if abs(value - previous_breakdown.get(factor, 0.0)) >= cls.FACTOR_CHANGE_THRESHOLD
+        ]
+
+    @classmethod
+    def stale_sections(cls, provenance: Dict[str, Any], breakdown: Dict[str, float],
+                       stage_key: str) -> List[str]:
+        """
+        Determine which plan sections must be regenerated for a new assessment.
+        
+        Args:
+            provenance: Provenance stored with the existing plan (may be None for legacy plans)
+            breakdown: Score breakdown of the new assessment
+            stage_key: Burnout stage key of the new assessment
+            
+        Returns:
+            List of section names whose driving factors changed
+        """
+        sections = list(AIRecoveryAgent.SECTION_FACTORS)
+        
+        # Legacy plans or stage changes require a full regeneration
+        if not provenance or "breakdown" not in provenance or provenance.get("stage_key") != stage_key:
+            return sections
+        
+        changed = set(cls.changed_factors(provenance["breakdown"], breakdown))
+        return [
+            section for section in sections
+            if changed.intersection(AIRecoveryAgent.SECTION_FACTORS[section])
+        ]
+
+    @staticmethod
+    def build_plan_provenance(assessment_id: int, stage_key: str, breakdown: Dict[str, float],
+                              regenerated_sections: List[str],
+                              previous_provenance: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Build provenance recording which assessment and factors each plan section came from.
+        Sections that were not regenerated keep their previous provenance.
+        """
+        previous_sections = (previous_provenance or {}).get("sections", {})
+        sections = {}
+        for section, factors in AIRecoveryAgent.SECTION_FACTORS.items():
+            if section in regenerated_sections or section not in previous_sections:
+                sections[section] = {"assessment_id": assessment_id, "factors": factors}
+            else:
+                sections[section] = previous_sections[section]
+        
+        return {
+            "assessment_id": assessment_id,
+            "stage_key": stage_key,
+            "breakdown": breakdown,
+            "sections": sections
+        }
@@ -0,0 +1,306 @@
+"""
+Set-based adaptive sweep over all users.
+Computes the analyze_progress outcome (trend, change, needs_adjustment) for
+every user in chunks of user ids and stores it in adaptive_sweep_results, so
+the dashboard and batch regeneration can find the users needing a plan
+adjustment without one analysis request per user.
+
+Each chunk is one primary key range scan of user_trends. Users whose trend
+statistics were never built (e.g. bulk-loaded history) are built first from
+one range scan of their assessments.
+
+Usage (from the backend directory, e.g. nightly from cron):
+    python -m app.services.adaptive_sweep
+"""
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from app.database import execute_batch, execute_query, get_db, json_to_dict, row_to_dict, IS_POSTGRES
+from app.services.adaptive import AdaptiveFollowUp
+from app.services.metrics import REGISTRY
+from app.services.trends import TrendEngine
+
+SWEPT_USERS = REGISTRY.counter(
+    "adaptive_sweep_users_total", "Users analyzed by the adaptive sweep, by trend", ("trend",)
+)
+
+RESULT_COLUMNS = [
+    "user_id", "sweep_id", "trend", "score_change", "needs_adjustment",
+    "current_score", "previous_score", "slope_per_week", "volatility",
+]
+
+
+def _ago(seconds: float):
+    """Timestamp parameter for CURRENT_TIMESTAMP minus seconds, in the column's format."""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=seconds)
+    return cutoff if IS_POSTGRES else cutoff.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class AdaptiveSweep:
+    """
+    Runs the adaptive sweep and reads its results.
+    """
+
+    CHUNK_USERS = int(os.getenv("ADAPTIVE_SWEEP_CHUNK_USERS", "10000"))
+    INTERVAL_HOURS = float(os.getenv("ADAPTIVE_SWEEP_INTERVAL_HOURS", "0"))  # 0: run from cron instead
+    STALE_RUNNING_SECONDS = 6 * 3600  # A "running" sweep older than this died with its process
+
+    # Arbitrary key for pg_advisory_xact_lock, so only one worker starts a sweep
+    ADVISORY_LOCK_KEY = 703_712_041
+
+    _sweep_thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def claim(cls, min_interval_seconds: Optional[float] = None) -> Optional[int]:
+        """
+        Record a new running sweep, unless one is running already.
+
+        Args:
+            min_interval_seconds: Also skip if a sweep completed less than this long ago
+
+        Returns:
+            The new sweep_id, or None if skipped
+        """
+        placeholder = "%s" if IS_POSTGRES else "?"
+        with get_db() as conn:
+            cursor = conn.cursor()
+            if IS_POSTGRES:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", (cls.ADVISORY_LOCK_KEY,))
+            else:
+                cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(
+                f"SELECT COUNT(*) FROM adaptive_sweeps WHERE status = 'running' AND started_at > {placeholder}",
+                (_ago(cls.STALE_RUNNING_SECONDS),)
+            )
+            if cursor.fetchone()[0]:
+                return None
+            if min_interval_seconds:
+                cursor.execute(
+                    f"SELECT COUNT(*) FROM adaptive_sweeps WHERE status = 'completed' AND started_at > {placeholder}",
+                    (_ago(min_interval_seconds),)
+                )
+                if cursor.fetchone()[0]:
+                    return None
+            if IS_POSTGRES:
+                cursor.execute(
+                    "INSERT INTO adaptive_sweeps (status, started_at) VALUES ('running', CURRENT_TIMESTAMP) "
+                    "RETURNING sweep_id"
+                )
+                return cursor.fetchone()[0]
+            cursor.execute("INSERT INTO adaptive_sweeps (status, started_at) VALUES ('running', CURRENT_TIMESTAMP)")
+            return cursor.lastrowid
+
+    @classmethod
+    def analyze_range(cls, sweep_id: int, first: int, last: int) -> List[tuple]:
+        """
+        Analyze every user with assessments in a user id range.
+
+        Returns:
+            Result rows in RESULT_COLUMNS order
+        """
+        TrendEngine.rebuild_range("assessment", first, last, missing_only=True)
+        rows = []
+        for user_id, state in TrendEngine.get_range("assessment", first, last).items():
+            if not state["observations"]:
+                continue
+            # The latest assessment is the current score, as on the analysis endpoint
+            analysis = AdaptiveFollowUp.analyze_trend(state, state["last_score"])
+            statistics = analysis["statistics"]
+            rows.append((
+                user_id, sweep_id, analysis["trend"], analysis["change"], analysis["needs_adjustment"],
+                state["last_score"], state["previous_score"],
+                statistics["slope_per_week"], statistics["volatility"],
+            ))
+        return rows
+
+    @classmethod
+    def execute(cls, sweep_id: int) -> Dict[str, Any]:
+        """
+        Run a claimed sweep over all users, replacing each chunk's results in one transaction.
+
+        Returns:
+            Summary dict with sweep_id, users, needs_adjustment, trend counts and duration
+        """
+        placeholder = "%s" if IS_POSTGRES else "?"
+        start = time.perf_counter()
+        trend_counts: Dict[str, int] = {}
+        users = needs_adjustment = 0
+        insert_query = f"""
+            INSERT INTO adaptive_sweep_results ({', '.join(RESULT_COLUMNS)}, analyzed_at)
+            VALUES ({', '.join(placeholder for _ in RESULT_COLUMNS)}, CURRENT_TIMESTAMP)
+        """
+        delete_query = f"DELETE FROM adaptive_sweep_results WHERE user_id BETWEEN {placeholder} AND {placeholder}"
+        try:
+            low, high = TrendEngine.user_id_bounds()
+            if low is not None:
+                for first in range(low, high + 1, cls.CHUNK_USERS):
+                    last = first + cls.CHUNK_USERS - 1
+                    rows = cls.analyze_range(sweep_id, first, last)
+                    execute_batch([(delete_query, [(first, last)]), (insert_query, rows)], name="adaptive_sweep.write")
+                    for row in rows:
+                        trend_counts[row[2]] = trend_counts.get(row[2], 0) + 1
+                        needs_adjustment += bool(row[4])
+                    users += len(rows)
+        except Exception as e:
+            cls._finish(sweep_id, "failed", users, needs_adjustment, trend_counts, start, error=str(e))
+            raise
+
+        for trend, count in trend_counts.items():
+            SWEPT_USERS.inc(trend, amount=count)
+        duration_ms = cls._finish(sweep_id, "completed", users, needs_adjustment, trend_counts, start)
+        print(f"Adaptive sweep {sweep_id}: {users} users, {needs_adjustment} need adjustment, {duration_ms:.0f}ms")
+        return {"sweep_id": sweep_id, "users": users, "needs_adjustment": needs_adjustment,
+                "trend_counts": trend_counts, "duration_ms": duration_ms}
+
+    @classmethod
+    def _finish(cls, sweep_id: int, status: str, users: int, needs_adjustment: int,
+                trend_counts: Dict[str, int], start: float, error: str = None) -> float:
+        placeholder = "%s" if IS_POSTGRES else "?"
+        duration_ms = round((time.perf_counter() - start) * 1000, 1)
+        execute_query(
+            f"""
+            UPDATE adaptive_sweeps
+            SET status = {placeholder}, finished_at = CURRENT_TIMESTAMP, users = {placeholder},
+                needs_adjustment = {placeholder}, trend_counts = {placeholder}, duration_ms = {placeholder},
+                error = {placeholder}
+            WHERE sweep_id = {placeholder}
+            """,
+            params=(status, users, needs_adjustment, json.dumps(trend_counts), duration_ms, error, sweep_id),
+            name="adaptive_sweeps.finish"
+        )
+        return duration_ms
+
+    @classmethod
+    def run(cls, min_interval_seconds: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Claim and run a sweep.
+
+        Args:
+            min_interval_seconds: Skip if a sweep completed less than this long ago
+
+        Returns:
+            Summary dict (see execute), or {"skipped": reason}
+        """
+        sweep_id = cls.claim(min_interval_seconds)
+        if sweep_id is None:
+            return {"skipped": "a sweep is running or completed recently"}
+        return cls.execute(sweep_id)
+
+    @classmethod
+    def start_background(cls, sweep_id: int) -> threading.Thread:
+        """
+        Run a claimed sweep in a daemon thread (admin endpoint).
+        """
+        def sweep():
+            try:
+                cls.execute(sweep_id)
+            except Exception as e:
+                print("Adaptive sweep failed:", e)
+
+        thread = threading.Thread(target=sweep, name=f"adaptive-sweep-{sweep_id}", daemon=True)
+        thread.start()
+        return thread
+
+    @classmethod
+    def start_background_sweep(cls) -> threading.Thread:
+        """
+        Sweep every ADAPTIVE_SWEEP_INTERVAL_HOURS in a daemon thread.
+        Workers check hourly; the first to find the last sweep older than the
+        interval runs the next one.
+        """
+        if cls._sweep_thread and cls._sweep_thread.is_alive():
+            return cls._sweep_thread
+        interval = cls.INTERVAL_HOURS * 3600
+
+        def sweep_loop():
+            while True:
+                try:
+                    cls.run(min_interval_seconds=interval)
+                except Exception as e:
+                    print("Adaptive sweep failed:", e)
+                time.sleep(min(interval, 3600))
+
+        cls._sweep_thread = threading.Thread(target=sweep_loop, name="adaptive-sweep", daemon=True)
+        cls._sweep_thread.start()
+        return cls._sweep_thread
+
+    @staticmethod
+    def latest() -> Optional[Dict[str, Any]]:
+        """
+        Get the most recent sweep, or None if none has run.
+        """
+        row = execute_query(
+            "SELECT * FROM adaptive_sweeps ORDER BY sweep_id DESC LIMIT 1", fetch_one=True, name="adaptive_sweeps.latest"
+        )
+        if not row:
+            return None
+        sweep = row_to_dict(row)
+        sweep["trend_counts"] = json_to_dict(sweep["trend_counts"]) if sweep["trend_counts"] else {}
+        return sweep
+
+    @staticmethod
+    def results(needs_adjustment: Optional[bool] = None, trend: Optional[str] = None,
+                after_user_id: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Get stored results ordered by user_id, one keyset page at a time.
+
+        Args:
+            needs_adjustment: Keep only users with this needs_adjustment value
+            trend: Keep only users with this trend
+            after_user_id: Return users after this id (the last user_id of the previous page)
+            limit: Page size
+        """
+        placeholder = "%s" if IS_POSTGRES else "?"
+        conditions, params = [f"user_id > {placeholder}"], [after_user_id]
+        if needs_adjustment is not None:
+            conditions.append(f"needs_adjustment = {placeholder}")
+            params.append(needs_adjustment)
+        if trend is not None:
+            conditions.append(f"trend = {placeholder}")
+            params.append(trend)
+        rows = execute_query(
+            f"""
+            SELECT * FROM adaptive_sweep_results
+            WHERE {' AND '.join(conditions)}
+            ORDER BY user_id
+            LIMIT {placeholder}
+            """,
+            params=tuple(params) + (limit,), fetch_all=True, name="adaptive_sweep_results.page"
+        )
+        results = []
+        for row in rows or []:
+            result = row_to_dict(row)
+            result["change"] = result.pop("score_change")
+            result["needs_adjustment"] = bool(result["needs_adjustment"])
+            results.append(result)
+        return results
+
+    @staticmethod
+    def needing_adjustment_user_ids() -> Optional[List[int]]:
+        """
+        Users the latest completed sweep found needing adjustment, or None if no sweep completed.
+        """
+        placeholder = "%s" if IS_POSTGRES else "?"
+        completed = execute_query(
+            "SELECT sweep_id FROM adaptive_sweeps WHERE status = 'completed' LIMIT 1",
+            fetch_one=True, name="adaptive_sweeps.any_completed"
+        )
+        if not completed:
+            return None
+        rows = execute_query(
+            f"SELECT user_id FROM adaptive_sweep_results WHERE needs_adjustment = {placeholder} ORDER BY user_id",
+            params=(True,), fetch_all=True, name="adaptive_sweep_results.needing_adjustment"
+        )
+        return [row["user_id"] for row in rows or []]
+
+
+if __name__ == "__main__":
+    # Scheduled entry point, e.g. nightly `python -m app.services.adaptive_sweep`
+    result = AdaptiveSweep.run()
+    print(result)
+    sys.exit(0 if "skipped" not in result else 1)
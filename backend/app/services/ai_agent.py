@@ -4,8 +4,13 @@ Generates personalized recovery recommendations using Google Gemini API.
 """
 import os
 import json
-from typing import Dict, Any, Optional
+import hashlib
+import threading
+import time
+from typing import Dict, Any, List, Optional
 from app.schemas import RecoveryRecommendations, AssessmentResponse
+from app.services.llm_accounting import LLMAccounting, estimate_tokens
+from app.services.shared_cache import SharedCache
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,18 +22,110 @@ class AIRecoveryAgent:
     Uses Google Gemini API (free tier available).
     """
     
+    MAX_OUTPUT_TOKENS = 1000  # Output token budget per generated plan
+
+    # Send static plan instructions once as a system segment and keep the per-request prompt minimal
+    PROMPT_COMPACTION = os.getenv("LLM_PROMPT_COMPACTION", "true").lower() in ("1", "true", "yes")
+
+    # Reuse parsed responses to identical prompts across workers (0 disables)
+    LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+
+    SYSTEM_PREFIX = "You are a supportive wellness assistant. Always respond with valid JSON only."
+
+    PLAN_JSON_FORMAT = """{
+    "daily_actions": ["action 1", "action 2", "action 3"],
+    "weekly_goals": ["goal 1", "goal 2", "goal 3"],
+    "behavioral_suggestions": ["suggestion 1", "suggestion 2"],
+    "caution_notes": ["note 1", "note 2"],
+    "disclaimer": "This is not medical advice. Please consult a healthcare professional for severe symptoms."
+}"""
+
+    ETHICAL_CONSTRAINTS = """CRITICAL ETHICAL CONSTRAINTS:
+1. DO NOT provide medical diagnosis or treatment advice
+2. DO NOT use alarming or judgmental language
+3. DO use supportive, empathetic, and neutral tone
+4. DO encourage professional help if burnout is severe (score > 75)
+5. DO focus on lifestyle adjustments, self-care, and stress management
+6. DO provide actionable, realistic recommendations"""
+
+    # Prompt line for each scoring factor: (response field, template)
+    FACTOR_PROMPT_LINES = {
+        "work_hours": ("daily_work_hours", "Daily work hours: {} hours"),
+        "sleep_duration": ("sleep_duration", "Sleep duration: {} hours"),
+        "sleep_quality": ("sleep_quality", "Sleep quality: {}/5"),
+        "emotional_exhaustion": ("emotional_exhaustion", "Emotional exhaustion: {}/5"),
+        "motivation": ("motivation_level", "Motivation level: {}/5"),
+        "screen_time": ("screen_time", "Screen time: {} hours/day"),
+        "perceived_stress": ("perceived_stress", "Perceived stress: {}/5"),
+    }
+
+    # Requirement line for each plan section
+    SECTION_REQUIREMENTS = {
+        "daily_actions": "Provide 3-5 daily actions (small, achievable micro-actions)",
+        "weekly_goals": "Provide 2-3 weekly goals (broader recovery objectives)",
+        "behavioral_suggestions": "Provide 2-4 behavioral suggestions (lifestyle adjustments)",
+        "caution_notes": "Include caution notes if score > 75 (encouraging professional consultation)",
+    }
+
+    # Sections a progress adjustment (declining or stagnant trend) changes, whatever the factors
+    ADJUSTMENT_SECTIONS = ["weekly_goals", "behavioral_suggestions", "caution_notes"]
+
+    # Compact context label for each scoring factor: (response field, template)
+    COMPACT_FACTOR_LABELS = {
+        "work_hours": ("daily_work_hours", "work {}h/day"),
+        "sleep_duration": ("sleep_duration", "sleep {}h"),
+        "sleep_quality": ("sleep_quality", "sleep quality {}/5"),
+        "emotional_exhaustion": ("emotional_exhaustion", "exhaustion {}/5"),
+        "motivation": ("motivation_level", "motivation {}/5"),
+        "screen_time": ("screen_time", "screen {}h/day"),
+        "perceived_stress": ("perceived_stress", "stress {}/5"),
+    }
+
+    # Scoring factors that drive each plan section ("stage" = burnout stage)
+    SECTION_FACTORS = {
+        "daily_actions": ["sleep_duration", "sleep_quality", "screen_time", "work_hours"],
+        "weekly_goals": ["work_hours", "motivation", "emotional_exhaustion"],
+        "behavioral_suggestions": ["perceived_stress", "emotional_exhaustion", "motivation", "screen_time"],
+        "caution_notes": ["stage"],
+    }
+
     def __init__(self):
         self.gemini_api_key = os.getenv("GOOGLE_GEMINI_API_KEY")
         self.model_name = os.getenv("GEMINI_MODEL_NAME", "gemini-pro")
+        # Requests this instance sent to the model (cache hits excluded)
+        self.llm_requests = 0
+        self._requests_lock = threading.Lock()
+
+    # GenerativeModel per (model name, system instruction); None when system instructions are unsupported
+    _models: Dict[tuple, Any] = {}
+    # Models whose API rejected a system instruction (e.g. gemini-pro); prompts are inlined for them
+    _no_system_instruction: set = set()
 
-    def _get_gemini_client(self):
-        """Get Google Gemini client."""
+    def _get_gemini_client(self, system_instruction: str = None):
+        """
+        Get Google Gemini client.
+        With a system_instruction, returns None if the installed SDK or the model doesn't support it.
+        """
         try:
             import google.generativeai as genai
             if not self.gemini_api_key:
                 raise ValueError("GOOGLE_GEMINI_API_KEY not set")
             genai.configure(api_key=self.gemini_api_key)
-            return genai.GenerativeModel(self.model_name)
+            if system_instruction is None:
+                return genai.GenerativeModel(self.model_name)
+            if self.model_name in self._no_system_instruction:
+                return None
+            
+            cache_key = (self.model_name, system_instruction)
+            if cache_key not in self._models:
+                try:
+                    self._models[cache_key] = genai.GenerativeModel(
+                        self.model_name, system_instruction=system_instruction
+                    )
+                except TypeError:
+                    # SDK predates system instructions
+                    self._models[cache_key] = None
+            return self._models[cache_key]
         except ImportError:
             raise ImportError("google-generativeai package not installed. Install with: pip install google-generativeai")
 
@@ -45,67 +142,263 @@ class AIRecoveryAgent:
         score = burnout_context.get("score", 0)
         stage = burnout_context.get("stage", "Unknown")
         responses = burnout_context.get("responses", {})
+        factor_lines = self._format_factor_lines(responses, self.FACTOR_PROMPT_LINES)
+        requirement_lines = "\n".join(f"- {line}" for line in self.SECTION_REQUIREMENTS.values())
         
         prompt = f"""You are a supportive wellness assistant helping someone with burnout recovery planning.
 
 CONTEXT:
 - Burnout Score: {score}/100
 - Burnout Stage: {stage}
-- Daily work hours: {responses.get('daily_work_hours', 'N/A')} hours
-- Sleep duration: {responses.get('sleep_duration', 'N/A')} hours
-- Sleep quality: {responses.get('sleep_quality', 'N/A')}/5
-- Emotional exhaustion: {responses.get('emotional_exhaustion', 'N/A')}/5
-- Motivation level: {responses.get('motivation_level', 'N/A')}/5
-- Screen time: {responses.get('screen_time', 'N/A')} hours/day
-- Perceived stress: {responses.get('perceived_stress', 'N/A')}/5
-
-CRITICAL ETHICAL CONSTRAINTS:
-1. DO NOT provide medical diagnosis or treatment advice
-2. DO NOT use alarming or judgmental language
-3. DO use supportive, empathetic, and neutral tone
-4. DO encourage professional help if burnout is severe (score > 75)
-5. DO focus on lifestyle adjustments, self-care, and stress management
-6. DO provide actionable, realistic recommendations
+{factor_lines}{self._format_progress_line(burnout_context)}
+
+{self.ETHICAL_CONSTRAINTS}
 
 TASK:
 Generate a personalized recovery plan in the following JSON format:
+{self.PLAN_JSON_FORMAT}
+
+REQUIREMENTS:
+{requirement_lines}
+- All recommendations must be practical and non-medical
+- Tailor recommendations to the specific burnout context provided
+
+Respond ONLY with valid JSON, no additional text."""
+
+        return prompt
+
+    def _build_plan_system_instruction(self) -> str:
+        """
+        Build the static plan instructions sent as a reusable system segment.
+        """
+        requirement_lines = "\n".join(f"- {line}" for line in self.SECTION_REQUIREMENTS.values())
+        
+        return f"""{self.SYSTEM_PREFIX}
+You help people with burnout recovery planning. Each message describes one burnout profile.
+
+{self.ETHICAL_CONSTRAINTS}
+
+TASK:
+Generate a personalized recovery plan for the profile in the following JSON format:
+{self.PLAN_JSON_FORMAT}
+
+REQUIREMENTS:
+{requirement_lines}
+- All recommendations must be practical and non-medical
+- Tailor recommendations to the specific burnout context provided
+
+Respond ONLY with valid JSON, no additional text."""
+
+    def _build_compact_prompt(self, burnout_context: Dict[str, Any]) -> str:
+        """
+        Build the minimal per-request prompt used with the plan system instruction.
+        
+        Args:
+            burnout_context: Dict containing score, stage, responses, etc.
+            
+        Returns:
+            One-line profile description
+        """
+        responses = burnout_context.get("responses", {})
+        factors = ", ".join(
+            template.format(responses.get(field, "N/A"))
+            for field, template in self.COMPACT_FACTOR_LABELS.values()
+        )
+        prompt = (
+            f"Score {burnout_context.get('score', 0)}/100 ({burnout_context.get('stage', 'Unknown')}); "
+            f"{factors}."
+        )
+        progress = self._format_progress_line(burnout_context)
+        return f"{prompt}\n{progress.strip()}" if progress else prompt
+
+    def prompt_compaction_estimate(self, burnout_context: Dict[str, Any] = None) -> Dict[str, int]:
+        """
+        Estimate plan prompt tokens with and without compaction for a sample context.
+        """
+        burnout_context = burnout_context or {
+            "score": 63.0,
+            "stage": "Moderate Burnout",
+            "responses": {
+                "daily_work_hours": 10.0, "sleep_duration": 6.0, "sleep_quality": 2,
+                "emotional_exhaustion": 4, "motivation_level": 2, "screen_time": 9.0, "perceived_stress": 4
+            }
+        }
+        inline_prompt = f"{self.SYSTEM_PREFIX}\n\n{self._build_prompt(burnout_context)}"
+        return {
+            "inline_prompt_tokens": estimate_tokens(inline_prompt),
+            "compact_static_tokens": estimate_tokens(self._build_plan_system_instruction()),
+            "compact_dynamic_tokens": estimate_tokens(self._build_compact_prompt(burnout_context)),
+        }
+
+    @staticmethod
+    def _format_factor_lines(responses: Dict[str, Any], factor_lines: Dict[str, Any]) -> str:
+        """Format context lines for the given factors from assessment responses."""
+        return "\n".join(
+            f"- {template.format(responses.get(field, 'N/A'))}"
+            for field, template in factor_lines.values()
+        )
+
+    @staticmethod
+    def _format_progress_line(burnout_context: Dict[str, Any]) -> str:
+        """
+        Context line for a plan adjusted to the user's progress (see generate_adjusted_plan_context),
+        starting with a newline; empty when no adjustment is needed, so other prompts are unchanged.
+        """
+        if not burnout_context.get("adjustment_needed"):
+            return ""
+        return (
+            f"\n- Progress: {burnout_context.get('progress_trend')} trend, score change "
+            f"{burnout_context.get('score_change', 0):+}. {burnout_context.get('progress_recommendation', '')}"
+        )
+
+    def _build_section_prompt(self, burnout_context: Dict[str, Any], sections: List[str]) -> str:
+        """
+        Build a targeted prompt that regenerates only some plan sections.
+        Only the factors driving those sections are included in the context.
+        
+        Args:
+            burnout_context: Dict containing score, stage, responses, etc.
+            sections: Plan sections to regenerate
+            
+        Returns:
+            Formatted prompt string
+        """
+        score = burnout_context.get("score", 0)
+        stage = burnout_context.get("stage", "Unknown")
+        responses = burnout_context.get("responses", {})
+        
+        factors = {factor for section in sections for factor in self.SECTION_FACTORS[section]}
+        factor_lines = self._format_factor_lines(
+            responses,
+            {k: v for k, v in self.FACTOR_PROMPT_LINES.items() if k in factors}
+        )
+        requirement_lines = "\n".join(f"- {self.SECTION_REQUIREMENTS[section]}" for section in sections)
+        json_lines = ",\n".join(f'    "{section}": ["..."]' for section in sections)
+        
+        prompt = f"""You are a supportive wellness assistant updating part of a burnout recovery plan.
+
+CONTEXT:
+- Burnout Score: {score}/100
+- Burnout Stage: {stage}
+{factor_lines}{self._format_progress_line(burnout_context)}
+
+CONSTRAINTS: No medical diagnosis or treatment advice. Use a supportive, neutral, non-judgmental tone.
+Encourage professional help if score > 75. Keep recommendations practical and realistic.
+
+TASK:
+Generate ONLY these plan sections in the following JSON format:
 {{
-    "daily_actions": ["action 1", "action 2", "action 3"],
-    "weekly_goals": ["goal 1", "goal 2", "goal 3"],
-    "behavioral_suggestions": ["suggestion 1", "suggestion 2"],
-    "caution_notes": ["note 1", "note 2"],
-    "disclaimer": "This is not medical advice. Please consult a healthcare professional for severe symptoms."
+{json_lines}
 }}
 
 REQUIREMENTS:
-- Provide 3-5 daily actions (small, achievable micro-actions)
-- Provide 2-3 weekly goals (broader recovery objectives)
-- Provide 2-4 behavioral suggestions (lifestyle adjustments)
-- Include caution notes if score > 75 (encouraging professional consultation)
+{requirement_lines}
+
+Respond ONLY with valid JSON, no additional text."""
+
+        return prompt
+
+    def _build_batch_prompt(self, contexts: Dict[str, Dict[str, Any]]) -> str:
+        """
+        Build one prompt that asks for a recovery plan per burnout profile.
+        
+        Args:
+            contexts: Dict mapping profile id to burnout context
+            
+        Returns:
+            Formatted prompt string
+        """
+        profiles = "\n\n".join(
+            f"""PROFILE "{key}":
+- Burnout Score: {context.get('score', 0)}/100
+- Burnout Stage: {context.get('stage', 'Unknown')}
+{self._format_factor_lines(context.get('responses', {}), self.FACTOR_PROMPT_LINES)}{self._format_progress_line(context)}"""
+            for key, context in contexts.items()
+        )
+        requirement_lines = "\n".join(f"- {line}" for line in self.SECTION_REQUIREMENTS.values())
+        
+        prompt = f"""You are a supportive wellness assistant helping several people with burnout recovery planning.
+
+{profiles}
+
+{self.ETHICAL_CONSTRAINTS}
+
+TASK:
+Generate one personalized recovery plan per profile as a JSON object keyed by profile id:
+{{
+    "<profile id>": {{
+        "daily_actions": ["action 1", "action 2", "action 3"],
+        "weekly_goals": ["goal 1", "goal 2", "goal 3"],
+        "behavioral_suggestions": ["suggestion 1", "suggestion 2"],
+        "caution_notes": ["note 1", "note 2"],
+        "disclaimer": "This is not medical advice. Please consult a healthcare professional for severe symptoms."
+    }}
+}}
+
+REQUIREMENTS (for each plan):
+{requirement_lines}
 - All recommendations must be practical and non-medical
-- Tailor recommendations to the specific burnout context provided
+- Tailor each plan to its own profile
 
 Respond ONLY with valid JSON, no additional text."""
 
         return prompt
 
-    def _call_gemini(self, prompt: str) -> Dict[str, Any]:
-        """Call Google Gemini API."""
-        model = self._get_gemini_client()
-        content = ""
+    def _call_gemini(self, prompt: str, max_output_tokens: int = None,
+                     system_instruction: str = None, kind: str = "plan") -> Dict[str, Any]:
+        """
+        Call Google Gemini API and record tokens, latency and outcome.
+        Parsed responses are cached across workers by prompt (LLM_CACHE_TTL_SECONDS).
         
-        try:
+        Args:
+            prompt: Per-request prompt
+            max_output_tokens: Output token budget (default: MAX_OUTPUT_TOKENS)
+            system_instruction: Static instructions sent as a system segment when supported,
+                otherwise inlined before the prompt
+            kind: Call type for accounting (plan, sections, batch)
+        """
+        variant = "inline"
+        model = None
+        if system_instruction:
+            model = self._get_gemini_client(system_instruction)
+            variant = "compact_system" if model is not None else "compact_inline"
+        if model is None:
+            model = self._get_gemini_client()
+        
+        if variant == "compact_system":
+            full_prompt = prompt
+        elif variant == "compact_inline":
+            full_prompt = f"{system_instruction}\n\n{prompt}"
+        else:
             # Build the full prompt with system instructions
-            full_prompt = f"""You are a supportive wellness assistant. Always respond with valid JSON only.
+            full_prompt = f"""{self.SYSTEM_PREFIX}
 
 {prompt}"""
-            
+        
+        max_output_tokens = max_output_tokens or self.MAX_OUTPUT_TOKENS
+        cache_key = None
+        if self.LLM_CACHE_TTL_SECONDS > 0:
+            cache_key = hashlib.sha256(json.dumps(
+                [self.model_name, variant, system_instruction or "", full_prompt, max_output_tokens]
+            ).encode()).hexdigest()
+            cached = SharedCache.get("llm", cache_key)
+            if cached is not None:
+                return cached
+        
+        content = ""
+        response = None
+        outcome = "error"
+        start = time.perf_counter()
+        with self._requests_lock:
+            self.llm_requests += 1
+        
+        try:
             # Generate content using Gemini
             response = model.generate_content(
                 full_prompt,
                 generation_config={
                     "temperature": 0.7,
-                    "max_output_tokens": 1000,
+                    "max_output_tokens": max_output_tokens,
                 }
             )
             
@@ -118,15 +411,52 @@ Respond ONLY with valid JSON, no additional text."""
                     content = content[4:]
                 content = content.strip()
             
-            return json.loads(content)
+            result = json.loads(content)
+            outcome = "success"
+            if cache_key:
+                SharedCache.set("llm", cache_key, result, self.LLM_CACHE_TTL_SECONDS)
+            return result
             
         except json.JSONDecodeError as e:
+            outcome = "parse_failure"
             error_msg = f"Failed to parse Gemini JSON response: {str(e)}"
             if content:
                 error_msg += f". Response: {content[:200]}"
             raise Exception(error_msg)
         except Exception as e:
-            raise Exception(f"Gemini API error: {str(e)}")
+            if variant != "compact_system" or not self._rejects_system_instruction(e):
+                raise Exception(f"Gemini API error: {str(e)}")
+            # Remember it for this model and retry below with the instructions inlined
+            print(f"Model {self.model_name} rejected a system instruction, inlining it from now on: {e}")
+            self._no_system_instruction.add(self.model_name)
+        finally:
+            latency_ms = (time.perf_counter() - start) * 1000
+            self._record_call(kind, variant, outcome, latency_ms, full_prompt,
+                              system_instruction if variant == "compact_system" else "", response, content)
+        return self._call_gemini(prompt, max_output_tokens, system_instruction, kind)
+
+    @staticmethod
+    def _rejects_system_instruction(error: Exception) -> bool:
+        """Whether an API error is a 400 rejecting the system instruction."""
+        return getattr(error, "code", None) == 400 and "instruction" in str(error).lower()
+
+    @staticmethod
+    def _record_call(kind: str, variant: str, outcome: str, latency_ms: float, prompt: str,
+                     system_instruction: str, response: Any, content: str):
+        """Record token counts (provider-reported when available), latency and outcome."""
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", None)
+        response_tokens = getattr(usage, "candidates_token_count", None)
+        
+        if prompt_tokens:
+            token_source = "provider"
+        else:
+            token_source = "estimate"
+            prompt_tokens = estimate_tokens(system_instruction) + estimate_tokens(prompt)
+            response_tokens = estimate_tokens(content)
+        
+        LLMAccounting.record(kind, variant, outcome, latency_ms,
+                             int(prompt_tokens), int(response_tokens or 0), token_source)
 
     def generate_recovery_plan(self, burnout_context: Dict[str, Any]) -> RecoveryRecommendations:
         """
@@ -143,26 +473,98 @@ Respond ONLY with valid JSON, no additional text."""
         Returns:
             RecoveryRecommendations object
         """
-        prompt = self._build_prompt(burnout_context)
-        
         try:
-            ai_response = self._call_gemini(prompt)
-            
-            # Validate and structure response
-            recommendations = RecoveryRecommendations(
-                daily_actions=ai_response.get("daily_actions", []),
-                weekly_goals=ai_response.get("weekly_goals", []),
-                behavioral_suggestions=ai_response.get("behavioral_suggestions", []),
-                caution_notes=ai_response.get("caution_notes", []),
-                disclaimer=ai_response.get("disclaimer", "This is not medical advice.")
-            )
-            
-            return recommendations
+            if self.PROMPT_COMPACTION:
+                ai_response = self._call_gemini(
+                    self._build_compact_prompt(burnout_context),
+                    system_instruction=self._build_plan_system_instruction()
+                )
+            else:
+                ai_response = self._call_gemini(self._build_prompt(burnout_context))
+            return self._to_recommendations(ai_response)
             
         except Exception as e:
             # Fallback to default recommendations if AI fails
+            LLMAccounting.record_fallback("plan")
             return self._get_fallback_recommendations(burnout_context)
 
+    def generate_recovery_plans_batch(self, contexts: Dict[str, Dict[str, Any]]) -> Dict[str, RecoveryRecommendations]:
+        """
+        Generate recovery plans for several burnout contexts with one LLM request.
+        Profiles missing or invalid in the response are generated individually.
+        
+        Args:
+            contexts: Dict mapping profile id to burnout context
+            
+        Returns:
+            Dict mapping profile id to RecoveryRecommendations
+        """
+        try:
+            ai_response = self._call_gemini(
+                self._build_batch_prompt(contexts),
+                max_output_tokens=self.MAX_OUTPUT_TOKENS * len(contexts),
+                kind="batch"
+            )
+        except Exception:
+            ai_response = {}
+        
+        plans = {}
+        for key, context in contexts.items():
+            entry = ai_response.get(key) if isinstance(ai_response, dict) else None
+            try:
+                plans[key] = self._to_recommendations(entry)
+            except Exception:
+                plans[key] = self.generate_recovery_plan(context)
+        
+        return plans
+
+    @staticmethod
+    def _to_recommendations(ai_response: Dict[str, Any]) -> RecoveryRecommendations:
+        """Validate and structure an AI response as recommendations."""
+        return RecoveryRecommendations(
+            daily_actions=ai_response.get("daily_actions", []),
+            weekly_goals=ai_response.get("weekly_goals", []),
+            behavioral_suggestions=ai_response.get("behavioral_suggestions", []),
+            caution_notes=ai_response.get("caution_notes", []),
+            disclaimer=ai_response.get("disclaimer", "This is not medical advice.")
+        )
+
+    def regenerate_sections(self, burnout_context: Dict[str, Any], sections: List[str],
+                            current_recommendations: Dict[str, Any]) -> RecoveryRecommendations:
+        """
+        Regenerate only some sections of an existing plan, reusing the rest.
+        
+        Args:
+            burnout_context: Dict containing score, stage, responses, etc.
+            sections: Plan sections to regenerate
+            current_recommendations: Existing plan recommendations dict
+            
+        Returns:
+            RecoveryRecommendations object with the given sections replaced
+        """
+        merged = dict(current_recommendations)
+        
+        try:
+            ai_response = self._call_gemini(self._build_section_prompt(burnout_context, sections), kind="sections")
+        except Exception:
+            ai_response = {}
+        if not isinstance(ai_response, dict):
+            # Valid JSON that isn't an object: fall back for every section
+            ai_response = {}
+        
+        fallback = None
+        for section in sections:
+            if isinstance(ai_response.get(section), list):
+                merged[section] = ai_response[section]
+            else:
+                # Fallback to default recommendations for sections the AI didn't return
+                if fallback is None:
+                    LLMAccounting.record_fallback("sections")
+                    fallback = self._get_fallback_recommendations(burnout_context)
+                merged[section] = getattr(fallback, section)
+        
+        return RecoveryRecommendations(**merged)
+
     def _get_fallback_recommendations(self, burnout_context: Dict[str, Any]) -> RecoveryRecommendations:
         """
         Provide fallback recommendations if AI fails.
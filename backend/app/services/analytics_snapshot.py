@@ -0,0 +1,336 @@
+"""
+Columnar analytics snapshots of assessments.
+Incrementally exports new assessments to Parquet files partitioned by month,
+with the questionnaire responses as typed columns and the user's
+demographics attached, so ad-hoc analytics read the snapshot instead of the
+primary database. Requires pyarrow (optional dependency).
+
+Usage (from the backend directory, e.g. from cron):
+    python -m app.services.analytics_snapshot export
+    python -m app.services.analytics_snapshot compact
+    python -m app.services.analytics_snapshot query --group-by occupation_type,burnout_stage \\
+        --metric burnout_score:mean --metric sleep_duration:mean --since 2024-01
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+from app.database import get_connection, IS_POSTGRES
+from app.schemas import AssessmentResponse
+
+RESPONSE_FIELDS = list(AssessmentResponse.model_fields)
+
+PARTITION_KEY = "created_month"
+
+
+def _require_pyarrow():
+    if not PYARROW_AVAILABLE:
+        raise ImportError("pyarrow is required for analytics snapshots. Install with: pip install pyarrow")
+
+
+def _parse_timestamp(value: Any) -> datetime:
+    """Database timestamp (datetime on PostgreSQL, text on SQLite) as an aware UTC datetime."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def snapshot_schema() -> "pa.Schema":
+    """Arrow schema of the snapshot (without the partition column)."""
+    response_types = {
+        name: pa.float32() if field.annotation is float else pa.int8()
+        for name, field in AssessmentResponse.model_fields.items()
+    }
+    return pa.schema(
+        [
+            ("assessment_id", pa.int64()),
+            ("user_id", pa.int64()),
+            ("created_at", pa.timestamp("us", tz="UTC")),
+            ("burnout_score", pa.float32()),
+            ("burnout_stage", pa.dictionary(pa.int8(), pa.string())),
+            ("age_range", pa.dictionary(pa.int8(), pa.string())),
+            ("occupation_type", pa.dictionary(pa.int8(), pa.string())),
+        ]
+        + [(name, response_types[name]) for name in RESPONSE_FIELDS]
+    )
+
+
+class AssessmentSnapshot:
+    """
+    Parquet snapshot of assessments, exported incrementally by assessment_id.
+    The high-water mark is kept in a state file next to the data, and is advanced
+    only after the files for a batch are written.
+    """
+
+    SNAPSHOT_DIR = os.getenv("ANALYTICS_SNAPSHOT_DIR", "./analytics/assessments")
+    BATCH_ROWS = int(os.getenv("ANALYTICS_SNAPSHOT_BATCH_ROWS", "50000"))
+    # Rows newer than this are left for the next run: ids of concurrent inserts can commit out of order
+    LAG_SECONDS = int(os.getenv("ANALYTICS_SNAPSHOT_LAG_SECONDS", "300"))
+    STATE_FILE = "_snapshot_state.json"
+
+    @classmethod
+    def load_state(cls) -> Dict[str, Any]:
+        path = os.path.join(cls.SNAPSHOT_DIR, cls.STATE_FILE)
+        if not os.path.exists(path):
+            return {"high_water_mark": 0, "rows": 0, "updated_at": None}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @classmethod
+    def save_state(cls, state: Dict[str, Any]):
+        path = os.path.join(cls.SNAPSHOT_DIR, cls.STATE_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def _file_id_range(path: str) -> tuple:
+        # part-<first id>-<last id>.parquet
+        _, first, last = os.path.basename(path)[:-len(".parquet")].split("-")
+        return int(first), int(last)
+
+    @classmethod
+    def _files(cls) -> List[str]:
+        return glob.glob(os.path.join(cls.SNAPSHOT_DIR, f"{PARTITION_KEY}=*", "part-*.parquet"))
+
+    @classmethod
+    def _remove_orphans(cls, high_water_mark: int) -> int:
+        """Delete files of a run that stopped before advancing the high-water mark."""
+        orphans = [path for path in cls._files() if cls._file_id_range(path)[1] > high_water_mark]
+        for path in orphans:
+            os.remove(path)
+        return len(orphans)
+
+    @classmethod
+    def _fetch_batch(cls, cursor, after_id: int) -> List[tuple]:
+        placeholder = "%s" if IS_POSTGRES else "?"
+        cursor.execute(
+            f"""
+            SELECT a.assessment_id, a.user_id, a.created_at, a.burnout_score, a.burnout_stage,
+                   u.age_range, u.occupation_type, {', '.join(f"a.{name}" for name in RESPONSE_FIELDS)}
+            FROM assessments a
+            JOIN users u ON u.user_id = a.user_id
+            WHERE a.assessment_id > {placeholder}
+            ORDER BY a.assessment_id
+            LIMIT {placeholder}
+            """,
+            (after_id, cls.BATCH_ROWS)
+        )
+        return cursor.fetchall()
+
+    @classmethod
+    def _write_batch(cls, rows: List[tuple]) -> int:
+        """Write one batch as one file per month partition."""
+        schema = snapshot_schema()
+        by_month: Dict[str, Dict[str, list]] = {}
+        for assessment_id, user_id, created_at, score, stage, age_range, occupation, *responses in rows:
+            created_at = _parse_timestamp(created_at)
+            columns = by_month.setdefault(created_at.strftime("%Y-%m"), {name: [] for name in schema.names})
+            columns["assessment_id"].append(assessment_id)
+            columns["user_id"].append(user_id)
+            columns["created_at"].append(created_at)
+            columns["burnout_score"].append(score)
+            columns["burnout_stage"].append(stage)
+            columns["age_range"].append(age_range)
+            columns["occupation_type"].append(occupation)
+            for name, value in zip(RESPONSE_FIELDS, responses):
+                columns[name].append(value)
+
+        for month, columns in by_month.items():
+            table = pa.Table.from_pydict(columns, schema=schema)
+            ids = columns["assessment_id"]
+            directory = os.path.join(cls.SNAPSHOT_DIR, f"{PARTITION_KEY}={month}")
+            os.makedirs(directory, exist_ok=True)
+            pq.write_table(table, os.path.join(directory, f"part-{min(ids):012d}-{max(ids):012d}.parquet"),
+                           compression="zstd")
+        return len(by_month)
+
+    @classmethod
+    def export(cls) -> Dict[str, Any]:
+        """
+        Export assessments added since the last run.
+
+        Returns:
+            Dict with rows and files written, and the new high-water mark
+        """
+        _require_pyarrow()
+        os.makedirs(cls.SNAPSHOT_DIR, exist_ok=True)
+        state = cls.load_state()
+        removed = cls._remove_orphans(state["high_water_mark"])
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=cls.LAG_SECONDS)
+
+        start = time.perf_counter()
+        exported = files = 0
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            while True:
+                rows = cls._fetch_batch(cursor, state["high_water_mark"])
+                # Stop at the first row inside the lag window, so no earlier id can still appear
+                ready = []
+                for row in rows:
+                    if _parse_timestamp(row[2]) >= cutoff:
+                        break
+                    ready.append(row)
+                if not ready:
+                    break
+                files += cls._write_batch(ready)
+                exported += len(ready)
+                state["high_water_mark"] = ready[-1][0]
+                state["rows"] += len(ready)
+                state["updated_at"] = datetime.utcnow().isoformat(timespec="seconds")
+                cls.save_state(state)
+                if len(ready) < len(rows) or len(rows) < cls.BATCH_ROWS:
+                    break
+        finally:
+            conn.close()
+
+        result = {
+            "rows": exported,
+            "files": files,
+            "orphans_removed": removed,
+            "high_water_mark": state["high_water_mark"],
+            "seconds": round(time.perf_counter() - start, 2),
+        }
+        print("Analytics snapshot export:", result)
+        return result
+
+    @classmethod
+    def compact(cls, min_files: int = 4) -> Dict[str, int]:
+        """
+        Merge the small files of incremental runs into one file per month.
+
+        Args:
+            min_files: Only compact months with at least this many files
+
+        Returns:
+            Dict with months compacted and files removed
+        """
+        _require_pyarrow()
+        high_water_mark = cls.load_state()["high_water_mark"]
+        compacted = removed = 0
+        for directory in sorted(glob.glob(os.path.join(cls.SNAPSHOT_DIR, f"{PARTITION_KEY}=*"))):
+            paths = [path for path in glob.glob(os.path.join(directory, "part-*.parquet"))
+                     if cls._file_id_range(path)[1] <= high_water_mark]
+            if len(paths) < min_files:
+                continue
+            table = pa.concat_tables([pq.read_table(path, schema=snapshot_schema()) for path in paths])
+            table = table.sort_by("assessment_id")
+            ids = [cls._file_id_range(path) for path in paths]
+            target = os.path.join(directory, f"part-{min(i[0] for i in ids):012d}-{max(i[1] for i in ids):012d}.parquet")
+            pq.write_table(table, target + ".tmp", compression="zstd")
+            os.replace(target + ".tmp", target)
+            for path in paths:
+                if path != target:
+                    os.remove(path)
+                    removed += 1
+            compacted += 1
+        return {"months": compacted, "files_removed": removed}
+
+
+class SnapshotQuery:
+    """
+    Vectorized aggregations over the snapshot with pyarrow.
+    """
+
+    @staticmethod
+    def dataset(snapshot_dir: str = None) -> "ds.Dataset":
+        _require_pyarrow()
+        return ds.dataset(
+            snapshot_dir or AssessmentSnapshot.SNAPSHOT_DIR,
+            format="parquet",
+            partitioning=ds.partitioning(pa.schema([(PARTITION_KEY, pa.string())]), flavor="hive"),
+        )
+
+    @classmethod
+    def aggregate(cls, group_by: List[str], metrics: Dict[str, List[str]],
+                  where: Optional[Dict[str, Any]] = None, since: str = None, until: str = None,
+                  snapshot_dir: str = None) -> List[Dict[str, Any]]:
+        """
+        Group and aggregate the snapshot.
+
+        Args:
+            group_by: Columns to group by, e.g. ["created_month", "burnout_stage"]
+            metrics: Column -> aggregations (pyarrow hash aggregates: mean, sum, min, max,
+                count, stddev, approximate_median, ...)
+            where: Column -> value (or list of values) equality filters
+            since: First month to include, "YYYY-MM" (prunes partitions)
+            until: Last month to include, "YYYY-MM"
+            snapshot_dir: Snapshot directory (default: ANALYTICS_SNAPSHOT_DIR)
+
+        Returns:
+            One dict per group, with "<column>_<aggregation>" keys
+        """
+        expression = None
+        filters = []
+        if since:
+            filters.append(pc.field(PARTITION_KEY) >= since)
+        if until:
+            filters.append(pc.field(PARTITION_KEY) <= until)
+        for column, value in (where or {}).items():
+            values = value if isinstance(value, (list, tuple)) else [value]
+            filters.append(pc.field(column).isin(values))
+        for condition in filters:
+            expression = condition if expression is None else expression & condition
+
+        columns = sorted(set(group_by) | set(metrics))
+        table = cls.dataset(snapshot_dir).to_table(columns=columns, filter=expression)
+        # Dictionary-encoded columns are grouped by their decoded values
+        for i, field in enumerate(table.schema):
+            if pa.types.is_dictionary(field.type):
+                table = table.set_column(i, field.name, table.column(i).cast(pa.string()))
+
+        aggregations = [(column, function) for column, functions in metrics.items() for function in functions]
+        result = table.group_by(group_by).aggregate(aggregations)
+        return result.sort_by([(column, "ascending") for column in group_by]).to_pylist()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Parquet analytics snapshots of assessments")
+    parser.add_argument("command", choices=["export", "compact", "query"])
+    parser.add_argument("--group-by", default="created_month", help="Comma-separated columns")
+    parser.add_argument("--metric", action="append", default=[],
+                        help="column:aggregation[,aggregation], e.g. burnout_score:mean,max (repeatable)")
+    parser.add_argument("--where", action="append", default=[], help="column=value filter (repeatable)")
+    parser.add_argument("--since", help="First month, YYYY-MM")
+    parser.add_argument("--until", help="Last month, YYYY-MM")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        AssessmentSnapshot.export()
+    elif args.command == "compact":
+        print(AssessmentSnapshot.compact())
+    else:
+        metrics: Dict[str, List[str]] = {}
+        for metric in args.metric or ["burnout_score:mean,count"]:
+            column, _, functions = metric.partition(":")
+            metrics.setdefault(column, []).extend(functions.split(",") if functions else ["mean"])
+        where = {}
+        for condition in args.where:
+            column, _, value = condition.partition("=")
+            where[column] = value
+        for row in SnapshotQuery.aggregate(args.group_by.split(","), metrics, where, args.since, args.until):
+            print(json.dumps(row, default=str))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
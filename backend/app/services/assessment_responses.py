@@ -0,0 +1,57 @@
+"""
+Questionnaire responses stored as typed assessment columns.
+Each answer has its own column (REAL for hours, SMALLINT for the 1-5 scales,
+see migration 0008) instead of one JSON document per row. This module maps
+between those columns and the `responses` dict the API, scoring engine and
+AI agent use.
+"""
+from typing import Any, Dict, Optional, Tuple
+
+from app.database import json_to_dict, row_to_dict
+from app.schemas import AssessmentResponse
+
+# One column per questionnaire answer, named after the field
+RESPONSE_COLUMNS: Tuple[str, ...] = tuple(AssessmentResponse.model_fields)
+
+
+class AssessmentResponses:
+    """
+    Accessor for the responses of assessment rows.
+    """
+
+    @staticmethod
+    def select_list(alias: str = None) -> str:
+        """SQL column list of the response columns, optionally qualified with a table alias."""
+        return ", ".join(f"{alias}.{column}" if alias else column for column in RESPONSE_COLUMNS)
+
+    @staticmethod
+    def values(responses: AssessmentResponse) -> Tuple[Any, ...]:
+        """Insert parameters for the response columns, in RESPONSE_COLUMNS order."""
+        return tuple(getattr(responses, column) for column in RESPONSE_COLUMNS)
+
+    @staticmethod
+    def fold(assessment: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Replace the response columns of an assessment dict with a `responses` dict.
+        Rows archived before migration 0008 carry `responses` as JSON instead; it is decoded.
+
+        Args:
+            assessment: Assessment dict, modified in place
+
+        Returns:
+            The same dict
+        """
+        if assessment is None:
+            return None
+        if RESPONSE_COLUMNS[0] in assessment:
+            assessment["responses"] = {column: assessment.pop(column) for column in RESPONSE_COLUMNS}
+        elif "responses" in assessment:
+            assessment["responses"] = json_to_dict(assessment["responses"])
+        return assessment
+
+    @classmethod
+    def to_dict(cls, row: Any) -> Optional[Dict[str, Any]]:
+        """
+        Convert a full assessment row (SELECT *) to a dict with `responses`.
+        """
+        return cls.fold(row_to_dict(row))
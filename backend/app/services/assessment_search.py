@@ -0,0 +1,134 @@
+"""
+Filtered assessment search with keyset (cursor) pagination.
+Filters on score, stage, date, user and individual questionnaire answers are
+pushed down to SQL. Answers are compared on their typed columns; the 1-5
+scale answers are indexed (migration 0008), hour answers (work, sleep, screen
+time) are filtered on the rows the other conditions select.
+"""
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.database import execute_query, IS_POSTGRES
+from app.services.assessment_responses import RESPONSE_COLUMNS
+from app.services.fieldsets import Fieldsets
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that was not returned by a previous search."""
+
+
+def _timestamp_param(value: datetime):
+    """Timestamp parameter in the created_at column's format (UTC)."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    value = value.astimezone(timezone.utc)
+    return value if IS_POSTGRES else value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class AssessmentSearch:
+    """
+    Builds and runs assessment search queries.
+    """
+
+    MAX_LIMIT = 500
+
+    @staticmethod
+    def encode_cursor(created_at: Any, assessment_id: int) -> str:
+        """Opaque cursor for the rows after (created_at, assessment_id) in newest-first order."""
+        if isinstance(created_at, datetime):
+            created_at = created_at.isoformat()
+        raw = json.dumps([created_at, assessment_id]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[str, int]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            created_at, assessment_id = json.loads(raw)
+            return str(created_at), int(assessment_id)
+        except (ValueError, TypeError) as e:
+            raise InvalidCursor("Invalid cursor") from e
+
+    @staticmethod
+    def _answer_conditions(field: str, low: Optional[float], high: Optional[float]) -> Tuple[List[str], List[Any]]:
+        """SQL conditions and params for a range filter on one questionnaire answer."""
+        if field not in RESPONSE_COLUMNS:
+            raise ValueError(f"Unknown questionnaire answer: {field}")
+        placeholder = "%s" if IS_POSTGRES else "?"
+        conditions, params = [], []
+        if low is not None:
+            conditions.append(f"{field} >= {placeholder}")
+            params.append(low)
+        if high is not None:
+            conditions.append(f"{field} <= {placeholder}")
+            params.append(high)
+        return conditions, params
+
+    @classmethod
+    def search(cls, filters: Dict[str, Any], answers: Dict[str, Tuple[Optional[float], Optional[float]]],
+               columns: Tuple[str, ...], limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Find assessments matching all filters, newest first.
+
+        Args:
+            filters: Optional user_id, stage, min_score, max_score, created_after, created_before
+            answers: (min, max) per questionnaire answer; either bound may be None
+            columns: Columns to return (see Fieldsets)
+            limit: Page size
+            cursor: next_cursor of the previous page
+
+        Returns:
+            Dict with items and next_cursor (None on the last page)
+
+        Raises:
+            InvalidCursor: If cursor cannot be decoded
+        """
+        placeholder = "%s" if IS_POSTGRES else "?"
+        conditions, params = [], []
+        for key, condition in (
+            ("user_id", "user_id = {}"),
+            ("stage", "burnout_stage = {}"),
+            ("min_score", "burnout_score >= {}"),
+            ("max_score", "burnout_score <= {}"),
+            ("created_after", "created_at >= {}"),
+            ("created_before", "created_at < {}"),
+        ):
+            value = filters.get(key)
+            if value is None:
+                continue
+            conditions.append(condition.format(placeholder))
+            params.append(_timestamp_param(value) if isinstance(value, datetime) else value)
+
+        for field, (low, high) in answers.items():
+            field_conditions, field_params = cls._answer_conditions(field, low, high)
+            conditions += field_conditions
+            params += field_params
+
+        if cursor:
+            created_at, assessment_id = cls.decode_cursor(cursor)
+            conditions.append(f"(created_at, assessment_id) < ({placeholder}, {placeholder})")
+            params += [created_at, assessment_id]
+
+        # created_at is needed for the next cursor even when not requested
+        selected = columns if "created_at" in columns else columns + ("created_at",)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = execute_query(
+            f"""
+            SELECT {Fieldsets.select_list(selected)} FROM assessments
+            {where}
+            ORDER BY created_at DESC, assessment_id DESC
+            LIMIT {placeholder}
+            """,
+            params=tuple(params) + (limit + 1,), fetch_all=True, name="assessments.search"
+        ) or []
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = cls.encode_cursor(rows[-1]["created_at"], rows[-1]["assessment_id"])
+        return {
+            "items": [Fieldsets.to_dict("assessment", row, columns) for row in rows],
+            "next_cursor": next_cursor,
+        }
@@ -0,0 +1,258 @@
+"""
+Batched recovery plan regeneration for cohorts of users.
+Loads contexts with set-based queries, packs similar contexts into shared LLM
+requests and writes all plans in one transaction.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from app.database import execute_query, execute_batch, row_to_dict, dict_to_json, IS_POSTGRES
+from app.schemas import AssessmentResponse, RecoveryRecommendations
+from app.services.ai_agent import AIRecoveryAgent
+from app.services.adaptive import AdaptiveFollowUp
+from app.services.adaptive_sweep import AdaptiveSweep
+from app.services.classification import BurnoutClassifier
+from app.services.entity_cache import EntityCache
+from app.services.hot_cache import UserHotCache
+from app.services.scoring import BurnoutScoringEngine
+from app.services.trends import TrendEngine
+
+
+class BatchPlanRegenerator:
+    """
+    Regenerates recovery plans for many users at once.
+    """
+
+    PACK_SIZE = int(os.getenv("BATCH_REGENERATE_PACK_SIZE", "5"))      # Contexts per LLM request
+    CONCURRENCY = int(os.getenv("BATCH_REGENERATE_CONCURRENCY", "4"))  # Concurrent LLM requests
+    MAX_USERS = int(os.getenv("BATCH_REGENERATE_MAX_USERS", "500"))    # Users per batch call
+
+    @staticmethod
+    def get_latest_plan_ids(user_ids: List[int]) -> Dict[int, int]:
+        """
+        Get the latest recovery plan id for each user with one set-based query per chunk.
+        """
+        plan_ids = {}
+        chunk_size = AdaptiveFollowUp.USER_ID_CHUNK_SIZE
+        for i in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[i:i + chunk_size]
+            if IS_POSTGRES:
+                where, params = "WHERE user_id = ANY(%s)", (list(chunk),)
+            else:
+                where, params = f"WHERE user_id IN ({', '.join('?' for _ in chunk)})", tuple(chunk)
+
+            query = f"""
+                SELECT plan_id, user_id FROM (
+                    SELECT plan_id, user_id,
+                           ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY created_at DESC, plan_id DESC) AS rn
+                    FROM recovery_plans
+                    {where}
+                ) ranked
+                WHERE rn = 1
+            """
+            results = execute_query(query, params=params, fetch_all=True, name="recovery_plans.latest_ids_for_users")
+            for row in results or []:
+                plan = row_to_dict(row)
+                plan_ids[plan["user_id"]] = plan["plan_id"]
+        return plan_ids
+
+    @staticmethod
+    def build_context(history: List[Dict[str, Any]], trend: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Build the burnout context, score breakdown and analysis for one user's history.
+        The analysis uses the user's stored assessment trend when given.
+        """
+        latest = history[0]
+        classification = BurnoutClassifier.classify(latest["burnout_score"])
+        score_result = BurnoutScoringEngine.calculate_score(AssessmentResponse(**latest["responses"]))
+        analysis = AdaptiveFollowUp.analyze_history(history, latest["burnout_score"], trend)
+
+        burnout_context = {
+            "score": latest["burnout_score"],
+            "stage": latest["burnout_stage"],
+            "stage_key": classification["stage_key"],
+            "responses": latest["responses"],
+            "description": classification["description"]
+        }
+        if analysis["needs_adjustment"]:
+            burnout_context = AdaptiveFollowUp.generate_adjusted_plan_context(analysis, burnout_context)
+
+        return {
+            "assessment_id": latest["assessment_id"],
+            "stage_key": classification["stage_key"],
+            "breakdown": score_result["breakdown"],
+            "analysis": analysis,
+            "context": burnout_context
+        }
+
+    @staticmethod
+    def group_key(entry: Dict[str, Any]) -> Tuple:
+        """
+        Contexts with the same stage, dominant factors and trend are considered similar.
+        """
+        return (
+            entry["stage_key"],
+            tuple(sorted(BurnoutScoringEngine.top_factors(entry["breakdown"]))),
+            entry["analysis"]["trend"]
+        )
+
+    @classmethod
+    def _pack(cls, entries: Dict[int, Dict[str, Any]]) -> List[List[int]]:
+        """
+        Group similar contexts and split each group into packs of at most PACK_SIZE users.
+        """
+        groups: Dict[Tuple, List[int]] = {}
+        for user_id, entry in entries.items():
+            groups.setdefault(cls.group_key(entry), []).append(user_id)
+
+        packs = []
+        for user_ids in groups.values():
+            packs.extend(user_ids[i:i + cls.PACK_SIZE] for i in range(0, len(user_ids), cls.PACK_SIZE))
+        return packs
+
+    @classmethod
+    def _generate(cls, entries: Dict[int, Dict[str, Any]]) -> Tuple[Dict[int, RecoveryRecommendations], int]:
+        """
+        Generate plans for all entries, packing similar contexts into shared requests.
+
+        Returns:
+            Tuple of (plans by user_id, number of LLM requests issued)
+        """
+        ai_agent = AIRecoveryAgent()
+        packs = cls._pack(entries)
+
+        def generate_pack(user_ids: List[int]) -> Dict[int, RecoveryRecommendations]:
+            if len(user_ids) == 1:
+                return {user_ids[0]: ai_agent.generate_recovery_plan(entries[user_ids[0]]["context"])}
+            # Profile labels keep user ids out of the prompt
+            contexts = {f"profile_{i + 1}": entries[user_id]["context"] for i, user_id in enumerate(user_ids)}
+            plans = ai_agent.generate_recovery_plans_batch(contexts)
+            return {user_id: plans[f"profile_{i + 1}"] for i, user_id in enumerate(user_ids)}
+
+        plans: Dict[int, RecoveryRecommendations] = {}
+        with ThreadPoolExecutor(max_workers=cls.CONCURRENCY) as executor:
+            for result in executor.map(generate_pack, packs):
+                plans.update(result)
+        return plans, ai_agent.llm_requests
+
+    @staticmethod
+    def _candidate_chunks(user_ids: Optional[List[int]]) -> Iterator[List[int]]:
+        """
+        Yield candidate user ids in chunks of USER_ID_CHUNK_SIZE; None pages through every user.
+        """
+        chunk_size = AdaptiveFollowUp.USER_ID_CHUNK_SIZE
+        if user_ids is not None:
+            for i in range(0, len(user_ids), chunk_size):
+                yield user_ids[i:i + chunk_size]
+            return
+
+        placeholder = "%s" if IS_POSTGRES else "?"
+        query = f"""
+            SELECT user_id FROM users
+            WHERE user_id > {placeholder}
+            ORDER BY user_id
+            LIMIT {placeholder}
+        """
+        last_id = 0
+        while True:
+            results = execute_query(query, params=(last_id, chunk_size), fetch_all=True, name="users.page_ids")
+            chunk = [row_to_dict(row)["user_id"] for row in results or []]
+            if not chunk:
+                return
+            yield chunk
+            last_id = chunk[-1]
+
+    @classmethod
+    def regenerate(cls, user_ids: Optional[List[int]] = None,
+                   only_needing_adjustment: bool = False) -> Dict[str, Any]:
+        """
+        Regenerate recovery plans for a list of users and/or users needing adjustment.
+
+        Args:
+            user_ids: Users to regenerate, or None for all users
+            only_needing_adjustment: Keep only users whose analysis says needs_adjustment
+
+        Returns:
+            Summary dict with regenerated, updated, created and skipped counts
+
+        Raises:
+            ValueError: If more than MAX_USERS users are listed or selected
+        """
+        if user_ids is not None:
+            user_ids = list(dict.fromkeys(user_ids))
+            if len(user_ids) > cls.MAX_USERS:
+                raise ValueError(
+                    f"Batch lists {len(user_ids)} users; at most {cls.MAX_USERS} can be regenerated per call"
+                )
+        elif only_needing_adjustment:
+            # Start from the users the latest sweep flagged instead of analyzing everyone
+            user_ids = AdaptiveSweep.needing_adjustment_user_ids()
+
+        entries, found = {}, set()
+        for chunk in cls._candidate_chunks(user_ids):
+            history = AdaptiveFollowUp.get_recent_assessments_for_users(chunk)
+            found.update(history)
+            trends = TrendEngine.get_for_users(list(history))
+            for user_id, assessments in history.items():
+                entry = cls.build_context(assessments, trends.get(user_id, {}).get("assessment"))
+                if only_needing_adjustment and not entry["analysis"]["needs_adjustment"]:
+                    continue
+                entries[user_id] = entry
+            # Stop loading histories as soon as the selection is too large
+            if len(entries) > cls.MAX_USERS:
+                raise ValueError(
+                    f"Batch selects more than {cls.MAX_USERS} users; at most {cls.MAX_USERS} can be regenerated per call"
+                )
+
+        skipped = sorted(set(user_ids or []) - found)
+        if not entries:
+            return {"regenerated": 0, "updated": 0, "created": 0, "llm_requests": 0, "skipped_user_ids": skipped}
+
+        plan_ids = cls.get_latest_plan_ids(list(entries))
+        plans, llm_requests = cls._generate(entries)
+
+        # Write every plan in one transaction
+        updates, inserts = [], []
+        all_sections = list(AIRecoveryAgent.SECTION_FACTORS)
+        for user_id, entry in entries.items():
+            recommendations_json = dict_to_json(plans[user_id].dict())
+            provenance_json = dict_to_json(AdaptiveFollowUp.build_plan_provenance(
+                entry["assessment_id"], entry["stage_key"], entry["breakdown"], all_sections
+            ))
+            if user_id in plan_ids:
+                updates.append((recommendations_json, provenance_json, plan_ids[user_id]))
+            else:
+                inserts.append((user_id, recommendations_json, provenance_json))
+
+        if IS_POSTGRES:
+            update_query = """
+                UPDATE recovery_plans
+                SET recommendations = %s::jsonb, provenance = %s::jsonb, updated_at = CURRENT_TIMESTAMP
+                WHERE plan_id = %s
+            """
+            insert_query = """
+                INSERT INTO recovery_plans (user_id, recommendations, provenance, created_at)
+                VALUES (%s, %s::jsonb, %s::jsonb, CURRENT_TIMESTAMP)
+            """
+        else:
+            update_query = """
+                UPDATE recovery_plans
+                SET recommendations = ?, provenance = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE plan_id = ?
+            """
+            insert_query = """
+                INSERT INTO recovery_plans (user_id, recommendations, provenance, created_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            """
+        execute_batch([(update_query, updates), (insert_query, inserts)], name="recovery_plans.batch_write")
+        EntityCache.invalidate_plans(plan_ids=plan_ids.values(), user_ids=entries)
+        UserHotCache.invalidate(entries)
+
+        return {
+            "regenerated": len(entries),
+            "updated": len(updates),
+            "created": len(inserts),
+            "llm_requests": llm_requests,
+            "skipped_user_ids": skipped
+        }
@@ -0,0 +1,157 @@
+"""
+Request deduplication for expensive operations.
+Single-flight coalescing for concurrent identical requests and
+Idempotency-Key storage for client retries.
+"""
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from app.database import execute_query, row_to_dict, dict_to_json, IS_POSTGRES
+from app.services.metrics import REGISTRY, CACHE_REQUESTS
+
+PLAN_GENERATION_REQUESTS = REGISTRY.counter(
+    "plan_generation_requests_total",
+    "Recovery plan generation requests by dedup outcome (computed, coalesced, replayed)",
+    ("outcome",)
+)
+IDEMPOTENCY_HIT = CACHE_REQUESTS.labels("idempotency", "hit")
+IDEMPOTENCY_MISS = CACHE_REQUESTS.labels("idempotency", "miss")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+    Followers wait for the leader and share its result or exception.
+
+    Calls are coalesced within one process only: identical requests that
+    land on different workers each run. Idempotency-Key replay is stored in
+    the database and works across workers, but only once the first request
+    has finished.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn once for all concurrent callers with the same key.
+
+        Returns:
+            Tuple of (result, shared) where shared is True for followers
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = Future()
+                self._calls[key] = call
+
+        if not leader:
+            return call.result(), True
+
+        try:
+            result = fn()
+            call.set_result(result)
+            return result, False
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class IdempotencyStore:
+    """
+    Stores responses by Idempotency-Key so retries within a window replay the stored result.
+    """
+
+    TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+    PURGE_EVERY = 100  # Purge expired keys every N stores
+
+    _stores = 0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def request_hash(payload: Dict[str, Any]) -> str:
+        """Stable hash of a request payload."""
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    @classmethod
+    def get(cls, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a stored response for a key within the TTL window.
+
+        Returns:
+            Dict with request_hash, status_code and response, or None
+        """
+        if IS_POSTGRES:
+            query = """
+                SELECT request_hash, status_code, response FROM idempotency_keys
+                WHERE idempotency_key = %s
+                AND created_at >= CURRENT_TIMESTAMP - make_interval(secs => %s)
+            """
+        else:
+            query = """
+                SELECT request_hash, status_code, response FROM idempotency_keys
+                WHERE idempotency_key = ?
+                AND created_at >= datetime('now', ?)
+            """
+        window = cls.TTL_SECONDS if IS_POSTGRES else f"-{cls.TTL_SECONDS} seconds"
+        result = execute_query(query, params=(key, window), fetch_one=True, name="idempotency_keys.get")
+        (IDEMPOTENCY_HIT if result else IDEMPOTENCY_MISS).inc()
+        return row_to_dict(result, json_fields=["response"])
+
+    @classmethod
+    def store(cls, key: str, request_hash: str, status_code: int, response: Any):
+        """
+        Store the response for a key, replacing an expired entry with the same key.
+        """
+        response_json = dict_to_json(response)
+
+        if IS_POSTGRES:
+            query = """
+                INSERT INTO idempotency_keys (idempotency_key, request_hash, status_code, response, created_at)
+                VALUES (%s, %s, %s, %s::jsonb, CURRENT_TIMESTAMP)
+                ON CONFLICT (idempotency_key) DO UPDATE
+                SET request_hash = EXCLUDED.request_hash, status_code = EXCLUDED.status_code,
+                    response = EXCLUDED.response, created_at = EXCLUDED.created_at
+            """
+        else:
+            query = """
+                INSERT INTO idempotency_keys (idempotency_key, request_hash, status_code, response, created_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (idempotency_key) DO UPDATE
+                SET request_hash = excluded.request_hash, status_code = excluded.status_code,
+                    response = excluded.response, created_at = excluded.created_at
+            """
+        execute_query(query, params=(key, request_hash, status_code, response_json), name="idempotency_keys.upsert")
+
+        with cls._lock:
+            cls._stores += 1
+            purge = cls._stores % cls.PURGE_EVERY == 0
+        if purge:
+            cls.purge_expired()
+
+    @classmethod
+    def purge_expired(cls) -> int:
+        """Delete keys older than the TTL window."""
+        if IS_POSTGRES:
+            query = "DELETE FROM idempotency_keys WHERE created_at < CURRENT_TIMESTAMP - make_interval(secs => %s)"
+            return execute_query(query, params=(cls.TTL_SECONDS,), name="idempotency_keys.purge")
+        query = "DELETE FROM idempotency_keys WHERE created_at < datetime('now', ?)"
+        return execute_query(query, params=(f"-{cls.TTL_SECONDS} seconds",), name="idempotency_keys.purge")
+
+
+def dedup_rate() -> float:
+    """Fraction of this worker's plan generation requests served without a new generation."""
+    total = PLAN_GENERATION_REQUESTS.total()
+    if not total:
+        return 0.0
+    deduplicated = PLAN_GENERATION_REQUESTS.get("coalesced") + PLAN_GENERATION_REQUESTS.get("replayed")
+    return round(deduplicated / total, 4)
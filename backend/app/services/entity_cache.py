@@ -0,0 +1,80 @@
+"""
+Cached reads of users and recovery plans through the cross-worker SharedCache.
+Writers invalidate the affected entries, so every worker sees the change on
+its next read.
+"""
+import os
+from typing import Any, Dict, Iterable, Optional
+
+from app.database import execute_query, row_to_dict, IS_POSTGRES
+from app.services.shared_cache import SharedCache
+
+PLAN_JSON_FIELDS = ["recommendations", "provenance"]
+
+
+class EntityCache:
+    """
+    Read-through cache for user and recovery plan rows.
+    """
+
+    USER_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "600"))
+    PLAN_TTL_SECONDS = int(os.getenv("PLAN_CACHE_TTL_SECONDS", "300"))
+
+    @classmethod
+    def get_user(cls, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Get a user row as a dict, or None if the user does not exist.
+        """
+        def load():
+            query = "SELECT * FROM users WHERE user_id = " + ("%s" if IS_POSTGRES else "?")
+            result = execute_query(query, params=(user_id,), fetch_one=True, name="users.get_by_id")
+            return row_to_dict(result) if result else None
+
+        return SharedCache.get_or_load("user", user_id, load, cls.USER_TTL_SECONDS)
+
+    @classmethod
+    def get_plan(cls, plan_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Get a recovery plan by id, or None if it does not exist.
+        """
+        def load():
+            query = "SELECT * FROM recovery_plans WHERE plan_id = " + ("%s" if IS_POSTGRES else "?")
+            result = execute_query(query, params=(plan_id,), fetch_one=True, name="recovery_plans.get_by_id")
+            return row_to_dict(result, json_fields=PLAN_JSON_FIELDS) if result else None
+
+        return SharedCache.get_or_load("plan", plan_id, load, cls.PLAN_TTL_SECONDS)
+
+    @staticmethod
+    def load_latest_plan(user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Read a user's most recent recovery plan from the database, bypassing the cache.
+        """
+        placeholder = "%s" if IS_POSTGRES else "?"
+        query = f"""
+            SELECT * FROM recovery_plans
+            WHERE user_id = {placeholder}
+            ORDER BY created_at DESC
+            LIMIT 1
+        """
+        result = execute_query(query, params=(user_id,), fetch_one=True, name="recovery_plans.get_latest_by_user")
+        return row_to_dict(result, json_fields=PLAN_JSON_FIELDS) if result else None
+
+    @classmethod
+    def get_latest_plan(cls, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Get a user's most recent recovery plan, or None if they have none.
+        """
+        return SharedCache.get_or_load("latest_plan", user_id, lambda: cls.load_latest_plan(user_id),
+                                       cls.PLAN_TTL_SECONDS)
+
+    @staticmethod
+    def invalidate_plans(plan_ids: Iterable[int] = (), user_ids: Iterable[int] = ()):
+        """
+        Drop cached plans after they are written, in every worker.
+
+        Args:
+            plan_ids: Updated plans
+            user_ids: Users whose latest plan may have changed
+        """
+        SharedCache.delete("plan", plan_ids)
+        SharedCache.delete("latest_plan", user_ids)
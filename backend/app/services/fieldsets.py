@@ -0,0 +1,112 @@
+"""
+Sparse fieldsets for read endpoints.
+`?fields=a,b` turns into an explicit SELECT column list, so large JSON columns
+(plan recommendations) and assessment responses are only read and decoded when
+a client asks for them. Without `fields`, each endpoint selects exactly the
+columns of its response model.
+"""
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app import schemas
+from app.database import row_to_dict
+from app.services.assessment_responses import AssessmentResponses, RESPONSE_COLUMNS
+
+# Per resource: primary key, selectable columns, JSON columns and default columns (the response model)
+RESOURCES = {
+    "user": {
+        "key": "user_id",
+        "columns": ("user_id", "name", "age_range", "occupation_type", "created_at"),
+        "json": (),
+        "default": tuple(schemas.UserResponse.model_fields),
+    },
+    "assessment": {
+        "key": "assessment_id",
+        "columns": ("assessment_id", "user_id", "responses", "burnout_score", "burnout_stage", "created_at"),
+        "json": (),
+        "default": tuple(schemas.AssessmentResult.model_fields),
+    },
+    "progress": {
+        "key": "progress_id",
+        "columns": ("progress_id", "user_id", "weekly_score", "completion_status", "user_notes", "timestamp"),
+        "json": ("completion_status",),
+        "default": tuple(schemas.ProgressResponse.model_fields),
+    },
+    "plan": {
+        "key": "plan_id",
+        "columns": ("plan_id", "user_id", "recommendations", "provenance", "created_at", "updated_at"),
+        "json": ("recommendations", "provenance"),
+        "default": tuple(schemas.RecoveryPlanResponse.model_fields),
+    },
+}
+
+# Fields stored in several columns
+COMPOSITE_COLUMNS = {"responses": RESPONSE_COLUMNS}
+
+
+class Fieldsets:
+    """
+    Parses `fields` parameters into column lists and shapes rows to them.
+    """
+
+    @staticmethod
+    def columns(resource: str, fields: Optional[str] = None) -> Tuple[str, ...]:
+        """
+        Columns to select for a request.
+
+        Args:
+            resource: Key of RESOURCES
+            fields: Comma-separated field names from the query string, or None for the default
+
+        Returns:
+            Column names, always including the primary key
+
+        Raises:
+            HTTPException: 400 for unknown field names
+        """
+        spec = RESOURCES[resource]
+        if not fields:
+            return spec["default"]
+        requested = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = sorted(set(requested) - set(spec["columns"]))
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(spec['columns'])}"
+            )
+        # Table order, so equal field sets produce the same SQL
+        return tuple(column for column in spec["columns"] if column == spec["key"] or column in requested)
+
+    @staticmethod
+    def select_list(columns: Iterable[str], alias: str = None) -> str:
+        """SQL column list for a projection, optionally qualified with a table alias."""
+        columns = [part for column in columns for part in COMPOSITE_COLUMNS.get(column, (column,))]
+        return ", ".join(f"{alias}.{column}" if alias else column for column in columns)
+
+    @staticmethod
+    def to_dict(resource: str, row: Any, columns: Tuple[str, ...]) -> Dict[str, Any]:
+        """
+        Convert a database or archived row to a dict with only the projected columns,
+        decoding only the JSON columns that were selected.
+        """
+        json_fields = [field for field in RESOURCES[resource]["json"] if field in columns]
+        result = row_to_dict(row, json_fields=json_fields)
+        if "responses" in columns:
+            AssessmentResponses.fold(result)
+        if result is not None and len(result) > len(columns):
+            # Archived and cached rows carry every column
+            result = {column: result.get(column) for column in columns}
+        return result
+
+    @staticmethod
+    def respond(content: Any, fields: Optional[str]) -> Any:
+        """
+        Return content through the endpoint's response model by default, or
+        as-is for sparse fieldsets, which the response model would reject.
+        """
+        if not fields:
+            return content
+        return JSONResponse(content=jsonable_encoder(content))
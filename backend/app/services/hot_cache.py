@@ -0,0 +1,235 @@
+"""
+Per-user hot cache for the dashboard reads: a user's latest assessment, latest
+recovery plan and progress analysis, kept in process memory.
+
+Entries are stamped with the user's version, a counter every write to the
+user's assessments, progress or plans increments after it commits. The
+counter lives in the SharedCache, so a write in one worker makes every other
+worker's entry for that user stale; a stale entry is a miss and is reloaded.
+The writer itself stores the values it just wrote (write-through), unless
+another write to the same user raced it, in which case it only invalidates.
+
+With the SharedCache disabled the counters are per process, so only this
+worker's writes invalidate entries; run a single worker there or rely on
+HOT_CACHE_TTL_SECONDS. Values are shared between requests: treat them as
+read-only.
+"""
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from app.database import execute_query, IS_POSTGRES
+from app.services.assessment_responses import AssessmentResponses
+from app.services.entity_cache import EntityCache
+from app.services.metrics import CACHE_REQUESTS, REGISTRY
+from app.services.shared_cache import SharedCache
+
+KEYS = ("latest_assessment", "latest_plan", "analysis")
+
+HOT_CACHE_REQUESTS = {
+    key: (CACHE_REQUESTS.labels(f"hot_{key}", "hit"), CACHE_REQUESTS.labels(f"hot_{key}", "miss"))
+    for key in KEYS
+}
+HOT_CACHE_ENTRIES = REGISTRY.gauge(
+    "user_hot_cache_entries", "Users with an entry in this worker's hot cache"
+)
+HOT_CACHE_EVICTIONS = REGISTRY.counter(
+    "user_hot_cache_evictions_total", "Hot cache entries evicted to stay within HOT_CACHE_MAX_USERS"
+)
+
+
+class UserHotCache:
+    """
+    Version-stamped LRU cache of per-user values, written through by the write endpoints.
+    """
+
+    ENABLED = os.getenv("HOT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    MAX_USERS = int(os.getenv("HOT_CACHE_MAX_USERS", "10000"))
+    # Upper bound on the age of an entry, for writes that do not go through the endpoints
+    TTL_SECONDS = int(os.getenv("HOT_CACHE_TTL_SECONDS", "300"))
+    # Version counters must outlive every entry stamped with them
+    VERSION_TTL_SECONDS = 7 * 24 * 3600
+
+    # user_id -> {"version", "expires", "values"}, least recently used first
+    _entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+    # Version counters when the SharedCache is disabled
+    _versions: "OrderedDict[int, int]" = OrderedDict()
+    _lock = threading.Lock()
+    _stats = {"hits": 0, "misses": 0, "stale": 0, "write_through": 0, "invalidated": 0, "evictions": 0}
+
+    @classmethod
+    def _bump(cls, user_id: int) -> Optional[int]:
+        """Increment a user's version; None if it cannot be tracked."""
+        if SharedCache.ENABLED:
+            return SharedCache.incr("user_version", user_id, cls.VERSION_TTL_SECONDS)
+        with cls._lock:
+            version = cls._versions[user_id] + 1 if user_id in cls._versions else random.getrandbits(48)
+            cls._versions[user_id] = version
+            cls._versions.move_to_end(user_id)
+            while len(cls._versions) > cls.MAX_USERS:
+                # A dropped counter restarts from a random value, which no entry matches
+                cls._versions.popitem(last=False)
+        return version
+
+    @classmethod
+    def version(cls, user_id: int) -> Optional[int]:
+        """
+        A user's current version, starting one if there is none.
+        Writers read it before writing and pass it to written().
+        """
+        if SharedCache.ENABLED:
+            version = SharedCache.get("user_version", user_id)
+        else:
+            with cls._lock:
+                version = cls._versions.get(user_id)
+        return cls._bump(user_id) if version is None else version
+
+    @classmethod
+    def _store(cls, user_id: int, version: int, values: Dict[str, Any], keep: Dict[str, Any] = None):
+        """Replace a user's entry. Call with the lock held."""
+        cls._entries[user_id] = {
+            "version": version,
+            "expires": time.monotonic() + cls.TTL_SECONDS,
+            "values": {**(keep or {}), **values},
+        }
+        cls._entries.move_to_end(user_id)
+        while len(cls._entries) > cls.MAX_USERS:
+            cls._entries.popitem(last=False)
+            cls._stats["evictions"] += 1
+            HOT_CACHE_EVICTIONS.inc()
+        HOT_CACHE_ENTRIES.set(len(cls._entries))
+
+    @classmethod
+    def get(cls, user_id: int, key: str, loader: Callable[[], Any]) -> Any:
+        """
+        Get a user's cached value, or call loader and cache its result (None included).
+
+        Args:
+            user_id: User ID
+            key: One of KEYS
+            loader: Reads the value from the database
+
+        Returns:
+            The cached or loaded value
+        """
+        hit_counter, miss_counter = HOT_CACHE_REQUESTS[key]
+        version = cls.version(user_id) if cls.ENABLED else None
+        if version is None:
+            miss_counter.inc()
+            return loader()
+
+        with cls._lock:
+            entry = cls._entries.get(user_id)
+            if entry is not None and (entry["version"] != version or entry["expires"] <= time.monotonic()):
+                cls._stats["stale"] += 1
+                del cls._entries[user_id]
+                entry = None
+            if entry is not None and key in entry["values"]:
+                cls._entries.move_to_end(user_id)
+                cls._stats["hits"] += 1
+                hit_counter.inc()
+                return entry["values"][key]
+            cls._stats["misses"] += 1
+        miss_counter.inc()
+
+        value = loader()
+        with cls._lock:
+            entry = cls._entries.get(user_id)
+            if entry is None:
+                cls._store(user_id, version, {key: value})
+            elif entry["version"] == version:
+                entry["values"][key] = value
+            # Otherwise a write in this worker replaced the entry while loading; keep it
+        return value
+
+    @classmethod
+    def written(cls, user_id: int, before: Optional[int], values: Dict[str, Any] = None,
+                drop: Iterable[str] = ()):
+        """
+        Record a committed write to a user's data.
+
+        Args:
+            user_id: User ID
+            before: version() read before the write
+            values: Keys whose new value the write produced, cached as-is
+            drop: Keys the write made stale, reloaded on the next read
+        """
+        if not cls.ENABLED:
+            return
+        after = cls._bump(user_id)
+        with cls._lock:
+            entry = cls._entries.pop(user_id, None)
+            if after is None or before is None or after != before + 1:
+                # Another write to this user landed in between; its values are unknown here
+                cls._stats["invalidated"] += 1
+                HOT_CACHE_ENTRIES.set(len(cls._entries))
+                return
+            keep = {}
+            if entry is not None and entry["version"] == before and entry["expires"] > time.monotonic():
+                keep = {key: value for key, value in entry["values"].items() if key not in drop}
+            cls._stats["write_through"] += 1
+            cls._store(user_id, after, values or {}, keep)
+
+    @classmethod
+    def invalidate(cls, user_ids: Iterable[int]):
+        """
+        Make every worker's entries for these users stale, after writes that
+        do not track versions (e.g. batch plan regeneration).
+        """
+        if not cls.ENABLED:
+            return
+        for user_id in user_ids:
+            cls._bump(user_id)
+            with cls._lock:
+                cls._entries.pop(user_id, None)
+                cls._stats["invalidated"] += 1
+        with cls._lock:
+            HOT_CACHE_ENTRIES.set(len(cls._entries))
+
+    @classmethod
+    def latest_assessment(cls, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        A user's most recent assessment with its responses, or None if they have none.
+        """
+        def load():
+            placeholder = "%s" if IS_POSTGRES else "?"
+            query = f"""
+                SELECT * FROM assessments
+                WHERE user_id = {placeholder}
+                ORDER BY created_at DESC
+                LIMIT 1
+            """
+            result = execute_query(query, params=(user_id,), fetch_one=True, name="assessments.get_latest_by_user")
+            return AssessmentResponses.to_dict(result)
+
+        return cls.get(user_id, "latest_assessment", load)
+
+    @classmethod
+    def latest_plan(cls, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        A user's most recent recovery plan, or None if they have none.
+        Loaded from the database rather than the shared cache, whose entry
+        is not stamped with the user's version and may predate it.
+        """
+        return cls.get(user_id, "latest_plan", lambda: EntityCache.load_latest_plan(user_id))
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        """
+        Lookups answered by this worker's hot cache.
+        """
+        with cls._lock:
+            stats = dict(cls._stats)
+            entries = len(cls._entries)
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            "enabled": cls.ENABLED,
+            "shared_versions": SharedCache.ENABLED,
+            "entries": entries,
+            "max_users": cls.MAX_USERS,
+            **stats,
+            "hit_rate": round(stats["hits"] / lookups, 4) if lookups else None,
+        }
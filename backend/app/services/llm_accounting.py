@@ -0,0 +1,143 @@
+"""
+Token and latency accounting for LLM calls.
+Keeps a bounded log of recent calls and aggregate metrics, and reports the
+effect of prompt compaction.
+"""
+import os
+import threading
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+from app.services.metrics import REGISTRY
+
+LLM_CALLS = REGISTRY.counter(
+    "llm_calls_total", "LLM calls by kind, prompt variant and outcome", ("kind", "variant", "outcome")
+)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "LLM tokens by kind and direction (prompt, response)", ("kind", "direction")
+)
+LLM_LATENCY = REGISTRY.histogram(
+    "llm_call_latency_seconds", "LLM call latency by kind and prompt variant", ("kind", "variant"),
+    buckets=(0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0)
+)
+LLM_FALLBACKS = REGISTRY.counter(
+    "llm_fallbacks_total", "Plans served from fallback recommendations after a failed LLM call", ("kind",)
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token) when the provider reports none."""
+    return max(1, len(text) // 4) if text else 0
+
+
+class LLMAccounting:
+    """
+    Bounded in-process store of per-call LLM records.
+    """
+
+    MAX_RECORDS = int(os.getenv("LLM_CALL_LOG_SIZE", "1000"))
+
+    _records: deque = deque(maxlen=MAX_RECORDS)
+    _lock = threading.Lock()
+
+    @classmethod
+    def record(cls, kind: str, variant: str, outcome: str, latency_ms: float,
+               prompt_tokens: int, response_tokens: int, token_source: str):
+        """
+        Record one LLM call.
+
+        Args:
+            kind: Call type (plan, sections, batch)
+            variant: Prompt variant (inline, compact_system, compact_inline)
+            outcome: success, parse_failure or error
+            latency_ms: Wall-clock latency in milliseconds
+            prompt_tokens: Prompt tokens (provider count or estimate)
+            response_tokens: Response tokens (provider count or estimate)
+            token_source: "provider" or "estimate"
+        """
+        LLM_CALLS.inc(kind, variant, outcome)
+        LLM_TOKENS.inc(kind, "prompt", amount=prompt_tokens)
+        LLM_TOKENS.inc(kind, "response", amount=response_tokens)
+        LLM_LATENCY.observe(latency_ms / 1000.0, kind, variant)
+
+        with cls._lock:
+            cls._records.append({
+                "kind": kind,
+                "variant": variant,
+                "outcome": outcome,
+                "latency_ms": round(latency_ms, 2),
+                "prompt_tokens": prompt_tokens,
+                "response_tokens": response_tokens,
+                "token_source": token_source,
+            })
+
+    @classmethod
+    def record_fallback(cls, kind: str):
+        """Record that fallback recommendations were served."""
+        LLM_FALLBACKS.inc(kind)
+
+    @classmethod
+    def records(cls) -> List[Dict[str, Any]]:
+        """Snapshot of recent call records, oldest first."""
+        with cls._lock:
+            return list(cls._records)
+
+    @staticmethod
+    def _summarize(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        latencies = sorted(r["latency_ms"] for r in records)
+        outcomes: Dict[str, int] = {}
+        for r in records:
+            outcomes[r["outcome"]] = outcomes.get(r["outcome"], 0) + 1
+        count = len(records)
+        return {
+            "calls": count,
+            "avg_prompt_tokens": round(sum(r["prompt_tokens"] for r in records) / count, 1),
+            "avg_response_tokens": round(sum(r["response_tokens"] for r in records) / count, 1),
+            "avg_latency_ms": round(sum(latencies) / count, 2),
+            "p95_latency_ms": latencies[min(count - 1, int(0.95 * count))],
+            "outcomes": outcomes,
+        }
+
+    @classmethod
+    def report(cls, prompt_estimate: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """
+        Aggregate recent calls by kind and prompt variant, with compaction savings.
+
+        Args:
+            prompt_estimate: Static token estimate of the inline and compact plan prompts
+
+        Returns:
+            Report dict
+        """
+        records = cls.records()
+        by_variant: Dict[str, Dict[str, List]] = {}
+        for r in records:
+            by_variant.setdefault(r["kind"], {}).setdefault(r["variant"], []).append(r)
+
+        kinds = {
+            kind: {variant: cls._summarize(rs) for variant, rs in variants.items()}
+            for kind, variants in by_variant.items()
+        }
+
+        # Measured savings of compact plan prompts against inline plan prompts
+        savings = {}
+        plan = kinds.get("plan", {})
+        inline = plan.get("inline")
+        for variant in ("compact_system", "compact_inline"):
+            compact = plan.get(variant)
+            if inline and compact:
+                savings[variant] = {
+                    "prompt_tokens_per_call": round(inline["avg_prompt_tokens"] - compact["avg_prompt_tokens"], 1),
+                    "prompt_tokens_pct": round(
+                        100 * (1 - compact["avg_prompt_tokens"] / inline["avg_prompt_tokens"]), 1
+                    ) if inline["avg_prompt_tokens"] else 0.0,
+                    "latency_ms_per_call": round(inline["avg_latency_ms"] - compact["avg_latency_ms"], 2),
+                }
+
+        return {
+            "records": len(records),
+            "kinds": kinds,
+            "fallbacks": {labels[0]: value for labels, value in LLM_FALLBACKS.samples()},
+            "measured_savings": savings,
+            "prompt_estimate": prompt_estimate or {},
+        }
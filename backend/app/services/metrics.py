@@ -0,0 +1,422 @@
+"""
+In-process metrics registry with Prometheus text exposition.
+Lightweight counters, gauges and histograms shared by services that need to
+report operational metrics.
+
+When METRICS_MULTIPROC_DIR is set, each worker process periodically writes a
+snapshot of its metrics to that directory and the exposition merges the
+snapshots of all workers. When a worker exits, its snapshot is folded into
+one archive snapshot, so the directory holds one file per live worker.
+"""
+import glob
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Tuple, List, Any, Optional
+
+MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+FLUSH_INTERVAL_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+# Counters and histograms of exited workers, merged into one snapshot
+ARCHIVE_FILE = "metrics_archive.json"
+
+
+class _Bound:
+    """
+    Metric bound to fixed label values, so hot paths skip label validation.
+    """
+
+    __slots__ = ("_metric", "_key")
+
+    def __init__(self, metric, key: Tuple[str, ...]):
+        self._metric = metric
+        self._key = key
+
+    def inc(self, amount: float = 1.0):
+        self._metric._add(self._key, amount)
+
+    def dec(self, amount: float = 1.0):
+        self._metric._add(self._key, -amount)
+
+    def set(self, value: float):
+        self._metric._set(self._key, value)
+
+    def observe(self, value: float):
+        self._metric._observe(self._key, value)
+
+
+class _Metric:
+    """
+    Base class for labelled metrics.
+    """
+
+    type_name = ""
+
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._bound: Dict[Tuple[str, ...], _Bound] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *labelvalues: str) -> _Bound:
+        """
+        Get the metric bound to the given label values.
+        Bound metrics are cached, so pre-registering label sets avoids per-call allocation.
+        """
+        bound = self._bound.get(labelvalues)
+        if bound is None:
+            self._check(labelvalues)
+            bound = self._bound.setdefault(labelvalues, _Bound(self, labelvalues))
+            self._init_value(labelvalues)
+        return bound
+
+    def _check(self, labelvalues: Tuple[str, ...]):
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+
+    def _init_value(self, key: Tuple[str, ...]):
+        with self._lock:
+            self._values.setdefault(key, 0.0)
+
+    def _add(self, key: Tuple[str, ...], amount: float):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        """Snapshot of (label values, value) pairs."""
+        with self._lock:
+            return list(self._values.items())
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing counter with optional labels.
+    """
+
+    type_name = "counter"
+
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        """Increment the counter for the given label values."""
+        self._check(labelvalues)
+        self._add(labelvalues, amount)
+
+    def get(self, *labelvalues: str) -> float:
+        """Get the current value for the given label values."""
+        return self._values.get(labelvalues, 0.0)
+
+    def total(self) -> float:
+        """Sum across all label values."""
+        with self._lock:
+            return sum(self._values.values())
+
+
+class Gauge(_Metric):
+    """
+    Value that can go up and down, with optional labels.
+    Across worker processes, gauges of live processes are summed.
+    """
+
+    type_name = "gauge"
+
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        self._check(labelvalues)
+        self._add(labelvalues, amount)
+
+    def dec(self, *labelvalues: str, amount: float = 1.0):
+        self._check(labelvalues)
+        self._add(labelvalues, -amount)
+
+    def set(self, value: float, *labelvalues: str):
+        self._check(labelvalues)
+        self._set(labelvalues, value)
+
+    def _set(self, key: Tuple[str, ...], value: float):
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """
+    Bucketed histogram with optional labels.
+    """
+
+    type_name = "histogram"
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = None):
+        super().__init__(name, description, labelnames)
+        # Values are stored per label set as [per-bucket counts..., +Inf count, sum]
+        self.buckets = tuple(sorted(buckets or self.DEFAULT_BUCKETS))
+
+    def _init_value(self, key: Tuple[str, ...]):
+        with self._lock:
+            self._values.setdefault(key, [0.0] * (len(self.buckets) + 2))
+
+    def observe(self, value: float, *labelvalues: str):
+        """Record an observation for the given label values."""
+        self._check(labelvalues)
+        self._observe(labelvalues, value)
+
+    def _observe(self, key: Tuple[str, ...], value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            state[index] += 1
+            state[-1] += value
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], List[float]]]:
+        """Snapshot of (label values, [cumulative bucket counts..., count, sum]) pairs."""
+        with self._lock:
+            snapshot = [(labels, list(state)) for labels, state in self._values.items()]
+        result = []
+        for labels, state in snapshot:
+            cumulative, running = [], 0.0
+            for count in state[:-1]:
+                running += count
+                cumulative.append(running)
+            # Last cumulative entry (+Inf) is the total count
+            result.append((labels, cumulative + [state[-1]]))
+        return result
+
+
+class MetricsRegistry:
+    """
+    Registry of named metrics. Registering an existing name returns the same metric.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self._flush_thread: Optional[threading.Thread] = None
+
+    def _register(self, cls, name: str, *args) -> Any:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args)
+            return self._metrics[name]
+
+    def counter(self, name: str, description: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        """Get or create a counter."""
+        return self._register(Counter, name, description, labelnames)
+
+    def gauge(self, name: str, description: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        """Get or create a gauge."""
+        return self._register(Gauge, name, description, labelnames)
+
+    def histogram(self, name: str, description: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = None) -> Histogram:
+        """Get or create a histogram."""
+        return self._register(Histogram, name, description, labelnames, buckets)
+
+    def metrics(self) -> List[_Metric]:
+        """All registered metrics."""
+        with self._lock:
+            return list(self._metrics.values())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Serializable snapshot of every metric in this process."""
+        return {
+            metric.name: {
+                "type": metric.type_name,
+                "help": metric.description,
+                "labelnames": list(metric.labelnames),
+                "buckets": list(getattr(metric, "buckets", [])),
+                "samples": [[list(labels), value] for labels, value in metric.samples()],
+            }
+            for metric in self.metrics()
+        }
+
+    # Multi-process support
+
+    def flush(self):
+        """Write this process's snapshot to the multiprocess directory."""
+        if not MULTIPROC_DIR:
+            return
+        os.makedirs(MULTIPROC_DIR, exist_ok=True)
+        path = os.path.join(MULTIPROC_DIR, f"metrics_{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pid": os.getpid(), "metrics": self.snapshot()}, f)
+        os.replace(tmp_path, path)
+
+    def start_flusher(self):
+        """Periodically flush snapshots in a daemon thread (multiprocess mode only)."""
+        if not MULTIPROC_DIR or (self._flush_thread and self._flush_thread.is_alive()):
+            return
+
+        def flush_loop():
+            while True:
+                time.sleep(FLUSH_INTERVAL_SECONDS)
+                try:
+                    self.flush()
+                except OSError as e:
+                    print("Metrics flush failed:", e)
+
+        self._flush_thread = threading.Thread(target=flush_loop, name="metrics-flush", daemon=True)
+        self._flush_thread.start()
+
+    @staticmethod
+    def _pid_alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+            return True
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+
+    @staticmethod
+    def _merge(merged: Dict[str, Any], metrics: Dict[str, Any], include_gauges: bool):
+        """Add a snapshot's samples to merged (samples keyed by label tuple)."""
+        for name, metric in metrics.items():
+            if metric["type"] == "gauge" and not include_gauges:
+                continue
+            target = merged.setdefault(name, dict(metric, samples={}))
+            for labels, value in metric["samples"]:
+                key = tuple(labels)
+                if key not in target["samples"]:
+                    target["samples"][key] = value
+                elif isinstance(value, list):
+                    target["samples"][key] = [a + b for a, b in zip(target["samples"][key], value)]
+                else:
+                    target["samples"][key] += value
+
+    @staticmethod
+    def _as_snapshot(merged: Dict[str, Any]) -> Dict[str, Any]:
+        """Turn merged samples back into the snapshot list format."""
+        for metric in merged.values():
+            metric["samples"] = [[list(k), v] for k, v in metric["samples"].items()]
+        return merged
+
+    def collect(self) -> Dict[str, Any]:
+        """
+        Collect metrics from this process, or merged across all worker processes.
+        Counters and histograms of exited workers are kept; their gauges are dropped.
+        """
+        if not MULTIPROC_DIR:
+            return self.snapshot()
+
+        self.flush()
+        merged: Dict[str, Any] = {}
+        for path in glob.glob(os.path.join(MULTIPROC_DIR, "metrics_*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            # The archive of exited workers has no pid
+            alive = data["pid"] is not None and self._pid_alive(data["pid"])
+            self._merge(merged, data["metrics"], include_gauges=alive)
+        return self._as_snapshot(merged)
+
+    def mark_process_dead(self, pid: int):
+        """
+        Fold an exited worker's counters and histograms into the archive snapshot
+        and delete its own snapshot, so recycled workers don't leave a file each.
+        Call from one process only (gunicorn's child_exit hook in the master).
+        """
+        if not MULTIPROC_DIR:
+            return
+        path = os.path.join(MULTIPROC_DIR, f"metrics_{pid}.json")
+        archive_path = os.path.join(MULTIPROC_DIR, ARCHIVE_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Metrics snapshot of worker {pid} unreadable, dropping it:", e)
+            os.remove(path)
+            return
+
+        merged: Dict[str, Any] = {}
+        try:
+            with open(archive_path, "r", encoding="utf-8") as f:
+                self._merge(merged, json.load(f)["metrics"], include_gauges=False)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print("Metrics archive unreadable, starting a new one:", e)
+        self._merge(merged, data["metrics"], include_gauges=False)
+
+        tmp_path = f"{archive_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pid": None, "metrics": self._as_snapshot(merged)}, f)
+        os.replace(tmp_path, archive_path)
+        os.remove(path)
+
+    @staticmethod
+    def clear_multiproc_dir():
+        """
+        Delete every snapshot, including the archive. Call once before workers
+        start: snapshots of a previous server can carry pids reused since.
+        """
+        if not MULTIPROC_DIR:
+            return
+        for path in glob.glob(os.path.join(MULTIPROC_DIR, "metrics_*.json*")):
+            try:
+                os.remove(path)
+            except OSError as e:
+                print("Metrics snapshot cleanup failed:", e)
+
+    def render_prometheus(self) -> str:
+        """Render metrics in the Prometheus text exposition format."""
+        lines = []
+        for name, metric in sorted(self.collect().items()):
+            lines.append(f"# HELP {name} {_escape_help(metric['help'])}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            labelnames = metric["labelnames"]
+
+            for labels, value in metric["samples"]:
+                pairs = list(zip(labelnames, labels))
+                if metric["type"] != "histogram":
+                    lines.append(f"{name}{_format_labels(pairs)} {_format_value(value)}")
+                    continue
+                buckets = metric["buckets"]
+                for bound, count in zip(buckets, value):
+                    lines.append(
+                        f"{name}_bucket{_format_labels(pairs + [('le', _format_value(bound))])} {_format_value(count)}"
+                    )
+                lines.append(f"{name}_bucket{_format_labels(pairs + [('le', '+Inf')])} {_format_value(value[-2])}")
+                lines.append(f"{name}_count{_format_labels(pairs)} {_format_value(value[-2])}")
+                lines.append(f"{name}_sum{_format_labels(pairs)} {_format_value(value[-1])}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _format_labels(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    escaped = (
+        f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), chr(92) + "n")}"'
+        for k, v in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return f"{int(value)}.0" if abs(value) < 1e15 else repr(float(value))
+    return repr(float(value))
+
+
+REGISTRY = MetricsRegistry()
+
+# Shared cache hit/miss counter; hit ratio = hit / (hit + miss) per cache
+CACHE_REQUESTS = REGISTRY.counter(
+    "cache_requests_total", "Cache lookups by cache name and result (hit, miss)", ("cache", "result")
+)
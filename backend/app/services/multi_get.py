@@ -0,0 +1,85 @@
+"""
+Multi-get reads: fetch many records of one resource by id in a single query
+(`WHERE id = ANY(%s)` on PostgreSQL, `WHERE id IN (...)` on SQLite) instead
+of one request per id. Results keep the order of the requested ids, and ids
+that do not exist are reported instead of failing the request.
+"""
+import os
+from typing import Any, Dict, List, Tuple
+
+from fastapi import HTTPException
+
+from app.database import execute_query, IS_POSTGRES
+from app.services.fieldsets import Fieldsets, RESOURCES
+
+TABLES = {
+    "user": "users",
+    "assessment": "assessments",
+    "progress": "progress",
+    "plan": "recovery_plans",
+}
+
+
+class MultiGet:
+    """
+    Resolves `?ids=` requests with one query per call.
+    """
+
+    MAX_IDS = int(os.getenv("MULTI_GET_MAX_IDS", "100"))
+
+    @classmethod
+    def parse_ids(cls, ids: str) -> List[int]:
+        """
+        Parse a comma-separated id list, dropping repeated ids.
+
+        Returns:
+            Ids in request order
+
+        Raises:
+            HTTPException: 400 for a non-integer id, no ids or more than MAX_IDS ids
+        """
+        parsed = []
+        for part in ids.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            try:
+                parsed.append(int(part))
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid id: {part}")
+        parsed = list(dict.fromkeys(parsed))
+        if not parsed:
+            raise HTTPException(status_code=400, detail="Provide at least one id")
+        if len(parsed) > cls.MAX_IDS:
+            raise HTTPException(status_code=400, detail=f"At most {cls.MAX_IDS} ids can be requested at once")
+        return parsed
+
+    @staticmethod
+    def fetch(resource: str, ids: List[int], columns: Tuple[str, ...]) -> Dict[str, Any]:
+        """
+        Fetch records of a resource by id.
+
+        Args:
+            resource: Key of RESOURCES
+            ids: Ids from parse_ids
+            columns: Columns to return (see Fieldsets)
+
+        Returns:
+            Dict with items (in the order of ids) and missing (ids not found)
+        """
+        key = RESOURCES[resource]["key"]
+        table = TABLES[resource]
+        if IS_POSTGRES:
+            condition, params = f"{key} = ANY(%s)", (list(ids),)
+        else:
+            condition, params = f"{key} IN ({', '.join('?' for _ in ids)})", tuple(ids)
+        rows = execute_query(
+            f"SELECT {Fieldsets.select_list(columns)} FROM {table} WHERE {condition}",
+            params=params, fetch_all=True, name=f"{table}.get_many"
+        ) or []
+
+        found = {row[key]: Fieldsets.to_dict(resource, row, columns) for row in rows}
+        return {
+            "items": [found[record_id] for record_id in ids if record_id in found],
+            "missing": [record_id for record_id in ids if record_id not in found],
+        }
@@ -0,0 +1,293 @@
+"""
+Precomputed recovery plan library.
+Pre-generates plans for every burnout stage and dominant-factor combination so
+that non-personalized plan requests can be served without an LLM call.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from itertools import combinations, product
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.database import execute_query, row_to_dict, dict_to_json, IS_POSTGRES
+from app.schemas import AssessmentResponse, RecoveryRecommendations
+from app.services.scoring import BurnoutScoringEngine
+from app.services.classification import BurnoutClassifier
+from app.services.ai_agent import AIRecoveryAgent
+from app.services.metrics import CACHE_REQUESTS
+
+LIBRARY_HIT = CACHE_REQUESTS.labels("plan_library", "hit")
+LIBRARY_MISS = CACHE_REQUESTS.labels("plan_library", "miss")
+
+
+class PlanLibrary:
+    """
+    Library of recovery plans keyed by burnout stage and top contributing factors.
+    """
+
+    TOP_FACTOR_COUNT = 3
+    WARMUP_CONCURRENCY = int(os.getenv("PLAN_LIBRARY_CONCURRENCY", "4"))
+    REFRESH_INTERVAL_SECONDS = int(os.getenv("PLAN_LIBRARY_REFRESH_SECONDS", "86400"))
+
+    # Answers per factor, from the lowest contribution the scale allows upward
+    # (sleep quality and motivation contribute 3% even at their best answer)
+    RESPONSE_LEVELS = {
+        "work_hours": ("daily_work_hours", (8.0, 9.0, 10.0, 11.0, 12.0)),
+        "sleep_duration": ("sleep_duration", (8.0, 6.5, 5.0, 3.0, 1.0)),
+        "sleep_quality": ("sleep_quality", (5, 4, 3, 2, 1)),
+        "emotional_exhaustion": ("emotional_exhaustion", (1, 2, 3, 4, 5)),
+        "motivation": ("motivation_level", (5, 4, 3, 2, 1)),
+        "screen_time": ("screen_time", (4.0, 6.0, 8.0, 10.0, 12.0)),
+        "perceived_stress": ("perceived_stress", (1, 2, 3, 4, 5)),
+    }
+
+    _representatives: Optional[Dict[str, Dict[str, Any]]] = None
+    _refresh_thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def library_key(stage_key: str, factors: List[str]) -> str:
+        """
+        Build the library key for a stage and a set of dominant factors.
+        Factor order does not matter.
+        """
+        return f"{stage_key}:{','.join(sorted(factors))}"
+
+    @classmethod
+    def representative_responses(cls) -> Dict[str, Dict[str, Any]]:
+        """
+        Responses standing for each (stage, top factors) combination, keyed by library key.
+        Every grid of RESPONSE_LEVELS answers is scored; a combination is represented
+        by the answers that produce it with the score closest to the stage midpoint.
+        Combinations no answers produce (e.g. severe burnout driven only by
+        low-weight factors) are left out, since no assessment can look them up.
+        """
+        if cls._representatives is not None:
+            return cls._representatives
+
+        factors = list(cls.RESPONSE_LEVELS)
+        lowest = {field: values[0] for field, values in cls.RESPONSE_LEVELS.values()}
+        # A factor's contribution depends on its own answer only
+        contributions = {
+            factor: [
+                BurnoutScoringEngine.calculate_score(AssessmentResponse(**{**lowest, field: value}))["breakdown"][factor]
+                for value in values
+            ]
+            for factor, (field, values) in cls.RESPONSE_LEVELS.items()
+        }
+
+        best: Dict[str, Tuple[float, Tuple[int, ...]]] = {}
+        for levels in product(*(range(len(values)) for _, values in cls.RESPONSE_LEVELS.values())):
+            breakdown = {factor: contributions[factor][level] for factor, level in zip(factors, levels)}
+            ranked = sorted(breakdown.values(), reverse=True)
+            if ranked[cls.TOP_FACTOR_COUNT - 1] <= ranked[cls.TOP_FACTOR_COUNT]:
+                # Ties make the top factors depend on ordering, not on the answers
+                continue
+            score = sum(breakdown.values())
+            stage_key = BurnoutClassifier.classify(score)["stage_key"]
+            low, high = BurnoutClassifier.THRESHOLDS[stage_key]
+            key = cls.library_key(stage_key, BurnoutScoringEngine.top_factors(breakdown, cls.TOP_FACTOR_COUNT))
+            distance = abs(score - (low + high) / 2)
+            if key not in best or distance < best[key][0]:
+                best[key] = (distance, levels)
+
+        cls._representatives = {
+            key: {field: values[level] for (field, values), level in zip(cls.RESPONSE_LEVELS.values(), levels)}
+            for key, (_, levels) in best.items()
+        }
+        return cls._representatives
+
+    @classmethod
+    def all_combinations(cls) -> List[Tuple[str, Tuple[str, ...]]]:
+        """
+        Enumerate every (stage_key, top factors) combination the library covers:
+        those some assessment answers produce.
+        """
+        representatives = cls.representative_responses()
+        factors = sorted(BurnoutScoringEngine.WEIGHTS.keys())
+        return [
+            (stage_key, combo)
+            for stage_key in BurnoutClassifier.THRESHOLDS
+            for combo in combinations(factors, cls.TOP_FACTOR_COUNT)
+            if cls.library_key(stage_key, combo) in representatives
+        ]
+
+    @classmethod
+    def factors_for_responses(cls, responses: Dict[str, Any]) -> List[str]:
+        """
+        Get the top contributing factors for a set of assessment responses.
+        """
+        score_result = BurnoutScoringEngine.calculate_score(AssessmentResponse(**responses))
+        return BurnoutScoringEngine.top_factors(score_result["breakdown"], cls.TOP_FACTOR_COUNT)
+
+    @classmethod
+    def build_context(cls, stage_key: str, factors: Tuple[str, ...]) -> Dict[str, Any]:
+        """
+        Build a representative burnout context for a library combination,
+        scored from the combination's representative responses.
+        """
+        responses = dict(cls.representative_responses()[cls.library_key(stage_key, factors)])
+        score = BurnoutScoringEngine.calculate_score(AssessmentResponse(**responses))["score"]
+        classification = BurnoutClassifier.classify(score)
+
+        return {
+            "score": score,
+            "stage": classification["stage"],
+            "stage_key": classification["stage_key"],
+            "responses": responses,
+            "description": classification["description"],
+        }
+
+    @classmethod
+    def context_matches(cls, stage_key: str, factors: Tuple[str, ...], context: Dict[str, Any]) -> bool:
+        """
+        Whether a context's responses score into the combination's stage and top factors,
+        i.e. whether its plan is the one assessments with that key should get.
+        """
+        return (
+            context["stage_key"] == stage_key
+            and sorted(cls.factors_for_responses(context["responses"])) == sorted(factors)
+        )
+
+    @classmethod
+    def lookup(cls, stage_key: str, factors: List[str]) -> Optional[RecoveryRecommendations]:
+        """
+        Get a library plan for the given stage and factors, or None if not warmed yet.
+        """
+        query = "SELECT recommendations FROM plan_library WHERE library_key = " + ("%s" if IS_POSTGRES else "?")
+        result = execute_query(
+            query, params=(cls.library_key(stage_key, factors),), fetch_one=True, name="plan_library.get"
+        )
+
+        if not result:
+            LIBRARY_MISS.inc()
+            return None
+
+        LIBRARY_HIT.inc()
+        entry = row_to_dict(result, json_fields=["recommendations"])
+        return RecoveryRecommendations(**entry["recommendations"])
+
+    @classmethod
+    def store(cls, stage_key: str, factors: Tuple[str, ...], recommendations: RecoveryRecommendations):
+        """
+        Insert or refresh a library plan.
+        """
+        recommendations_json = dict_to_json(recommendations.dict())
+        params = (cls.library_key(stage_key, factors), stage_key, ",".join(sorted(factors)), recommendations_json)
+
+        if IS_POSTGRES:
+            query = """
+                INSERT INTO plan_library (library_key, stage_key, top_factors, recommendations, created_at)
+                VALUES (%s, %s, %s, %s::jsonb, CURRENT_TIMESTAMP)
+                ON CONFLICT (library_key) DO UPDATE
+                SET recommendations = EXCLUDED.recommendations, updated_at = CURRENT_TIMESTAMP
+            """
+        else:
+            query = """
+                INSERT INTO plan_library (library_key, stage_key, top_factors, recommendations, created_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (library_key) DO UPDATE
+                SET recommendations = excluded.recommendations, updated_at = CURRENT_TIMESTAMP
+            """
+        execute_query(query, params=params, name="plan_library.upsert")
+
+    @classmethod
+    def _fresh_keys(cls, max_age_seconds: int) -> set:
+        """
+        Get library keys that were generated within max_age_seconds.
+        """
+        results = execute_query(
+            "SELECT library_key, created_at, updated_at FROM plan_library", fetch_all=True,
+            name="plan_library.list_generated"
+        )
+        fresh = set()
+        for row in results or []:
+            entry = row_to_dict(row)
+            generated_at = entry.get("updated_at") or entry.get("created_at")
+            if not isinstance(generated_at, datetime):
+                continue
+            now = datetime.now(timezone.utc) if generated_at.tzinfo else datetime.utcnow()
+            if (now - generated_at).total_seconds() < max_age_seconds:
+                fresh.add(entry["library_key"])
+        return fresh
+
+    @classmethod
+    def warm_up(cls, max_workers: int = None, max_age_seconds: int = None) -> Dict[str, int]:
+        """
+        Pre-generate plans for every missing or stale library combination.
+
+        Args:
+            max_workers: Number of concurrent LLM calls (default: PLAN_LIBRARY_CONCURRENCY)
+            max_age_seconds: Regenerate entries older than this (default: refresh interval)
+
+        Returns:
+            Dict with counts of generated, skipped and failed combinations
+        """
+        ai_agent = AIRecoveryAgent()
+        if not ai_agent.gemini_api_key:
+            # Without an LLM every entry would be the static fallback plan
+            return {"generated": 0, "skipped": len(cls.all_combinations()), "failed": 0}
+
+        max_workers = max_workers or cls.WARMUP_CONCURRENCY
+        max_age_seconds = cls.REFRESH_INTERVAL_SECONDS if max_age_seconds is None else max_age_seconds
+
+        fresh_keys = cls._fresh_keys(max_age_seconds)
+        pending = [
+            (stage_key, factors)
+            for stage_key, factors in cls.all_combinations()
+            if cls.library_key(stage_key, factors) not in fresh_keys
+        ]
+
+        def generate(combo: Tuple[str, Tuple[str, ...]]) -> bool:
+            stage_key, factors = combo
+            try:
+                context = cls.build_context(stage_key, factors)
+                if not cls.context_matches(stage_key, factors, context):
+                    print(f"Plan library context does not score as {cls.library_key(stage_key, factors)}; not stored")
+                    return False
+                recommendations = ai_agent.generate_recovery_plan(context)
+                cls.store(stage_key, factors, recommendations)
+                return True
+            except Exception as e:
+                print(f"Plan library warm-up failed for {cls.library_key(stage_key, factors)}:", e)
+                return False
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            outcomes = list(executor.map(generate, pending))
+
+        generated = sum(1 for ok in outcomes if ok)
+        return {
+            "generated": generated,
+            "skipped": len(fresh_keys),
+            "failed": len(outcomes) - generated,
+        }
+
+    @classmethod
+    def start_background_refresh(cls) -> threading.Thread:
+        """
+        Warm the library in a daemon thread and keep refreshing it on an interval.
+        """
+        if cls._refresh_thread and cls._refresh_thread.is_alive():
+            return cls._refresh_thread
+
+        def refresh_loop():
+            while True:
+                try:
+                    stats = cls.warm_up()
+                    print("Plan library warm-up finished:", stats)
+                except Exception as e:
+                    print("Plan library warm-up failed:", e)
+                time.sleep(cls.REFRESH_INTERVAL_SECONDS)
+
+        cls._refresh_thread = threading.Thread(target=refresh_loop, name="plan-library-refresh", daemon=True)
+        cls._refresh_thread.start()
+        return cls._refresh_thread
+
+
+if __name__ == "__main__":
+    # Scheduled warm-up entry point, e.g. `python -m app.services.plan_library`
+    from app.database import init_db
+
+    init_db()
+    print(PlanLibrary.warm_up())
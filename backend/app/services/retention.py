@@ -0,0 +1,369 @@
+"""
+History partitions and retention.
+Creates monthly partitions of assessments and progress ahead of time
+(PostgreSQL), exports months older than the retention window to compressed
+archive files before removing them, and reads archived history back.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.database import execute_query, get_connection, get_db, IS_POSTGRES
+from app.services.metrics import REGISTRY
+
+ARCHIVED_ROWS = REGISTRY.counter(
+    "history_archived_rows_total", "History rows exported to archive files and removed", ("table",)
+)
+
+# History table -> column its months are cut on
+HISTORY_TABLES = {"assessments": "created_at", "progress": "timestamp"}
+
+
+def month_start(value: datetime) -> datetime:
+    """First instant of the month of a datetime, in UTC."""
+    if value.tzinfo:
+        value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    """Month start count months after (or before, if negative) a month start."""
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+class HistoryRetention:
+    """
+    Partition maintenance, archival and archived reads for history tables.
+    """
+
+    RETENTION_MONTHS = int(os.getenv("HISTORY_RETENTION_MONTHS", "0"))  # 0 keeps all history
+    ARCHIVE_DIR = os.getenv("HISTORY_ARCHIVE_DIR", "./archive")
+    PARTITION_MONTHS_AHEAD = int(os.getenv("HISTORY_PARTITION_MONTHS_AHEAD", "3"))
+    MAINTENANCE_INTERVAL_SECONDS = int(os.getenv("HISTORY_MAINTENANCE_INTERVAL_SECONDS", "86400"))
+
+    # Arbitrary key for pg_advisory_lock, so only one worker archives at a time
+    ADVISORY_LOCK_KEY = 703_712_038
+    FETCH_SIZE = 5000
+
+    _maintenance_thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def partition_name(table: str, month: datetime) -> str:
+        return f"{table}_p{month:%Y_%m}"
+
+    @staticmethod
+    def is_partitioned(cursor, table: str) -> bool:
+        if not IS_POSTGRES:
+            return False
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+        row = cursor.fetchone()
+        return bool(row) and row[0] == "p"
+
+    @classmethod
+    def ensure_partitions(cls) -> List[str]:
+        """
+        Create monthly partitions for the coming months, and for months with rows in
+        the default partition (backfills, bulk loads), moving those rows into them.
+        PostgreSQL only.
+
+        Returns:
+            Names of the partitions created
+        """
+        created = []
+        if not IS_POSTGRES:
+            return created
+        with get_db() as conn:
+            cursor = conn.cursor()
+            # Serializes workers creating the same partitions; released at commit
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (cls.ADVISORY_LOCK_KEY,))
+            for table, column in HISTORY_TABLES.items():
+                if not cls.is_partitioned(cursor, table):
+                    continue
+                current = month_start(datetime.now(timezone.utc))
+                cursor.execute(f"SELECT MIN({column}) FROM {table}_default")
+                oldest = cursor.fetchone()[0]
+                month = min(month_start(oldest), current) if oldest else current
+                while month <= add_months(current, cls.PARTITION_MONTHS_AHEAD):
+                    name = cls.partition_name(table, month)
+                    bounds = (month, add_months(month, 1))
+                    cursor.execute("SELECT to_regclass(%s)", (name,))
+                    if cursor.fetchone()[0] is None:
+                        cursor.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)")
+                        cursor.execute(
+                            f"""
+                            WITH moved AS (
+                                DELETE FROM {table}_default WHERE {column} >= %s AND {column} < %s RETURNING *
+                            )
+                            INSERT INTO {name} SELECT * FROM moved
+                            """,
+                            bounds
+                        )
+                        cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                                       bounds)
+                        created.append(name)
+                    month = add_months(month, 1)
+        if created:
+            print("Created history partitions:", ", ".join(created))
+        return created
+
+    @classmethod
+    def expired_months(cls, cursor, table: str, cutoff: datetime) -> List[datetime]:
+        """Months of a table that end on or before the cutoff and still hold data."""
+        column = HISTORY_TABLES[table]
+        if cls.is_partitioned(cursor, table):
+            cursor.execute(
+                """
+                SELECT c.relname FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = to_regclass(%s)
+                """,
+                (table,)
+            )
+            prefix = f"{table}_p"
+            months = [datetime.strptime(row[0][len(prefix):], "%Y_%m").replace(tzinfo=timezone.utc)
+                      for row in cursor.fetchall() if row[0].startswith(prefix)]
+        elif IS_POSTGRES:
+            cursor.execute(
+                f"SELECT DISTINCT to_char({column} AT TIME ZONE 'UTC', 'YYYY-MM') FROM {table} WHERE {column} < %s",
+                (cutoff,)
+            )
+            months = [datetime.strptime(row[0], "%Y-%m").replace(tzinfo=timezone.utc) for row in cursor.fetchall()]
+        else:
+            cursor.execute(
+                f"SELECT DISTINCT substr({column}, 1, 7) FROM {table} WHERE {column} < ?",
+                (cutoff.strftime("%Y-%m-%d %H:%M:%S"),)
+            )
+            months = [datetime.strptime(row[0], "%Y-%m").replace(tzinfo=timezone.utc) for row in cursor.fetchall()]
+        return sorted(m for m in months if add_months(m, 1) <= cutoff)
+
+    @classmethod
+    def archive_month(cls, table: str, month: datetime) -> Dict[str, Any]:
+        """
+        Export one month of a history table to a gzipped JSON-lines file and remove it
+        from the database (drop the partition, or delete the rows), in one transaction.
+
+        Args:
+            table: "assessments" or "progress"
+            month: First day of the month (UTC)
+
+        Returns:
+            Dict with table, period, rows and path (None when the month was empty)
+        """
+        column = HISTORY_TABLES[table]
+        period = month.strftime("%Y-%m")
+        placeholder = "%s" if IS_POSTGRES else "?"
+        if IS_POSTGRES:
+            bounds = (month, add_months(month, 1))
+        else:
+            bounds = tuple(m.strftime("%Y-%m-%d %H:%M:%S") for m in (month, add_months(month, 1)))
+
+        with get_db() as conn:
+            cursor = conn.cursor()
+            if not IS_POSTGRES:
+                # Take the write lock up front, so no row can be added to the month mid-export
+                cursor.execute("BEGIN IMMEDIATE")
+            partitioned = cls.is_partitioned(cursor, table)
+            if partitioned:
+                # Detached first, so no write can land in the month while it is exported
+                source, where, params = cls.partition_name(table, month), "", ()
+                cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {source}")
+            else:
+                source = table
+                where = f"WHERE {column} >= {placeholder} AND {column} < {placeholder}"
+                params = bounds
+            cursor.execute(f"SELECT * FROM {source} {where} ORDER BY user_id, {column}", params)
+            columns = [d[0] for d in cursor.description]
+
+            relative_path = os.path.join(table, f"{table}_{month:%Y_%m}_{datetime.utcnow():%Y%m%dT%H%M%S}.jsonl.gz")
+            path = os.path.join(cls.ARCHIVE_DIR, relative_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            user_rows: Dict[int, int] = {}
+            with gzip.open(path + ".tmp", "wt", encoding="utf-8") as f:
+                while True:
+                    rows = cursor.fetchmany(cls.FETCH_SIZE)
+                    if not rows:
+                        break
+                    for row in rows:
+                        record = dict(zip(columns, row))
+                        user_rows[record["user_id"]] = user_rows.get(record["user_id"], 0) + 1
+                        f.write(json.dumps(record, default=str) + "\n")
+            row_count = sum(user_rows.values())
+
+            if row_count:
+                with open(path + ".tmp", "rb") as f:
+                    sha256 = hashlib.sha256(f.read()).hexdigest()
+                    os.fsync(f.fileno())
+                os.replace(path + ".tmp", path)
+                manifest = f"""
+                    INSERT INTO history_archives (table_name, period, path, row_count, sha256)
+                    VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
+                """
+                manifest_params = (table, period, relative_path, row_count, sha256)
+                if IS_POSTGRES:
+                    cursor.execute(manifest + " RETURNING archive_id", manifest_params)
+                    archive_id = cursor.fetchone()[0]
+                else:
+                    cursor.execute(manifest, manifest_params)
+                    archive_id = cursor.lastrowid
+                cursor.executemany(
+                    f"INSERT INTO history_archive_users (user_id, archive_id, row_count) "
+                    f"VALUES ({placeholder}, {placeholder}, {placeholder})",
+                    [(user_id, archive_id, count) for user_id, count in user_rows.items()]
+                )
+            else:
+                os.remove(path + ".tmp")
+                relative_path = None
+
+            if partitioned:
+                cursor.execute(f"DROP TABLE {source}")
+            else:
+                cursor.execute(f"DELETE FROM {table} {where}", params)
+
+        ARCHIVED_ROWS.inc(table, amount=row_count)
+        print(f"Archived {table} {period}: {row_count} rows -> {relative_path}")
+        return {"table": table, "period": period, "rows": row_count, "path": relative_path}
+
+    @classmethod
+    def run(cls, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Archive every month older than HISTORY_RETENTION_MONTHS.
+
+        Args:
+            dry_run: Only list the months that would be archived
+
+        Returns:
+            Dict with the cutoff and the archived (or expired, for a dry run) months
+        """
+        if cls.RETENTION_MONTHS <= 0:
+            return {"enabled": False, "archived": []}
+        cutoff = add_months(month_start(datetime.now(timezone.utc)), -cls.RETENTION_MONTHS)
+
+        lock_conn = get_connection()
+        try:
+            lock_cursor = lock_conn.cursor()
+            if IS_POSTGRES:
+                lock_cursor.execute("SELECT pg_try_advisory_lock(%s)", (cls.ADVISORY_LOCK_KEY,))
+                if not lock_cursor.fetchone()[0]:
+                    return {"enabled": True, "cutoff": cutoff, "skipped": "another worker is archiving",
+                            "archived": []}
+            try:
+                expired = [(table, month) for table in HISTORY_TABLES
+                           for month in cls.expired_months(lock_cursor, table, cutoff)]
+                lock_conn.rollback()
+                if dry_run:
+                    archived = [{"table": t, "period": m.strftime("%Y-%m")} for t, m in expired]
+                else:
+                    archived = [cls.archive_month(table, month) for table, month in expired]
+            finally:
+                if IS_POSTGRES:
+                    lock_cursor.execute("SELECT pg_advisory_unlock(%s)", (cls.ADVISORY_LOCK_KEY,))
+                    lock_conn.commit()
+        finally:
+            lock_conn.close()
+        return {"enabled": True, "cutoff": cutoff, "archived": archived}
+
+    @classmethod
+    def read_archived(cls, table: str, user_id: int) -> List[Dict[str, Any]]:
+        """
+        Get a user's archived rows of a history table, most recent first.
+        Only the archive files listing the user are opened.
+
+        Args:
+            table: "assessments" or "progress"
+            user_id: User ID
+
+        Returns:
+            Archived rows as stored (pass through row_to_dict like live rows)
+        """
+        placeholder = "%s" if IS_POSTGRES else "?"
+        archives = execute_query(
+            f"""
+            SELECT a.path FROM history_archive_users u
+            JOIN history_archives a ON a.archive_id = u.archive_id
+            WHERE u.user_id = {placeholder} AND a.table_name = {placeholder}
+            ORDER BY a.period DESC
+            """,
+            (user_id, table),
+            fetch_all=True,
+            name="history_archives.list_by_user"
+        )
+        rows = []
+        for archive in archives or []:
+            with gzip.open(os.path.join(cls.ARCHIVE_DIR, archive["path"]), "rt", encoding="utf-8") as f:
+                for line in f:
+                    row = json.loads(line)
+                    if row["user_id"] == user_id:
+                        rows.append(row)
+        column = HISTORY_TABLES[table]
+        rows.sort(key=lambda row: row[column], reverse=True)
+        return rows
+
+    @classmethod
+    def continue_page(cls, table: str, user_id: int, skip: int, limit: int,
+                      live_rows: int) -> List[Dict[str, Any]]:
+        """
+        Archived rows that continue a page of live history.
+        Archived months are older than every live row, so they follow the live rows.
+
+        Args:
+            table: "assessments" or "progress"
+            user_id: User ID
+            skip: Offset of the page
+            limit: Page size
+            live_rows: Live rows returned for the page
+
+        Returns:
+            Archived rows filling the rest of the page
+        """
+        if live_rows >= limit:
+            return []
+        if live_rows:
+            archive_skip = 0
+        else:
+            placeholder = "%s" if IS_POSTGRES else "?"
+            row = execute_query(
+                f"SELECT COUNT(*) AS n FROM {table} WHERE user_id = {placeholder}",
+                (user_id,), fetch_one=True, name=f"{table}.count_by_user"
+            )
+            archive_skip = max(0, skip - row["n"])
+        return cls.read_archived(table, user_id)[archive_skip:archive_skip + limit - live_rows]
+
+    @classmethod
+    def start_background_maintenance(cls) -> threading.Thread:
+        """
+        Create upcoming partitions and archive expired months in a daemon thread,
+        repeated on an interval.
+        """
+        if cls._maintenance_thread and cls._maintenance_thread.is_alive():
+            return cls._maintenance_thread
+
+        def maintenance_loop():
+            while True:
+                try:
+                    cls.ensure_partitions()
+                    result = cls.run()
+                    if result["archived"]:
+                        print("History retention finished:", result)
+                except Exception as e:
+                    print("History maintenance failed:", e)
+                time.sleep(cls.MAINTENANCE_INTERVAL_SECONDS)
+
+        cls._maintenance_thread = threading.Thread(
+            target=maintenance_loop, name="history-maintenance", daemon=True
+        )
+        cls._maintenance_thread.start()
+        return cls._maintenance_thread
+
+
+if __name__ == "__main__":
+    # Scheduled entry point, e.g. `python -m app.services.retention [--dry-run]`
+    import sys
+
+    print(HistoryRetention.ensure_partitions())
+    print(HistoryRetention.run(dry_run="--dry-run" in sys.argv))
@@ -2,7 +2,7 @@
 Burnout scoring engine.
 Converts questionnaire responses into a numerical burnout score (0-100).
 """
-from typing import Dict, Any
+from typing import Dict, Any, List
 from app.schemas import AssessmentResponse
 
 
@@ -93,6 +93,13 @@ class BurnoutScoringEngine:
         """
         return (level - 1) / 4.0
 
+    @staticmethod
+    def top_factors(breakdown: Dict[str, float], count: int = 3) -> List[str]:
+        """
+        Return the names of the highest contributing factors in a score breakdown.
+        """
+        return [factor for factor, _ in sorted(breakdown.items(), key=lambda x: x[1], reverse=True)[:count]]
+
     @classmethod
     def calculate_score(cls, responses: AssessmentResponse) -> Dict[str, Any]:
         """
@@ -139,7 +146,7 @@ class BurnoutScoringEngine:
         }
 
         # Generate explanation
-        top_factors = sorted(breakdown.items(), key=lambda x: x[1], reverse=True)[:3]
+        top_factors = [(factor, breakdown[factor]) for factor in cls.top_factors(breakdown)]
         explanation = f"Your burnout score is {score:.1f}/100. "
         explanation += "Primary contributing factors: "
         explanation += ", ".join([f"{factor} ({value:.1f}%)" for factor, value in top_factors])
@@ -0,0 +1,281 @@
+"""
+Cache shared by all worker processes on a host.
+Entries live in a local SQLite file (WAL, memory-mapped reads), so a value
+cached by one worker is a hit for the others, and deleting an entry or
+clearing a namespace invalidates it for every worker at once. Reads take
+tens of microseconds, against a network round trip to PostgreSQL.
+
+Workers on different hosts do not share the file; keep TTLs short there.
+Cache errors never fail a request: they count as misses.
+
+Deleting a key (or clearing a namespace) also bumps its generation, and
+get_or_load only stores what it loaded if the generation did not move
+during the load. A reader that loaded a row just before a writer committed
+therefore cannot put the old row back after the writer's delete.
+"""
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from app.database import IS_POSTGRES
+from app.services.metrics import CACHE_REQUESTS
+
+
+class SharedCache:
+    """
+    Namespaced key-value cache with TTLs in a SQLite file shared across processes.
+    """
+
+    # On by default where the primary database is remote; a local SQLite database gains little
+    ENABLED = os.getenv("SHARED_CACHE_ENABLED", "true" if IS_POSTGRES else "false").lower() in ("1", "true", "yes")
+    PATH = os.getenv("SHARED_CACHE_PATH", os.path.join(tempfile.gettempdir(), "burnout_shared_cache.db"))
+    DEFAULT_TTL_SECONDS = int(os.getenv("SHARED_CACHE_TTL_SECONDS", "300"))
+    MMAP_BYTES = 64 * 1024 * 1024
+    PURGE_EVERY = 1000  # Delete expired entries every N sets per process
+    # Generations only need to outlive a load; "*" is the whole namespace's generation
+    GENERATION_TTL_SECONDS = 24 * 3600
+    ALL_KEYS = "*"
+
+    _local = threading.local()
+    _sets = 0
+    _lock = threading.Lock()
+    _metrics: Dict[str, tuple] = {}
+
+    @classmethod
+    def _connection(cls) -> sqlite3.Connection:
+        """
+        Connection for the current thread, reopened after a fork so processes never share one.
+        """
+        conn = getattr(cls._local, "conn", None)
+        if conn is not None and cls._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(cls.PATH, timeout=1.0, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Entries can be recomputed, so skip fsync
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute(f"PRAGMA mmap_size={cls.MMAP_BYTES}")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID
+            """
+        )
+        cls._local.conn, cls._local.pid = conn, os.getpid()
+        return conn
+
+    @classmethod
+    def _count(cls, namespace: str, hit: bool):
+        if namespace not in cls._metrics:
+            cls._metrics[namespace] = (CACHE_REQUESTS.labels(namespace, "hit"), CACHE_REQUESTS.labels(namespace, "miss"))
+        cls._metrics[namespace][0 if hit else 1].inc()
+
+    @classmethod
+    def get(cls, namespace: str, key: Any) -> Optional[Any]:
+        """
+        Get a cached value, or None if missing, expired or the cache is disabled.
+        """
+        if not cls.ENABLED:
+            return None
+        try:
+            row = cls._connection().execute(
+                "SELECT value FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, str(key), time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            print("Shared cache read failed:", e)
+            row = None
+        cls._count(namespace, row is not None)
+        return json.loads(row[0]) if row else None
+
+    @staticmethod
+    def _generation_namespace(namespace: str) -> str:
+        return f"gen:{namespace}"
+
+    @classmethod
+    def generation(cls, namespace: str, key: Any) -> Optional[str]:
+        """
+        Current generation of a key (its own and its namespace's), or None if unavailable.
+        """
+        if not cls.ENABLED:
+            return None
+        try:
+            rows = cls._connection().execute(
+                "SELECT key, value FROM cache_entries WHERE namespace = ? AND key IN (?, ?)",
+                (cls._generation_namespace(namespace), str(key), cls.ALL_KEYS)
+            ).fetchall()
+        except sqlite3.Error as e:
+            print("Shared cache read failed:", e)
+            return None
+        values = dict(rows)
+        return f"{values.get(str(key), '0')}:{values.get(cls.ALL_KEYS, '0')}"
+
+    @classmethod
+    def set(cls, namespace: str, key: Any, value: Any, ttl_seconds: int = None, generation: str = None):
+        """
+        Cache a JSON-serializable value for ttl_seconds (default: SHARED_CACHE_TTL_SECONDS).
+        Datetimes are stored as strings; response models parse them back.
+        With a generation (see generation()), nothing is stored if the key was
+        invalidated since that generation was read.
+        """
+        if not cls.ENABLED:
+            return
+        ttl = cls.DEFAULT_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        try:
+            params = (namespace, str(key), json.dumps(value, default=str), time.time() + ttl)
+            if generation is None:
+                cls._connection().execute(
+                    "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                    params
+                )
+            else:
+                # One statement, so no delete can land between the check and the write
+                cls._connection().execute(
+                    """
+                    INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at)
+                    SELECT ?, ?, ?, ?
+                    WHERE COALESCE((SELECT value FROM cache_entries WHERE namespace = ? AND key = ?), '0')
+                          || ':' ||
+                          COALESCE((SELECT value FROM cache_entries WHERE namespace = ? AND key = ?), '0') = ?
+                    """,
+                    params + (cls._generation_namespace(namespace), str(key),
+                              cls._generation_namespace(namespace), cls.ALL_KEYS, generation)
+                )
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print("Shared cache write failed:", e)
+            return
+
+        with cls._lock:
+            cls._sets += 1
+            purge = cls._sets % cls.PURGE_EVERY == 0
+        if purge:
+            cls.purge_expired()
+
+    @classmethod
+    def get_or_load(cls, namespace: str, key: Any, loader: Callable[[], Any], ttl_seconds: int = None) -> Any:
+        """
+        Get a cached value, or call loader and cache its result (None results are not cached).
+        The result is not cached if the key was invalidated while loading.
+        """
+        value = cls.get(namespace, key)
+        if value is None:
+            generation = cls.generation(namespace, key)
+            value = loader()
+            if value is not None and generation is not None:
+                cls.set(namespace, key, value, ttl_seconds, generation)
+        return value
+
+    @classmethod
+    def incr(cls, namespace: str, key: Any, ttl_seconds: int = None) -> Optional[int]:
+        """
+        Atomically increment an integer counter shared by every worker.
+        A missing or expired counter starts from a random value, so a counter
+        that was dropped never repeats the values it handed out before.
+
+        Returns:
+            The new value, or None if the cache is disabled or unavailable
+        """
+        if not cls.ENABLED:
+            return None
+        ttl = cls.DEFAULT_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        now = time.time()
+        try:
+            row = cls._connection().execute(
+                """
+                INSERT INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (namespace, key) DO UPDATE SET
+                    value = CASE WHEN expires_at > ? THEN CAST(value AS INTEGER) + 1 ELSE excluded.value END,
+                    expires_at = excluded.expires_at
+                RETURNING value
+                """,
+                (namespace, str(key), str(random.getrandbits(48)), now + ttl, now)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print("Shared cache increment failed:", e)
+            return None
+        return int(row[0])
+
+    @classmethod
+    def delete(cls, namespace: str, keys: Iterable[Any]):
+        """
+        Invalidate keys in a namespace for every worker, including loads in flight.
+        """
+        if not cls.ENABLED:
+            return
+        keys = [str(key) for key in keys]
+        try:
+            cls._connection().executemany(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                [(namespace, key) for key in keys]
+            )
+        except sqlite3.Error as e:
+            print("Shared cache delete failed:", e)
+        for key in keys:
+            cls.incr(cls._generation_namespace(namespace), key, cls.GENERATION_TTL_SECONDS)
+
+    @classmethod
+    def clear(cls, namespace: Optional[str] = None) -> int:
+        """
+        Invalidate a whole namespace (or everything) for every worker.
+
+        Returns:
+            Number of entries removed (0 if the cache is disabled or unavailable)
+        """
+        if not cls.ENABLED:
+            return 0
+        try:
+            conn = cls._connection()
+            if namespace is None:
+                namespaces = [row[0] for row in conn.execute(
+                    "SELECT DISTINCT namespace FROM cache_entries WHERE namespace NOT LIKE 'gen:%'"
+                )]
+                removed = conn.execute("DELETE FROM cache_entries WHERE namespace NOT LIKE 'gen:%'").rowcount
+            else:
+                namespaces = [namespace]
+                removed = conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,)).rowcount
+        except sqlite3.Error as e:
+            print("Shared cache clear failed:", e)
+            return 0
+        for cleared in namespaces:
+            cls.incr(cls._generation_namespace(cleared), cls.ALL_KEYS, cls.GENERATION_TTL_SECONDS)
+        return removed
+
+    @classmethod
+    def purge_expired(cls) -> int:
+        """Delete expired entries."""
+        try:
+            return cls._connection().execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),)).rowcount
+        except sqlite3.Error as e:
+            print("Shared cache purge failed:", e)
+            return 0
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        """
+        Entries per namespace and the size of the cache file.
+        """
+        if not cls.ENABLED:
+            return {"enabled": False}
+        try:
+            rows = cls._connection().execute(
+                "SELECT namespace, COUNT(*), SUM(expires_at > ?) FROM cache_entries GROUP BY namespace",
+                (time.time(),)
+            ).fetchall()
+        except sqlite3.Error as e:
+            print("Shared cache stats failed:", e)
+            return {"enabled": True, "path": cls.PATH, "error": str(e)}
+        return {
+            "enabled": True,
+            "path": cls.PATH,
+            "size_bytes": os.path.getsize(cls.PATH) if os.path.exists(cls.PATH) else 0,
+            "namespaces": {namespace: {"entries": total, "live": live or 0} for namespace, total, live in rows},
+        }
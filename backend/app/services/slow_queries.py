@@ -0,0 +1,175 @@
+"""
+Slow-query log.
+Records statements slower than a configurable threshold by normalized
+fingerprint, with parameter shapes but never parameter values, and captures
+each fingerprint's execution plan once.
+"""
+import hashlib
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from app.services.metrics import REGISTRY
+
+SLOW_QUERIES = REGISTRY.counter(
+    "db_slow_queries_total", "Queries slower than SLOW_QUERY_THRESHOLD_MS by named query", ("query",)
+)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+# Plan lines holding expressions with the statement's values (not the row and timing counts)
+_PLAN_CONDITION = re.compile(r"^(\s*(?:(?:Index|Recheck|Hash|Merge) Cond|(?:Join |One-Time )?Filter): )(.*)$")
+
+
+class SlowQueryLog:
+    """
+    In-process log of slow query fingerprints.
+    """
+
+    THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+    CAPTURE_PLANS = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() in ("1", "true", "yes")
+    MAX_FINGERPRINTS = 500
+
+    _entries: Dict[str, Dict[str, Any]] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """
+        Normalize a statement: literals and placeholders become ?, IN lists collapse
+        and whitespace is squeezed, so statements differing only in values match.
+        """
+        normalized = _STRING_LITERAL.sub("?", query)
+        normalized = normalized.replace("%s", "?")
+        normalized = _NUMBER_LITERAL.sub("?", normalized)
+        normalized = _PLACEHOLDER_LIST.sub("(?, ...)", normalized)
+        return _WHITESPACE.sub(" ", normalized).strip()
+
+    @staticmethod
+    def fingerprint(normalized: str) -> str:
+        """Short stable id for a normalized statement."""
+        return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+    @staticmethod
+    def param_shape(params: Optional[tuple]) -> List[str]:
+        """Types of the parameters (list lengths included), without their values."""
+        shape = []
+        for param in params or ():
+            if isinstance(param, (list, tuple)):
+                shape.append(f"list[{len(param)}]")
+            else:
+                shape.append(type(param).__name__)
+        return shape
+
+    @staticmethod
+    def scrub_plan(lines: List[str]) -> List[str]:
+        """
+        Remove values from plan output: string literals everywhere, and numeric
+        constants in conditions and filters (e.g. user_id = 1234). Costs, row
+        counts, timings and buffers are kept.
+        """
+        scrubbed = []
+        for line in lines:
+            line = _STRING_LITERAL.sub("'?'", line)
+            condition = _PLAN_CONDITION.match(line)
+            if condition:
+                line = condition.group(1) + _NUMBER_LITERAL.sub("?", condition.group(2))
+            scrubbed.append(line)
+        return scrubbed
+
+    @classmethod
+    def record(cls, name: str, query: str, params: Optional[tuple], duration_ms: float,
+               rows: Optional[int], explain: Callable[[str, Optional[tuple]], List[str]] = None):
+        """
+        Record a slow statement and capture its plan on first sight.
+
+        Args:
+            name: Query name passed to execute_query
+            query: SQL statement
+            params: Statement parameters (used for EXPLAIN only, never stored)
+            duration_ms: Execution time in milliseconds
+            rows: Rows returned or affected
+            explain: Function returning the plan lines for a statement
+        """
+        normalized = cls.normalize(query)
+        fingerprint = cls.fingerprint(normalized)
+        now = datetime.utcnow()
+        SLOW_QUERIES.inc(name)
+
+        with cls._lock:
+            entry = cls._entries.get(fingerprint)
+            first_seen = entry is None
+            if first_seen:
+                if len(cls._entries) >= cls.MAX_FINGERPRINTS:
+                    # Evict the fingerprint with the smallest worst case
+                    del cls._entries[min(cls._entries, key=lambda k: cls._entries[k]["max_ms"])]
+                entry = cls._entries[fingerprint] = {
+                    "fingerprint": fingerprint,
+                    "name": name,
+                    "query": normalized,
+                    "param_shape": cls.param_shape(params),
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "max_rows": 0,
+                    "plan": None,
+                    "first_seen": now,
+                }
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["last_ms"] = duration_ms
+            entry["last_rows"] = rows
+            entry["max_rows"] = max(entry["max_rows"], rows or 0)
+            entry["last_seen"] = now
+
+        print(f"Slow query [{name}] {fingerprint} {duration_ms:.1f}ms rows={rows}: {normalized}")
+
+        if first_seen and explain and cls.CAPTURE_PLANS:
+            # Capture off the request path; EXPLAIN ANALYZE re-runs the statement
+            threading.Thread(
+                target=cls._capture_plan, args=(fingerprint, explain, query, params),
+                name="slow-query-explain", daemon=True
+            ).start()
+
+    @classmethod
+    def _capture_plan(cls, fingerprint: str, explain: Callable, query: str, params: Optional[tuple]):
+        try:
+            plan = cls.scrub_plan(explain(query, params))
+        except Exception as e:
+            plan = [f"EXPLAIN failed: {type(e).__name__}"]
+        with cls._lock:
+            if fingerprint in cls._entries:
+                cls._entries[fingerprint]["plan"] = plan
+
+    @classmethod
+    def top(cls, limit: int = 10, sort_by: str = "max_ms") -> List[Dict[str, Any]]:
+        """
+        Get the slowest query fingerprints.
+
+        Args:
+            limit: Number of fingerprints to return
+            sort_by: max_ms, total_ms, avg_ms or count
+
+        Returns:
+            List of fingerprint entries, slowest first
+        """
+        with cls._lock:
+            entries = [dict(entry) for entry in cls._entries.values()]
+        for entry in entries:
+            entry["avg_ms"] = round(entry["total_ms"] / entry["count"], 2)
+            entry["total_ms"] = round(entry["total_ms"], 2)
+            entry["max_ms"] = round(entry["max_ms"], 2)
+            entry["last_ms"] = round(entry["last_ms"], 2)
+        entries.sort(key=lambda e: e[sort_by], reverse=True)
+        return entries[:limit]
+
+    @classmethod
+    def reset(cls):
+        """Clear all recorded fingerprints."""
+        with cls._lock:
+            cls._entries.clear()
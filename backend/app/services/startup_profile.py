@@ -0,0 +1,85 @@
+"""
+Startup profiler.
+Records how long each boot phase (imports, app setup, schema initialization)
+takes so cold-start time can be tracked across deploys.
+"""
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+def _process_age_ms() -> Optional[float]:
+    """
+    Milliseconds since this process started (Linux only), covering interpreter
+    startup and everything imported before the profiler.
+    """
+    try:
+        with open("/proc/self/stat", "r") as f:
+            # Fields after the command name, which may contain spaces; starttime is field 22
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        return round((uptime - started) * 1000, 1)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupProfiler:
+    """
+    Boot phase timings for this process.
+    Phases are measured from the previous mark; the first from when this module
+    was imported.
+    """
+
+    _origin = time.perf_counter()
+    _before_profiler_ms = _process_age_ms()
+    _last = _origin
+    _phases: List[Dict[str, Any]] = []
+    _completed_at: Optional[datetime] = None
+
+    @classmethod
+    def mark(cls, phase: str, **details: Any):
+        """
+        End a boot phase.
+
+        Args:
+            phase: Phase name, e.g. "import app modules"
+            details: Extra facts about the phase, e.g. schema_applied=False
+        """
+        now = time.perf_counter()
+        entry = {"phase": phase, "duration_ms": round((now - cls._last) * 1000, 1)}
+        if details:
+            entry["details"] = details
+        cls._phases.append(entry)
+        cls._last = now
+
+    @classmethod
+    def complete(cls):
+        """Mark the end of startup and print the report."""
+        cls._completed_at = datetime.utcnow()
+        report = cls.report()
+        phases = ", ".join(f"{p['phase']} {p['duration_ms']:.0f}ms" for p in report["phases"])
+        before = report["before_profiler_ms"]
+        prefix = f"interpreter and early imports {before:.0f}ms, " if before is not None else ""
+        print(f"Startup finished in {report['total_ms']:.0f}ms ({prefix}{phases})")
+
+    @classmethod
+    def report(cls) -> Dict[str, Any]:
+        """
+        Get the startup report.
+
+        Returns:
+            Dict with time spent before the profiler was imported (None where
+            unavailable), the phases in order and the total
+        """
+        profiled_ms = round((cls._last - cls._origin) * 1000, 1)
+        before = cls._before_profiler_ms
+        return {
+            "pid": os.getpid(),
+            "completed_at": cls._completed_at,
+            "before_profiler_ms": before,
+            "phases": list(cls._phases),
+            "total_ms": round(profiled_ms + (before or 0.0), 1),
+        }
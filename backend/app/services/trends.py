@@ -0,0 +1,497 @@
+"""
+Incremental per-user trend statistics for assessment and progress scores.
+
+Each (user, series) row in user_trends holds exponentially decayed running
+sums. A new score decays the sums to its own timestamp and adds itself, so an
+update is O(1) and reads no history:
+    - ewma: decayed mean of the scores
+    - slope: decayed least-squares fit of score against time, so irregular
+      check-ins count by when they happened rather than by position
+    - volatility: decayed standard deviation of the scores around that fit
+    - streak: direction of the latest steps (up, down, flat) and how many in a row
+
+Weights halve every TREND_HALF_LIFE_DAYS. Times are stored relative to the
+latest score, so the sums stay small however long the history gets.
+
+recompute_all rebuilds the table from the history tables, e.g. after a bulk
+load that bypassed the API. It is vectorized with NumPy when installed
+(optional dependency) and folds user by user otherwise.
+
+Usage (from the backend directory):
+    python -m app.services.trends recompute
+"""
+import argparse
+import importlib.util
+import math
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+# Imported only by the vectorized recompute, so request paths don't pay for it at boot
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+
+from app.database import execute_batch, execute_query, get_connection, get_db, IS_POSTGRES
+
+# series -> (table, score column, time column, id column)
+SERIES = {
+    "assessment": ("assessments", "burnout_score", "created_at", "assessment_id"),
+    "progress": ("progress", "weekly_score", "timestamp", "progress_id"),
+}
+
+STATE_COLUMNS = [
+    "observations", "last_at", "last_score", "previous_score",
+    "weight", "sum_t", "sum_tt", "sum_x", "sum_tx", "sum_xx",
+    "streak_direction", "streak_length",
+]
+
+SECONDS_PER_DAY = 86400.0
+
+
+def epoch_seconds(value: Any) -> float:
+    """Database timestamp (datetime on PostgreSQL, text on SQLite) as UTC epoch seconds."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def epoch_sql(column: str) -> str:
+    """SQL expression for a timestamp column as UTC epoch seconds."""
+    if IS_POSTGRES:
+        return f"EXTRACT(EPOCH FROM {column})"
+    return f"(julianday({column}) - 2440587.5) * {SECONDS_PER_DAY}"
+
+
+class TrendEngine:
+    """
+    Maintains and summarizes per-user trend statistics.
+    """
+
+    HALF_LIFE_DAYS = float(os.getenv("TREND_HALF_LIFE_DAYS", "28"))
+    STREAK_MIN_CHANGE = 5.0     # Smaller steps count as flat
+    MIN_SPAN_DAYS = 1.0 / 24    # Scores closer together than this give no slope
+    RECOMPUTE_CHUNK_USERS = 20000
+
+    @staticmethod
+    def empty_state() -> Dict[str, Any]:
+        """State of a series with no scores yet."""
+        state = {column: 0.0 for column in STATE_COLUMNS}
+        state.update(observations=0, last_at=None, last_score=None, previous_score=None,
+                     streak_direction=None, streak_length=0)
+        return state
+
+    @classmethod
+    def step_direction(cls, step: float) -> str:
+        if step >= cls.STREAK_MIN_CHANGE:
+            return "up"
+        if step <= -cls.STREAK_MIN_CHANGE:
+            return "down"
+        return "flat"
+
+    @classmethod
+    def update(cls, state: Dict[str, Any], score: float, at: float) -> Dict[str, Any]:
+        """
+        Add one score to a state in O(1).
+
+        Args:
+            state: Current state (see empty_state)
+            score: New score
+            at: Epoch seconds of the new score, not earlier than state["last_at"]
+
+        Returns:
+            New state dict
+        """
+        new = dict(state)
+        if not state["observations"]:
+            new.update(observations=1, last_at=at, last_score=score, previous_score=None,
+                       weight=1.0, sum_t=0.0, sum_tt=0.0, sum_x=score, sum_tx=0.0, sum_xx=score * score,
+                       streak_direction=None, streak_length=0)
+            return new
+
+        dt = (at - state["last_at"]) / SECONDS_PER_DAY
+        decay = 0.5 ** (dt / cls.HALF_LIFE_DAYS)
+        w, t, tt, x, tx, xx = (state[k] * decay for k in ("weight", "sum_t", "sum_tt", "sum_x", "sum_tx", "sum_xx"))
+        # Move the time origin to the new score: every earlier time becomes t - dt
+        tt = tt - 2 * dt * t + dt * dt * w
+        tx = tx - dt * x
+        t = t - dt * w
+
+        direction = cls.step_direction(score - state["last_score"])
+        new.update(
+            observations=state["observations"] + 1,
+            last_at=at,
+            last_score=score,
+            previous_score=state["last_score"],
+            weight=w + 1.0, sum_t=t, sum_tt=tt, sum_x=x + score, sum_tx=tx, sum_xx=xx + score * score,
+            streak_direction=direction,
+            streak_length=state["streak_length"] + 1 if direction == state["streak_direction"] else 1,
+        )
+        return new
+
+    @classmethod
+    def fold(cls, points: List[tuple]) -> Dict[str, Any]:
+        """
+        Build a state from (score, epoch seconds) points, oldest first.
+        """
+        state = cls.empty_state()
+        for score, at in points:
+            state = cls.update(state, score, at)
+        return state
+
+    @classmethod
+    def summarize(cls, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Trend statistics of a state.
+
+        Returns:
+            Dict with observations, ewma, slope_per_week (None when the scores
+            span less than MIN_SPAN_DAYS), fitted_change (slope times the span
+            the weights cover), volatility, streak, last_score and previous_score
+        """
+        summary = {
+            "observations": state["observations"],
+            "ewma": None,
+            "slope_per_week": None,
+            "fitted_change": None,
+            "volatility": None,
+            "streak": {"direction": state["streak_direction"], "length": state["streak_length"]},
+            "last_score": state["last_score"],
+            "previous_score": state["previous_score"],
+        }
+        if not state["observations"]:
+            return summary
+
+        w = state["weight"]
+        mean_x = state["sum_x"] / w
+        mean_t = state["sum_t"] / w
+        var_t = state["sum_tt"] / w - mean_t * mean_t
+        cov_tx = state["sum_tx"] / w - mean_t * mean_x
+        var_x = state["sum_xx"] / w - mean_x * mean_x
+        # Times are <= 0 relative to the latest score; twice the mean age spans the window
+        span_days = -2 * mean_t
+
+        residual_var = var_x
+        if span_days >= cls.MIN_SPAN_DAYS and var_t > 0:
+            slope = cov_tx / var_t
+            residual_var = var_x - slope * cov_tx
+            summary["slope_per_week"] = round(slope * 7, 3)
+            summary["fitted_change"] = round(slope * span_days, 2)
+        summary["ewma"] = round(mean_x, 2)
+        summary["volatility"] = round(math.sqrt(max(residual_var, 0.0)), 2)
+        return summary
+
+    @staticmethod
+    def _state_from_row(row) -> Dict[str, Any]:
+        return {column: row[column] for column in STATE_COLUMNS}
+
+    @classmethod
+    def _select_sql(cls, where: str) -> str:
+        return f"SELECT user_id, series, {', '.join(STATE_COLUMNS)} FROM user_trends WHERE {where}"
+
+    @classmethod
+    def _upsert_sql(cls) -> str:
+        placeholder = "%s" if IS_POSTGRES else "?"
+        columns = ["user_id", "series"] + STATE_COLUMNS
+        updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in STATE_COLUMNS)
+        return f"""
+            INSERT INTO user_trends ({', '.join(columns)}, updated_at)
+            VALUES ({', '.join(placeholder for _ in columns)}, CURRENT_TIMESTAMP)
+            ON CONFLICT (user_id, series) DO UPDATE SET {updates}, updated_at = CURRENT_TIMESTAMP
+        """
+
+    @classmethod
+    def _history_sql(cls, series: str, where: str) -> str:
+        table, score_column, time_column, id_column = SERIES[series]
+        return f"""
+            SELECT user_id, {epoch_sql(time_column)} AS observed_at, {score_column} AS score FROM {table}
+            WHERE {where}
+            ORDER BY user_id, {time_column}, {id_column}
+        """
+
+    @classmethod
+    def observe(cls, user_id: int, series: str, score: float, at: Any) -> Dict[str, Any]:
+        """
+        Record a new score that was just inserted into the series' history table.
+        Reads and writes one row; a missing row or a backdated score rebuilds the
+        user's series from history instead.
+
+        Args:
+            user_id: User ID
+            series: "assessment" or "progress"
+            score: The new score
+            at: Timestamp of the new score (datetime, text or epoch seconds)
+
+        Returns:
+            The user's new state for the series
+        """
+        with get_db() as conn:
+            cursor = conn.cursor()
+            if not IS_POSTGRES:
+                # Take the write lock before reading, so concurrent scores are not lost
+                cursor.execute("BEGIN IMMEDIATE")
+            return cls.observe_in(cursor, user_id, series, score, at)
+
+    @classmethod
+    def observe_in(cls, cursor, user_id: int, series: str, score: float, at: Any) -> Dict[str, Any]:
+        """
+        observe() inside the caller's transaction, e.g. the one that inserted the score.
+        On SQLite the transaction must hold the write lock (BEGIN IMMEDIATE).
+        """
+        placeholder = "%s" if IS_POSTGRES else "?"
+        at = epoch_seconds(at)
+        lock = " FOR UPDATE" if IS_POSTGRES else ""
+        cursor.execute(
+            cls._select_sql(f"user_id = {placeholder} AND series = {placeholder}") + lock,
+            (user_id, series)
+        )
+        row = cursor.fetchone()
+        state = dict(zip(STATE_COLUMNS, tuple(row)[2:])) if row else None
+        if state is None or (state["observations"] and at < state["last_at"]):
+            cursor.execute(cls._history_sql(series, f"user_id = {placeholder}"), (user_id,))
+            state = cls.fold([(score_, at_) for _, at_, score_ in cursor.fetchall()])
+        else:
+            state = cls.update(state, score, at)
+        cursor.execute(cls._upsert_sql(), (user_id, series) + tuple(state[c] for c in STATE_COLUMNS))
+        return state
+
+    @classmethod
+    def rebuild(cls, user_id: int, series: str) -> Dict[str, Any]:
+        """
+        Rebuild one user's series from history and store it (also when empty,
+        so users without history are not rebuilt on every read).
+        """
+        placeholder = "%s" if IS_POSTGRES else "?"
+        rows = execute_query(
+            cls._history_sql(series, f"user_id = {placeholder}"), params=(user_id,),
+            fetch_all=True, name=f"trends.history.{series}"
+        )
+        state = cls.fold([(row["score"], row["observed_at"]) for row in rows or []])
+        execute_batch(
+            [(cls._upsert_sql(), [(user_id, series) + tuple(state[c] for c in STATE_COLUMNS)])],
+            name="trends.rebuild"
+        )
+        return state
+
+    @classmethod
+    def get(cls, user_id: int, rebuild_missing: bool = True) -> Dict[str, Dict[str, Any]]:
+        """
+        Get a user's states with one primary key lookup.
+
+        Args:
+            user_id: User ID
+            rebuild_missing: Rebuild series that have no row yet from history
+
+        Returns:
+            Dict mapping series to state
+        """
+        placeholder = "%s" if IS_POSTGRES else "?"
+        rows = execute_query(
+            cls._select_sql(f"user_id = {placeholder}"), params=(user_id,), fetch_all=True, name="trends.get"
+        )
+        states = {row["series"]: cls._state_from_row(row) for row in rows or []}
+        if rebuild_missing:
+            for series in SERIES:
+                if series not in states:
+                    states[series] = cls.rebuild(user_id, series)
+        return states
+
+    @classmethod
+    def get_for_users(cls, user_ids: List[int], chunk_size: int = 500) -> Dict[int, Dict[str, Dict[str, Any]]]:
+        """
+        Get the stored states of many users with set-based queries (no rebuilds).
+
+        Returns:
+            Dict mapping user_id to a dict of series -> state
+        """
+        states: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        for i in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[i:i + chunk_size]
+            if IS_POSTGRES:
+                where, params = "user_id = ANY(%s)", (list(chunk),)
+            else:
+                where, params = f"user_id IN ({', '.join('?' for _ in chunk)})", tuple(chunk)
+            rows = execute_query(cls._select_sql(where), params=params, fetch_all=True, name="trends.get_for_users")
+            for row in rows or []:
+                states.setdefault(row["user_id"], {})[row["series"]] = cls._state_from_row(row)
+        return states
+
+    @classmethod
+    def get_range(cls, series: str, first: int, last: int) -> Dict[int, Dict[str, Any]]:
+        """
+        Get the stored states of a user id range with one primary key range scan.
+        """
+        placeholder = "%s" if IS_POSTGRES else "?"
+        rows = execute_query(
+            cls._select_sql(f"series = {placeholder} AND user_id BETWEEN {placeholder} AND {placeholder}"),
+            params=(series, first, last), fetch_all=True, name="trends.get_range"
+        )
+        return {row["user_id"]: cls._state_from_row(row) for row in rows or []}
+
+    @classmethod
+    def _states_python(cls, rows: List[tuple]) -> Dict[int, Dict[str, Any]]:
+        """States per user by folding (user_id, epoch, score) rows ordered by user and time."""
+        states: Dict[int, Dict[str, Any]] = {}
+        for user_id, at, score in rows:
+            states[user_id] = cls.update(states.get(user_id) or cls.empty_state(), score, at)
+        return states
+
+    @classmethod
+    def _states_numpy(cls, rows: List[tuple]) -> Dict[int, Dict[str, Any]]:
+        """
+        Same result as _states_python, computed for all users at once.
+        Each score's weight after all updates is 0.5 ** (age / half-life), with
+        age measured from the user's latest score, so the sums are segment sums.
+        """
+        import numpy as np
+
+        data = np.asarray(rows, dtype=np.float64)
+        users, days, x = data[:, 0], data[:, 1] / SECONDS_PER_DAY, data[:, 2]
+        n = len(users)
+        starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+        ends = np.r_[starts[1:], n] - 1
+        counts = ends - starts + 1
+        group = np.repeat(np.arange(len(starts)), counts)
+
+        t = days - days[ends][group]
+        w = 0.5 ** (-t / cls.HALF_LIFE_DAYS)
+        sums = {
+            "weight": w, "sum_t": w * t, "sum_tt": w * t * t,
+            "sum_x": w * x, "sum_tx": w * t * x, "sum_xx": w * x * x,
+        }
+        sums = {name: np.add.reduceat(values, starts) for name, values in sums.items()}
+
+        # Streaks: 1 up, -1 down, 0 flat for every step; 2 marks a user's first score
+        step = np.r_[0.0, np.diff(x)]
+        direction = np.where(step >= cls.STREAK_MIN_CHANGE, 1, np.where(step <= -cls.STREAK_MIN_CHANGE, -1, 0))
+        is_start = np.zeros(n, dtype=bool)
+        is_start[starts] = True
+        direction[is_start] = 2
+        run_begins = np.r_[True, (direction[1:] != direction[:-1]) | is_start[:-1]]
+        run_start = np.maximum.accumulate(np.where(run_begins, np.arange(n), 0))
+        names = {1: "up", -1: "down", 0: "flat"}
+
+        states = {}
+        for g, end in enumerate(ends):
+            multiple = counts[g] > 1
+            state = {name: float(values[g]) for name, values in sums.items()}
+            state.update(
+                observations=int(counts[g]),
+                last_at=float(data[end, 1]),
+                last_score=float(x[end]),
+                previous_score=float(x[end - 1]) if multiple else None,
+                streak_direction=names[int(direction[end])] if multiple else None,
+                streak_length=int(end - run_start[end] + 1) if multiple else 0,
+            )
+            states[int(users[end])] = state
+        return states
+
+    @classmethod
+    def rebuild_range(cls, series: str, first: int, last: int, missing_only: bool = False,
+                      use_numpy: Optional[bool] = None) -> Dict[int, Dict[str, Any]]:
+        """
+        Rebuild the states of a user id range from history and store them.
+
+        Args:
+            series: "assessment" or "progress"
+            first: First user id of the range
+            last: Last user id of the range (inclusive)
+            missing_only: Only build users with history but no stored state,
+                          leaving existing rows untouched
+            use_numpy: Force the NumPy (True) or pure Python (False) path
+                       (default: NumPy when installed)
+
+        Returns:
+            Dict mapping user_id to the rebuilt state
+        """
+        use_numpy = NUMPY_AVAILABLE if use_numpy is None else use_numpy
+        if use_numpy and not NUMPY_AVAILABLE:
+            raise ImportError("numpy is required for the vectorized recompute. Install with: pip install numpy")
+        placeholder = "%s" if IS_POSTGRES else "?"
+        table = SERIES[series][0]
+        where = f"user_id BETWEEN {placeholder} AND {placeholder}"
+        params = (first, last)
+        if missing_only:
+            where += (f" AND NOT EXISTS (SELECT 1 FROM user_trends t "
+                      f"WHERE t.user_id = {table}.user_id AND t.series = {placeholder})")
+            params += (series,)
+
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(cls._history_sql(series, where), params)
+            rows = [tuple(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+        if not rows:
+            states = {}
+        elif use_numpy:
+            states = cls._states_numpy(rows)
+        else:
+            states = cls._states_python(rows)
+
+        statements = []
+        if not missing_only:
+            # Replace the range in one transaction, so readers never see it half written
+            statements.append((
+                f"DELETE FROM user_trends WHERE series = {placeholder} AND user_id BETWEEN {placeholder} AND {placeholder}",
+                [(series, first, last)]
+            ))
+        statements.append((cls._upsert_sql(), [
+            (user_id, series) + tuple(state[c] for c in STATE_COLUMNS) for user_id, state in states.items()
+        ]))
+        execute_batch(statements, name="trends.rebuild_range")
+        return states
+
+    @staticmethod
+    def user_id_bounds() -> tuple:
+        """(lowest, highest) user id, or (None, None) without users."""
+        bounds = execute_query(
+            "SELECT MIN(user_id) AS low, MAX(user_id) AS high FROM users", fetch_one=True, name="users.id_bounds"
+        )
+        return bounds["low"], bounds["high"]
+
+    @classmethod
+    def recompute_all(cls, use_numpy: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        Rebuild user_trends for every user from the history tables.
+
+        Args:
+            use_numpy: Force the NumPy (True) or pure Python (False) path
+                       (default: NumPy when installed)
+
+        Returns:
+            Dict with users per series, the path used and the duration
+        """
+        use_numpy = NUMPY_AVAILABLE if use_numpy is None else use_numpy
+        start = time.perf_counter()
+        low, high = cls.user_id_bounds()
+        users = {series: 0 for series in SERIES}
+        if low is not None:
+            for series in SERIES:
+                for first in range(low, high + 1, cls.RECOMPUTE_CHUNK_USERS):
+                    states = cls.rebuild_range(series, first, first + cls.RECOMPUTE_CHUNK_USERS - 1,
+                                               use_numpy=use_numpy)
+                    users[series] += len(states)
+
+        duration_ms = round((time.perf_counter() - start) * 1000, 1)
+        print(f"Trend statistics recomputed for {users} users in {duration_ms:.0f}ms "
+              f"({'numpy' if use_numpy else 'python'})")
+        return {"users": users, "numpy": use_numpy, "duration_ms": duration_ms}
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Maintain per-user trend statistics")
+    parser.add_argument("command", choices=["recompute"])
+    parser.add_argument("--python", action="store_true", help="Use the pure Python path even if NumPy is installed")
+    args = parser.parse_args(argv)
+
+    TrendEngine.recompute_all(use_numpy=False if args.python else None)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+User existence checks for write endpoints.
+Creating an assessment, progress record or recovery plan only needs to know
+that the user exists, not the user row. Two modes (USER_EXISTENCE_CHECK):
+- cache (default): a bounded in-process cache of user ids answers the check;
+  misses run SELECT 1. Unknown ids are cached for a few seconds only, since
+  they become valid as soon as the user is created.
+- foreign_key: no check before the insert; the user_id foreign key rejects
+  unknown users and the violation is answered with 404. On SQLite this turns
+  on PRAGMA foreign_keys for every connection.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable
+
+from fastapi import HTTPException
+
+from app.database import execute_query, IS_POSTGRES
+from app.services.metrics import CACHE_REQUESTS
+from app.services.shared_cache import SharedCache
+
+EXISTENCE_HIT = CACHE_REQUESTS.labels("user_exists", "hit")
+EXISTENCE_MISS = CACHE_REQUESTS.labels("user_exists", "miss")
+
+# SQLSTATE foreign_key_violation
+FOREIGN_KEY_VIOLATION = "23503"
+
+
+class UserExistence:
+    """
+    Answers "does this user exist?" for write endpoints.
+    """
+
+    MODE = os.getenv("USER_EXISTENCE_CHECK", "cache").lower()
+    MAX_ENTRIES = int(os.getenv("USER_EXISTENCE_CACHE_SIZE", "100000"))
+    TTL_SECONDS = int(os.getenv("USER_EXISTENCE_TTL_SECONDS", "600"))
+    NEGATIVE_TTL_SECONDS = float(os.getenv("USER_EXISTENCE_NEGATIVE_TTL_SECONDS", "5"))
+
+    # user_id -> (exists, expires_at), least recently used first
+    _entries: "OrderedDict[int, tuple[bool, float]]" = OrderedDict()
+    _lock = threading.Lock()
+    _stats = {"hits": 0, "negative_hits": 0, "misses": 0}
+
+    @classmethod
+    def _lookup(cls, user_id: int):
+        now = time.monotonic()
+        with cls._lock:
+            entry = cls._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del cls._entries[user_id]
+                return None
+            cls._entries.move_to_end(user_id)
+            cls._stats["hits" if entry[0] else "negative_hits"] += 1
+            return entry[0]
+
+    @classmethod
+    def _store(cls, user_id: int, exists: bool):
+        ttl = cls.TTL_SECONDS if exists else cls.NEGATIVE_TTL_SECONDS
+        with cls._lock:
+            cls._entries[user_id] = (exists, time.monotonic() + ttl)
+            cls._entries.move_to_end(user_id)
+            while len(cls._entries) > cls.MAX_ENTRIES:
+                cls._entries.popitem(last=False)
+
+    @classmethod
+    def exists(cls, user_id: int) -> bool:
+        """
+        Check whether a user exists, through the cache.
+        """
+        cached = cls._lookup(user_id)
+        if cached is not None:
+            EXISTENCE_HIT.inc()
+            return cached
+        EXISTENCE_MISS.inc()
+        with cls._lock:
+            cls._stats["misses"] += 1
+        query = "SELECT 1 AS found FROM users WHERE user_id = " + ("%s" if IS_POSTGRES else "?")
+        exists = execute_query(query, params=(user_id,), fetch_one=True, name="users.exists") is not None
+        cls._store(user_id, exists)
+        return exists
+
+    @classmethod
+    def require(cls, user_id: int):
+        """
+        Raise 404 for an unknown user before a write. Does nothing in foreign_key mode,
+        where the insert itself rejects unknown users (wrap it in missing_user_as_404).
+
+        Raises:
+            HTTPException: 404 if the user does not exist
+        """
+        if cls.MODE == "foreign_key":
+            return
+        if not cls.exists(user_id):
+            raise HTTPException(status_code=404, detail="User not found")
+
+    @staticmethod
+    def is_missing_user_error(error: BaseException) -> bool:
+        """Whether a database error is a foreign key violation (the written tables only reference users)."""
+        if isinstance(error, sqlite3.IntegrityError):
+            return "FOREIGN KEY constraint failed" in str(error)
+        return getattr(error, "pgcode", None) == FOREIGN_KEY_VIOLATION
+
+    @classmethod
+    @contextmanager
+    def missing_user_as_404(cls, user_id: int):
+        """
+        Translate a foreign key violation raised inside the block into 404.
+        """
+        try:
+            yield
+        except Exception as e:
+            if not cls.is_missing_user_error(e):
+                raise
+            cls._store(user_id, False)
+            raise HTTPException(status_code=404, detail="User not found")
+
+    @classmethod
+    def remember(cls, user_id: int):
+        """Record a newly created user, replacing a cached negative lookup."""
+        cls._store(user_id, True)
+
+    @classmethod
+    def forget(cls, user_ids: Iterable[int]):
+        """
+        Drop cached entries after users are deleted: this worker's existence
+        entries and the shared user rows. Other workers' existence entries
+        expire after TTL_SECONDS; in foreign_key mode deleted users are
+        rejected at once.
+        """
+        user_ids = list(user_ids)
+        with cls._lock:
+            for user_id in user_ids:
+                cls._entries.pop(user_id, None)
+        SharedCache.delete("user", user_ids)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        """
+        Lookups answered by this worker's cache.
+        """
+        with cls._lock:
+            stats = dict(cls._stats)
+            entries = len(cls._entries)
+        lookups = stats["hits"] + stats["negative_hits"] + stats["misses"]
+        return {
+            "mode": cls.MODE,
+            "entries": entries,
+            "max_entries": cls.MAX_ENTRIES,
+            **stats,
+            "hit_rate": round((stats["hits"] + stats["negative_hits"]) / lookups, 4) if lookups else None,
+        }
@@ -0,0 +1,197 @@
+"""
+Group commit for progress record inserts.
+During check-in peaks each POST /api/progress/ would otherwise commit (and
+fsync) on its own connection. With PROGRESS_WRITE_BUFFER enabled, validated
+inserts are queued and a flusher thread writes them, with their trend
+statistics updates, in batches of one transaction each. Each caller waits
+until its batch has committed, so a 201 response still means the record is
+durable.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.database import get_db, row_to_dict, IS_POSTGRES
+from app.services.metrics import REGISTRY
+from app.services.trends import TrendEngine
+
+BATCH_SIZE = REGISTRY.histogram(
+    "progress_write_batch_size", "Progress records committed per write buffer batch",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 200, 500)
+)
+FLUSH_LATENCY = REGISTRY.histogram(
+    "progress_write_flush_seconds", "Time to write and commit one write buffer batch"
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    "progress_write_queue_depth", "Progress records waiting in the write buffer"
+)
+BUFFERED_WRITES = REGISTRY.counter(
+    "progress_write_buffer_total", "Progress records by write buffer outcome (committed, failed, rejected, cancelled)",
+    ("outcome",)
+)
+
+
+class WriteBufferFull(Exception):
+    """Raised when the write buffer queue is full; callers should retry later."""
+
+
+class WriteBufferTimeout(WriteBufferFull):
+    """Raised when a queued write was cancelled before its batch started; it is never written."""
+
+
+class ProgressWriteBuffer:
+    """
+    Queues progress inserts and commits them in batches.
+    """
+
+    ENABLED = os.getenv("PROGRESS_WRITE_BUFFER", "false").lower() in ("1", "true", "yes")
+    MAX_BATCH = int(os.getenv("PROGRESS_WRITE_BATCH_SIZE", "200"))
+    FLUSH_INTERVAL_MS = float(os.getenv("PROGRESS_WRITE_FLUSH_MS", "10"))  # Longest wait to fill a batch
+    MAX_QUEUE = int(os.getenv("PROGRESS_WRITE_QUEUE_SIZE", "5000"))
+    COMMIT_TIMEOUT_SECONDS = 30  # Longest a caller waits for its batch
+
+    _queue: Optional[queue.Queue] = None
+    _flusher: Optional[threading.Thread] = None
+    _pid: Optional[int] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def _ensure_flusher(cls):
+        """
+        Start the flusher thread, once per process (threads do not survive a fork).
+        """
+        if cls._pid == os.getpid() and cls._flusher and cls._flusher.is_alive():
+            return
+        with cls._lock:
+            if cls._pid == os.getpid() and cls._flusher and cls._flusher.is_alive():
+                return
+            if cls._pid != os.getpid():
+                cls._queue = queue.Queue(maxsize=cls.MAX_QUEUE)
+            cls._pid = os.getpid()
+            cls._flusher = threading.Thread(target=cls._flush_loop, name="progress-write-buffer", daemon=True)
+            cls._flusher.start()
+
+    @classmethod
+    def submit(cls, user_id: int, weekly_score: float, completion_status_json: Optional[str],
+               user_notes: Optional[str]) -> Dict[str, Any]:
+        """
+        Queue a progress insert and wait until its batch commits.
+
+        Returns:
+            The inserted progress row as a dict
+
+        Raises:
+            WriteBufferFull: If the queue is full (backpressure)
+            WriteBufferTimeout: If the record waited COMMIT_TIMEOUT_SECONDS in the queue
+            Exception: The database error if the insert failed
+        """
+        cls._ensure_flusher()
+        future: Future = Future()
+        try:
+            cls._queue.put_nowait(((user_id, weekly_score, completion_status_json, user_notes), future))
+        except queue.Full:
+            BUFFERED_WRITES.inc("rejected")
+            raise WriteBufferFull(f"Progress write buffer is full ({cls.MAX_QUEUE} queued)")
+        QUEUE_DEPTH.set(cls._queue.qsize())
+        try:
+            return future.result(timeout=cls.COMMIT_TIMEOUT_SECONDS)
+        except FutureTimeoutError:
+            # Still queued: cancel it so the flusher skips it and a retry cannot duplicate it
+            if future.cancel():
+                BUFFERED_WRITES.inc("cancelled")
+                raise WriteBufferTimeout(f"Progress record not written within {cls.COMMIT_TIMEOUT_SECONDS}s")
+            # Its batch is already being written; wait for the outcome
+            return future.result()
+
+    @classmethod
+    def _flush_loop(cls):
+        pending = cls._queue
+        while True:
+            # Block for the first entry, then gather more until the batch is full or the interval ends
+            batch = [pending.get()]
+            deadline = time.monotonic() + cls.FLUSH_INTERVAL_MS / 1000
+            while len(batch) < cls.MAX_BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            QUEUE_DEPTH.set(pending.qsize())
+            # Claim each entry; callers that timed out cancelled theirs
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if batch:
+                cls.flush(batch)
+
+    @classmethod
+    def flush(cls, batch: List[Tuple[tuple, Future]]):
+        """
+        Insert a batch in one transaction and resolve each caller's future.
+        If the batch fails, entries are retried one per transaction so a bad
+        record only fails its own caller.
+        """
+        start = time.perf_counter()
+        try:
+            rows = cls._insert([params for params, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                BUFFERED_WRITES.inc("failed")
+                batch[0][1].set_exception(e)
+                return
+            print(f"Progress write batch of {len(batch)} failed, retrying individually:", e)
+            for entry in batch:
+                cls.flush([entry])
+            return
+
+        FLUSH_LATENCY.observe(time.perf_counter() - start)
+        BATCH_SIZE.observe(len(batch))
+        BUFFERED_WRITES.inc("committed", amount=len(batch))
+        for (_, future), row in zip(batch, rows):
+            future.set_result(row)
+
+    @staticmethod
+    def _insert(params_list: List[tuple]) -> List[Dict[str, Any]]:
+        """
+        Insert progress rows and update their users' trend statistics in one transaction.
+
+        Returns:
+            Inserted rows as dicts, in the order of params_list
+        """
+        rows: List[Optional[Dict[str, Any]]] = [None] * len(params_list)
+        # Lock user_trends rows in user order, so concurrent batches cannot deadlock
+        order = sorted(range(len(params_list)), key=lambda i: params_list[i][0])
+        with get_db() as conn:
+            cursor = conn.cursor()
+            if not IS_POSTGRES:
+                cursor.execute("BEGIN IMMEDIATE")
+            # One statement per row: multi-row VALUES ... RETURNING does not guarantee row order,
+            # and each row's trend update must see only the rows inserted before it
+            for i in order:
+                if IS_POSTGRES:
+                    cursor.execute(
+                        """
+                        INSERT INTO progress (user_id, weekly_score, completion_status, user_notes, timestamp)
+                        VALUES (%s, %s, %s::jsonb, %s, CURRENT_TIMESTAMP)
+                        RETURNING progress_id, user_id, weekly_score, completion_status, user_notes, timestamp
+                        """,
+                        params_list[i]
+                    )
+                    columns = [column[0] for column in cursor.description]
+                    row = dict(zip(columns, cursor.fetchone()))
+                else:
+                    cursor.execute(
+                        """
+                        INSERT INTO progress (user_id, weekly_score, completion_status, user_notes, timestamp)
+                        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                        """,
+                        params_list[i]
+                    )
+                    cursor.execute("SELECT * FROM progress WHERE progress_id = ?", (cursor.lastrowid,))
+                    row = cursor.fetchone()
+                rows[i] = row_to_dict(row, json_fields=["completion_status"])
+                TrendEngine.observe_in(cursor, rows[i]["user_id"], "progress", rows[i]["weekly_score"], rows[i]["timestamp"])
+        return rows
@@ -0,0 +1,105 @@
+"""
+Gunicorn configuration for production: a preforked pool of uvicorn workers.
+
+The app is imported once in the master and forked into WEB_CONCURRENCY workers,
+which share its memory copy-on-write and a per-host cache (SHARED_CACHE_PATH).
+Migrations run once in the master before the workers start.
+
+    gunicorn app.main:app -c gunicorn.conf.py
+
+Signals to the master:
+    HUP         Restart workers gracefully with the current configuration
+                (code loaded by the preloading master is not re-imported)
+    USR2, QUIT  Deploy new code: USR2 starts a new master that loads it,
+                then QUIT the old master once the new workers are up
+    TTIN, TTOU  Add or remove one worker
+"""
+import math
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def _cpu_quota() -> float:
+    """
+    CPUs granted by the container's cgroup quota (v2 cpu.max, then v1), or 0 if unlimited.
+    Containers report the host's CPU count, so that count alone can fork far too many workers.
+    """
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        return 0 if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return quota / period if quota > 0 else 0
+    except (OSError, ValueError):
+        return 0
+
+
+# One worker per CPU of the cgroup quota, at least 2; 2 when the quota is unknown.
+# Each worker holds its own copy of the caches, so set WEB_CONCURRENCY for larger machines
+workers = int(os.getenv("WEB_CONCURRENCY", max(2, math.ceil(_cpu_quota()))))
+
+# Import the app once in the master; workers fork with it already loaded
+preload_app = True
+
+# Recycle each worker after about this many requests, staggered so they don't restart together
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = max(max_requests // 10, 1) if max_requests else 0
+
+# Plan generation waits on the LLM, so allow long requests
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+accesslog = "-"
+
+# Trust X-Forwarded-For only from these proxies (comma-separated), so admission control
+# sees real client addresses that clients cannot forge; set to the platform's proxy addresses.
+# Behind an untrusted proxy, admission control limits per user under one shared proxy ceiling
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+# Merge metrics across workers and share cached reads between them
+# (both are read when the app is imported, so set them before preloading)
+os.environ.setdefault("METRICS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "burnout_metrics"))
+os.environ.setdefault("SHARED_CACHE_ENABLED", "true")
+
+
+def on_starting(server):
+    """
+    Initialize the schema and apply migrations once, before any worker starts.
+    """
+    from app.database import init_db
+    from app.migrations.runner import MigrationRunner
+
+    try:
+        init_db()
+        if os.getenv("MIGRATE_ON_STARTUP", "true").lower() in ("1", "true", "yes"):
+            MigrationRunner.upgrade()
+        # Workers inherit this and skip migrating again
+        os.environ["MIGRATE_ON_STARTUP"] = "false"
+    except Exception as e:
+        server.log.error("Database migrations failed in master, workers will retry: %s", e)
+
+    # Snapshots left by a previous server would be merged into this one's metrics
+    from app.services.metrics import REGISTRY
+    REGISTRY.clear_multiproc_dir()
+
+
+def child_exit(server, worker):
+    """
+    Fold an exited worker's metrics snapshot into the archive and delete it.
+    """
+    from app.services.metrics import REGISTRY
+
+    try:
+        REGISTRY.mark_process_dead(worker.pid)
+    except OSError as e:
+        server.log.warning("Metrics snapshot of worker %s not archived: %s", worker.pid, e)
@@ -0,0 +1 @@
+# Performance harnesses (load tests and benchmarks)
@@ -0,0 +1,376 @@
+"""
+Synthetic data generator for production-scale datasets.
+
+Creates users across the age_range and occupation_type enums of
+schemas.UserCreate, each with a longitudinal weekly assessment series that
+follows a latent burnout trend (improving, stable or declining) plus noise,
+progress records and recovery plans. Scores and stages come from the real
+scoring engine and classifier, so the data is consistent with what the API
+would have written.
+
+Rows are generated in parallel worker processes (each chunk of users has its
+own derived seed, so output does not depend on the worker count) and
+bulk-loaded in batches: executemany in large transactions on SQLite (WAL,
+synchronous=OFF during the load) and COPY on PostgreSQL. Users get explicit
+ids; assessment, plan and progress ids are assigned by the database.
+
+Usage (from the backend directory):
+    python -m perf.datagen --users 1000
+    python -m perf.datagen --database-url sqlite:///./perf_big.db --users 200000 --assessments-mean 25
+    python -m perf.datagen --database-url postgresql://postgres@localhost/burnout_perf --users 500000 \
+        --trend-mix improving=0.2,stable=0.5,declining=0.3
+
+Load into a throwaway database; the generator only appends rows.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+from typing import Any, Dict, List, Tuple
+
+# Stage score ranges (mirrors BurnoutClassifier.THRESHOLDS) as latent levels
+STAGE_LEVELS = {
+    "healthy": (0.05, 0.25),
+    "early_burnout": (0.26, 0.50),
+    "moderate_burnout": (0.51, 0.75),
+    "severe_burnout": (0.76, 0.95),
+}
+TREND_SLOPES = {
+    "improving": (-0.02, -0.005),   # Latent level change per week
+    "stable": (-0.002, 0.002),
+    "declining": (0.005, 0.02),
+}
+# Loaded columns per table, parents first; only users get explicit ids
+TABLE_COLUMNS = {
+    "users": ("user_id", "name", "age_range", "occupation_type", "created_at"),
+    "assessments": ("user_id", "daily_work_hours", "sleep_duration", "sleep_quality", "emotional_exhaustion",
+                    "motivation_level", "screen_time", "perceived_stress", "burnout_score", "burnout_stage",
+                    "created_at"),
+    "recovery_plans": ("user_id", "recommendations", "provenance", "created_at", "updated_at"),
+    "progress": ("user_id", "weekly_score", "completion_status", "user_notes", "timestamp"),
+}
+CHUNK_USERS = 500  # Users generated per worker task
+NOTES = ["Busy week", "Slept better", "Deadline crunch", "Took a day off", "Started walking again"]
+
+
+def enum_values(model, field: str) -> List[str]:
+    """Allowed values of a string field constrained by a ^(a|b|c)$ pattern."""
+    pattern = next(m.pattern for m in model.model_fields[field].metadata if getattr(m, "pattern", None))
+    return [value.replace("\\", "") for value in pattern.strip("^$").strip("()").split("|")]
+
+
+def parse_mix(text: str, allowed: List[str], name: str) -> Dict[str, float]:
+    """
+    Parse "key=weight,key=weight" into normalized weights.
+    """
+    weights = {}
+    for part in text.split(","):
+        key, _, weight = part.partition("=")
+        key = key.strip()
+        if key not in allowed:
+            raise SystemExit(f"--{name}: unknown value {key!r}, expected one of {allowed}")
+        weights[key] = float(weight)
+    total = sum(weights.values())
+    if total <= 0:
+        raise SystemExit(f"--{name}: weights must sum to a positive number")
+    return {key: weight / total for key, weight in weights.items()}
+
+
+def pick(rng: random.Random, weights: Dict[str, float]) -> str:
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def clamp(value: float, low: float, high: float) -> float:
+    return low if value < low else high if value > high else value
+
+
+class Generator:
+    """
+    Generates rows for chunks of users from configurable distributions.
+    """
+
+    def __init__(self, args, scoring_engine, classifier, fallback_plans: Dict[str, str],
+                 age_mix: Dict[str, float], occupation_mix: Dict[str, float]):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.engine = scoring_engine
+        self.classifier = classifier
+        self.fallback_plans = fallback_plans
+        self.age_mix = age_mix
+        self.occupation_mix = occupation_mix
+        self.stage_mix = parse_mix(args.stage_mix, list(STAGE_LEVELS), "stage-mix")
+        self.trend_mix = parse_mix(args.trend_mix, list(TREND_SLOPES), "trend-mix")
+        self.start = datetime.fromisoformat(args.start_date)
+
+    def responses(self, level: float) -> Dict[str, Any]:
+        """Questionnaire responses consistent with a latent burnout level in [0, 1]."""
+        gauss = self.rng.gauss
+        return {
+            "daily_work_hours": round(clamp(7 + 6 * level + gauss(0, 1.0), 0, 24), 1),
+            "sleep_duration": round(clamp(8.2 - 3.5 * level + gauss(0, 0.7), 0, 24), 1),
+            "sleep_quality": int(clamp(round(5 - 4 * level + gauss(0, 0.6)), 1, 5)),
+            "emotional_exhaustion": int(clamp(round(1 + 4 * level + gauss(0, 0.6)), 1, 5)),
+            "motivation_level": int(clamp(round(5 - 4 * level + gauss(0, 0.6)), 1, 5)),
+            "screen_time": round(clamp(3 + 10 * level + gauss(0, 1.5), 0, 24), 1),
+            "perceived_stress": int(clamp(round(1 + 4 * level + gauss(0, 0.6)), 1, 5)),
+        }
+
+    def score(self, r: Dict[str, Any]) -> float:
+        """Same arithmetic as BurnoutScoringEngine.calculate_score, without model validation."""
+        e, w = self.engine, self.engine.WEIGHTS
+        total = (
+            e.normalize_work_hours(r["daily_work_hours"]) * w["work_hours"]
+            + e.normalize_sleep_duration(r["sleep_duration"]) * w["sleep_duration"]
+            + e.normalize_sleep_quality(r["sleep_quality"]) * w["sleep_quality"]
+            + e.normalize_emotional_exhaustion(r["emotional_exhaustion"]) * w["emotional_exhaustion"]
+            + e.normalize_motivation(r["motivation_level"]) * w["motivation"]
+            + e.normalize_screen_time(r["screen_time"]) * w["screen_time"]
+            + e.normalize_stress(r["perceived_stress"]) * w["perceived_stress"]
+        )
+        return round(min(100, max(0, total * 100)), 2)
+
+    def assessment_count(self) -> int:
+        """Long-tailed series length around the configured mean."""
+        count = int(self.rng.expovariate(1 / self.args.assessments_mean)) + 1
+        return min(count, self.args.assessments_max)
+
+    def chunk_rows(self, chunk_index: int, first_user_id: int, users: int) -> Dict[str, List[Tuple]]:
+        """
+        Rows for a chunk of consecutive users, seeded by the chunk index.
+        """
+        self.rng = random.Random(f"{self.args.seed}-{chunk_index}")
+        rows = {table: [] for table in TABLE_COLUMNS}
+        for user_id in range(first_user_id, first_user_id + users):
+            self.user_rows(user_id, rows)
+        return rows
+
+    def user_rows(self, user_id: int, rows: Dict[str, List[Tuple]]):
+        """
+        Append rows for one user and their history.
+        """
+        rng, args = self.rng, self.args
+        count = self.assessment_count()
+        # Series end no later than start + span, beginning at a random offset
+        first = self.start + timedelta(days=rng.uniform(0, max(1, args.span_days - 7 * count)))
+        rows["users"].append((
+            user_id, f"User {user_id}", pick(rng, self.age_mix), pick(rng, self.occupation_mix),
+            (first - timedelta(days=rng.uniform(0, 3))).strftime("%Y-%m-%d %H:%M:%S"),
+        ))
+
+        low, high = STAGE_LEVELS[pick(rng, self.stage_mix)]
+        level = rng.uniform(low, high)
+        slope = rng.uniform(*TREND_SLOPES[pick(rng, self.trend_mix)])
+
+        for week in range(count):
+            at = first + timedelta(days=7 * week + rng.uniform(-2, 2))
+            responses = self.responses(level)
+            score = self.score(responses)
+            classification = self.classifier.classify(score)
+
+            rows["assessments"].append((
+                user_id, *responses.values(), score, classification["stage"],
+                at.strftime("%Y-%m-%d %H:%M:%S"),
+            ))
+
+            if week == 0 or rng.random() < args.plan_ratio:
+                rows["recovery_plans"].append((
+                    user_id, self.fallback_plans[classification["stage_key"]], None,
+                    (at + timedelta(minutes=1)).strftime("%Y-%m-%d %H:%M:%S"), None,
+                ))
+
+            if rng.random() < args.progress_ratio:
+                completion = {"daily_actions": rng.random() > level, "weekly_goals": rng.random() > level + 0.1}
+                rows["progress"].append((
+                    user_id, round(clamp(100 - score + rng.gauss(0, 10), 0, 100), 1),
+                    json.dumps(completion), rng.choice(NOTES) if rng.random() < 0.1 else None,
+                    (at + timedelta(days=3)).strftime("%Y-%m-%d %H:%M:%S"),
+                ))
+
+            # Random walk around the user's trend
+            level = clamp(level + slope + rng.gauss(0, 0.03), 0.0, 1.0)
+
+
+class SQLiteWriter:
+    """
+    Batched executemany inserts, one transaction per flush.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+
+    def max_user_id(self) -> int:
+        return self.conn.execute("SELECT COALESCE(MAX(user_id), 0) FROM users").fetchone()[0]
+
+    def write(self, table: str, rows: List[Tuple]):
+        columns = TABLE_COLUMNS[table]
+        self.conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})", rows
+        )
+
+    def commit(self):
+        self.conn.commit()
+
+    def finish(self):
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.execute("ANALYZE")
+        self.conn.commit()
+        self.conn.close()
+
+
+class PostgresWriter:
+    """
+    COPY ... FROM STDIN in CSV format, one transaction per flush.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.cursor = conn.cursor()
+
+    def max_user_id(self) -> int:
+        self.cursor.execute("SELECT COALESCE(MAX(user_id), 0) FROM users")
+        return self.cursor.fetchone()[0]
+
+    def write(self, table: str, rows: List[Tuple]):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)  # None is written unquoted-empty, which COPY reads as NULL
+        buffer.seek(0)
+        self.cursor.copy_expert(
+            f"COPY {table} ({', '.join(TABLE_COLUMNS[table])}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+
+    def commit(self):
+        self.conn.commit()
+
+    def finish(self):
+        # Explicit user ids bypass the SERIAL sequence; move it past the loaded rows
+        self.cursor.execute(
+            "SELECT setval(pg_get_serial_sequence('users', 'user_id'), GREATEST((SELECT MAX(user_id) FROM users), 1))"
+        )
+        self.conn.commit()
+        # Historical months land in the default partition of partitioned tables; give them their own
+        from app.services.retention import HistoryRetention
+        HistoryRetention.ensure_partitions()
+        self.conn.autocommit = True
+        self.cursor.execute("ANALYZE")
+        self.conn.close()
+
+
+_generator = None
+
+
+def _init_worker(args):
+    """Build the per-process generator."""
+    global _generator
+    from app.database import dict_to_json
+    from app.schemas import UserCreate
+    from app.services.ai_agent import AIRecoveryAgent
+    from app.services.classification import BurnoutClassifier
+    from app.services.scoring import BurnoutScoringEngine
+
+    ages = enum_values(UserCreate, "age_range")
+    occupations = enum_values(UserCreate, "occupation_type")
+    age_mix = parse_mix(args.age_mix, ages, "age-mix") if args.age_mix else {a: 1 / len(ages) for a in ages}
+    occupation_mix = (parse_mix(args.occupation_mix, occupations, "occupation-mix") if args.occupation_mix
+                      else {o: 1 / len(occupations) for o in occupations})
+
+    agent = AIRecoveryAgent()
+    fallback_plans = {
+        stage_key: dict_to_json(agent._get_fallback_recommendations({"stage_key": stage_key}).dict())
+        for stage_key in BurnoutClassifier.THRESHOLDS
+    }
+    _generator = Generator(args, BurnoutScoringEngine, BurnoutClassifier, fallback_plans, age_mix, occupation_mix)
+
+
+def _generate_chunk(chunk: Tuple[int, int, int]) -> Dict[str, List[Tuple]]:
+    return _generator.chunk_rows(*chunk)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate and bulk-load synthetic burnout data")
+    parser.add_argument("--database-url", help="Target database (default: DATABASE_URL)")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--assessments-mean", type=float, default=12, help="Mean assessments per user")
+    parser.add_argument("--assessments-max", type=int, default=260, help="Cap on assessments per user")
+    parser.add_argument("--progress-ratio", type=float, default=0.7, help="Progress records per assessment")
+    parser.add_argument("--plan-ratio", type=float, default=0.25,
+                        help="Plans per assessment after the first (every user gets a first plan)")
+    parser.add_argument("--stage-mix", default="healthy=0.3,early_burnout=0.35,moderate_burnout=0.25,severe_burnout=0.1",
+                        help="Initial stage distribution")
+    parser.add_argument("--trend-mix", default="improving=0.35,stable=0.4,declining=0.25",
+                        help="Trend distribution")
+    parser.add_argument("--age-mix", help="age_range distribution, e.g. 18-25=3,26-35=4 (default: uniform)")
+    parser.add_argument("--occupation-mix", help="occupation_type distribution (default: uniform)")
+    parser.add_argument("--start-date", default="2023-01-01")
+    parser.add_argument("--span-days", type=int, default=730, help="Days covered by the dataset")
+    parser.add_argument("--batch-size", type=int, default=20000, help="Rows buffered per flush")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Generator processes")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    # Imported after DATABASE_URL is set, since app.database reads it at import time
+    from app.database import get_connection, init_db, IS_POSTGRES
+    from app.migrations.runner import MigrationRunner
+    from app.services.trends import TrendEngine
+
+    init_db()
+    MigrationRunner.upgrade()
+
+    conn = get_connection()
+    writer = PostgresWriter(conn) if IS_POSTGRES else SQLiteWriter(conn)
+    first_user_id = writer.max_user_id() + 1
+    chunks = [
+        (index, first_user_id + offset, min(CHUNK_USERS, args.users - offset))
+        for index, offset in enumerate(range(0, args.users, CHUNK_USERS))
+    ]
+
+    buffers = {table: [] for table in TABLE_COLUMNS}
+    totals = {table: 0 for table in TABLE_COLUMNS}
+    buffered = 0
+    start = time.perf_counter()
+
+    def flush():
+        # Parents first so foreign keys hold within each transaction
+        for table in TABLE_COLUMNS:
+            if buffers[table]:
+                writer.write(table, buffers[table])
+                totals[table] += len(buffers[table])
+                buffers[table] = []
+        writer.commit()
+        rows = sum(totals.values())
+        elapsed = time.perf_counter() - start
+        print(f"{totals['users']}/{args.users} users, {rows} rows, {rows / elapsed:,.0f} rows/s")
+
+    with Pool(args.workers, initializer=_init_worker, initargs=(args,)) as pool:
+        # imap keeps chunk order, so ids are assigned deterministically
+        for rows_by_table in pool.imap(_generate_chunk, chunks):
+            for table, rows in rows_by_table.items():
+                buffers[table].extend(rows)
+                buffered += len(rows)
+            if buffered >= args.batch_size:
+                flush()
+                buffered = 0
+    flush()
+    writer.finish()
+
+    elapsed = time.perf_counter() - start
+    print(f"Loaded {', '.join(f'{count} {table}' for table, count in totals.items())} "
+          f"in {elapsed:.1f}s ({sum(totals.values()) / elapsed:,.0f} rows/s)")
+    # Rows were loaded directly, so build the running trend statistics in one pass
+    TrendEngine.recompute_all()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
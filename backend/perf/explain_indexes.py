@@ -0,0 +1,143 @@
+"""
+Before/after evidence for the history index migrations.
+
+Reverts the versioned migrations, captures the plan and timing of the app's
+per-user history queries, re-applies the migrations and captures them again.
+By default it runs against a throwaway SQLite database filled by perf.datagen;
+with --database-url it runs against the given database. Use a copy, never
+production: the migrations are reverted while it runs.
+
+Usage (from the backend directory):
+    python -m perf.explain_indexes --users 5000
+    python -m perf.explain_indexes --database-url postgresql://postgres@localhost/burnout_perf
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+# (query name, SQLite statement; PostgreSQL uses %s, and ANY(%s) for the id list)
+QUERIES = [
+    ("assessments.list_by_user",
+     "SELECT * FROM assessments WHERE user_id = ? ORDER BY created_at DESC LIMIT ? OFFSET ?"),
+    ("assessments.get_latest_by_user",
+     "SELECT * FROM assessments WHERE user_id = ? ORDER BY created_at DESC LIMIT 1"),
+    ("assessments.score_series_by_user",
+     "SELECT burnout_score, burnout_stage, created_at FROM assessments WHERE user_id = ? "
+     "ORDER BY created_at DESC LIMIT ?"),
+    ("progress.list_by_user",
+     "SELECT * FROM progress WHERE user_id = ? ORDER BY timestamp DESC LIMIT ? OFFSET ?"),
+    ("recovery_plans.get_latest_by_user",
+     "SELECT * FROM recovery_plans WHERE user_id = ? ORDER BY created_at DESC LIMIT 1"),
+    ("recovery_plans.latest_ids_for_users",
+     "SELECT plan_id, user_id FROM (SELECT plan_id, user_id, ROW_NUMBER() OVER "
+     "(PARTITION BY user_id ORDER BY created_at DESC, plan_id DESC) AS rn FROM recovery_plans "
+     "WHERE user_id IN ({ids})) ranked WHERE rn = 1"),
+]
+
+
+def build_queries(is_postgres: bool, user_id: int, user_ids: List[int]) -> List[Dict[str, Any]]:
+    """Statements and parameters for the sample users, in the configured dialect."""
+    queries = []
+    for name, sql in QUERIES:
+        if "{ids}" in sql:
+            if is_postgres:
+                sql, params = sql.replace("IN ({ids})", "= ANY(?)"), (user_ids,)
+            else:
+                sql, params = sql.format(ids=", ".join("?" for _ in user_ids)), tuple(user_ids)
+        else:
+            params = (user_id,) + (20, 0)[:sql.count("?") - 1]
+        if is_postgres:
+            sql = sql.replace("?", "%s")
+        queries.append({"name": name, "sql": sql, "params": params})
+    return queries
+
+
+def time_query(get_connection: Callable, sql: str, params: tuple, repeat: int) -> float:
+    """Median milliseconds to execute and fetch, on one connection."""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            cursor.execute(sql, params)
+            cursor.fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+        return round(statistics.median(timings), 3)
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def capture(queries: List[Dict[str, Any]], repeat: int) -> Dict[str, Dict[str, Any]]:
+    from app.database import explain_query, get_connection
+
+    return {
+        q["name"]: {"plan": explain_query(q["sql"], q["params"]),
+                    "median_ms": time_query(get_connection, q["sql"], q["params"], repeat)}
+        for q in queries
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Before/after plans for the history index migrations")
+    parser.add_argument("--database-url", help="Database to use (default: throwaway SQLite filled by perf.datagen)")
+    parser.add_argument("--users", type=int, default=5000, help="Users generated for the throwaway database")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed executions per query")
+    args = parser.parse_args(argv)
+
+    tmp = None
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp.name, 'explain.db')}"
+        from perf import datagen
+        datagen.main(["--users", str(args.users), "--workers", "1"])
+
+    # Imported after DATABASE_URL is set, since app.database reads it at import time
+    from app.database import execute_query, init_db, IS_POSTGRES
+    from app.migrations.runner import MigrationRunner
+
+    init_db()
+    MigrationRunner.upgrade()
+    busiest = execute_query(
+        "SELECT user_id, COUNT(*) AS n FROM assessments GROUP BY user_id ORDER BY n DESC LIMIT 50",
+        fetch_all=True, name="explain_indexes.busiest_users"
+    )
+    if not busiest:
+        print("No assessments in the database; nothing to explain")
+        return 1
+    user_ids = [row["user_id"] for row in busiest]
+    queries = build_queries(IS_POSTGRES, user_ids[0], user_ids)
+
+    try:
+        MigrationRunner.downgrade(0)
+        before = capture(queries, args.repeat)
+    finally:
+        MigrationRunner.upgrade()
+    after = capture(queries, args.repeat)
+
+    print(f"Busiest user {user_ids[0]} ({busiest[0]['n']} assessments), {len(user_ids)} users for the batch query")
+    for q in queries:
+        b, a = before[q["name"]], after[q["name"]]
+        speedup = f"{b['median_ms'] / a['median_ms']:.1f}x" if a["median_ms"] else "-"
+        print(f"\n{q['name']}: {b['median_ms']:.3f} ms -> {a['median_ms']:.3f} ms ({speedup})")
+        print("  before:")
+        for line in b["plan"]:
+            print(f"    {line}")
+        print("  after:")
+        for line in a["plan"]:
+            print(f"    {line}")
+
+    if tmp:
+        tmp.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
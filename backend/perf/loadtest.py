@@ -0,0 +1,422 @@
+"""
+End-to-end load test for the API.
+
+Boots app.main:app (with a stubbed LLM, see perf/stub_app.py) against SQLite
+and/or PostgreSQL, seeds users with assessment history, then replays user
+journeys concurrently:
+
+    create user -> assessment -> generate plan -> progress -> analysis
+
+Reports throughput and p50/p95/p99 latency per endpoint, compares them with a
+stored baseline and exits non-zero on regressions beyond a threshold.
+
+Usage (from the backend directory):
+    python -m perf.loadtest --backend sqlite --save-baseline
+    python -m perf.loadtest --backend sqlite
+    python -m perf.loadtest --backend postgres --database-url postgresql://postgres@localhost/burnout_loadtest
+    python -m perf.loadtest --url http://localhost:8000   # already running server
+
+Use a throwaway PostgreSQL database: the load test only adds rows, but adds many.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List, Optional
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+AGE_RANGES = ["18-25", "26-35", "36-45", "46-55", "56-65", "65+"]
+OCCUPATIONS = ["student", "professional", "other"]
+
+
+def random_responses(rng: random.Random) -> Dict[str, Any]:
+    """Assessment responses spread across every scoring branch."""
+    return {
+        "daily_work_hours": round(rng.uniform(4, 14), 1),
+        "sleep_duration": round(rng.uniform(4, 10), 1),
+        "sleep_quality": rng.randint(1, 5),
+        "emotional_exhaustion": rng.randint(1, 5),
+        "motivation_level": rng.randint(1, 5),
+        "screen_time": round(rng.uniform(1, 14), 1),
+        "perceived_stress": rng.randint(1, 5),
+    }
+
+
+def random_user(rng: random.Random, index: int) -> Dict[str, Any]:
+    return {
+        "name": f"Load Test User {index}",
+        "age_range": rng.choice(AGE_RANGES),
+        "occupation_type": rng.choice(OCCUPATIONS),
+    }
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class Recorder:
+    """
+    Collects per-endpoint latencies (ms) and error counts.
+    """
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, endpoint: str, latency_ms: float, ok: bool):
+        self.latencies.setdefault(endpoint, []).append(latency_ms)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        endpoints = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            endpoints[endpoint] = {
+                "count": len(values),
+                "errors": self.errors.get(endpoint, 0),
+                "mean_ms": round(sum(values) / len(values), 2),
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+            }
+        return endpoints
+
+
+async def timed_request(client, recorder: Optional[Recorder], endpoint: str, method: str, url: str,
+                        **kwargs) -> Optional[Dict[str, Any]]:
+    """
+    Send one request and record its latency under the endpoint's route template.
+
+    Returns:
+        Parsed JSON body, or None on error
+    """
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+        ok = response.status_code < 400
+    except httpx.HTTPError:
+        response, ok = None, False
+    if recorder is not None:
+        recorder.record(endpoint, (time.perf_counter() - start) * 1000, ok)
+    return response.json() if ok else None
+
+
+async def run_journey(client, recorder: Optional[Recorder], rng: random.Random, index: int) -> bool:
+    """
+    One user journey: create user -> assessment -> generate plan -> progress -> analysis.
+
+    Returns:
+        True if every step succeeded
+    """
+    user = await timed_request(client, recorder, "POST /api/users/", "POST", "/api/users/",
+                               json=random_user(rng, index))
+    if not user:
+        return False
+    user_id = user["user_id"]
+    # Identify the user like the frontend does, so admission control limits each user separately
+    headers = {"X-User-Id": str(user_id)}
+
+    assessment = await timed_request(client, recorder, "POST /api/assessments/", "POST", "/api/assessments/",
+                                     json={"user_id": user_id, "responses": random_responses(rng)}, headers=headers)
+    if not assessment:
+        return False
+
+    plan = await timed_request(client, recorder, "POST /api/recovery/generate", "POST", "/api/recovery/generate",
+                               json={"user_id": user_id, "assessment_id": assessment["assessment_id"]}, headers=headers)
+    if not plan:
+        return False
+
+    progress = await timed_request(client, recorder, "POST /api/progress/", "POST", "/api/progress/",
+                                   json={"user_id": user_id, "weekly_score": round(rng.uniform(10, 90), 1),
+                                         "completion_status": {"daily_actions": rng.random() < 0.5}}, headers=headers)
+    if not progress:
+        return False
+
+    analysis = await timed_request(client, recorder, "GET /api/progress/user/{user_id}/analysis", "GET",
+                                   f"/api/progress/user/{user_id}/analysis", headers=headers)
+    return analysis is not None
+
+
+async def seed(client, users: int, assessments_per_user: int, concurrency: int, rng: random.Random) -> int:
+    """
+    Seed users with assessment history before measuring (not recorded).
+
+    Returns:
+        Number of users seeded
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    seeds = [random.Random(rng.random()) for _ in range(users)]
+
+    async def seed_user(index: int) -> bool:
+        user_rng = seeds[index]
+        async with semaphore:
+            user = await timed_request(client, None, "", "POST", "/api/users/", json=random_user(user_rng, index))
+            if not user:
+                return False
+            for _ in range(assessments_per_user):
+                await timed_request(client, None, "", "POST", "/api/assessments/",
+                                    json={"user_id": user["user_id"], "responses": random_responses(user_rng)})
+            return True
+
+    results = await asyncio.gather(*(seed_user(i) for i in range(users)))
+    return sum(results)
+
+
+async def run_load(base_url: str, args) -> Dict[str, Any]:
+    """
+    Seed, warm up and run the measured phase against a running server.
+    """
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        seeded = await seed(client, args.seed_users, args.seed_assessments, args.concurrency, rng)
+
+        # Warm-up journeys (not recorded) let connection pools and caches settle
+        await asyncio.gather(*(run_journey(client, None, random.Random(rng.random()), -i - 1)
+                               for i in range(args.warmup)))
+
+        recorder = Recorder()
+        worker_seeds = [rng.random() for _ in range(args.concurrency)]
+
+        async def virtual_user(worker: int) -> int:
+            worker_rng = random.Random(worker_seeds[worker])
+            completed = 0
+            for j in range(args.journeys):
+                if await run_journey(client, recorder, worker_rng, worker * args.journeys + j):
+                    completed += 1
+            return completed
+
+        start = time.perf_counter()
+        completed = await asyncio.gather(*(virtual_user(w) for w in range(args.concurrency)))
+        duration = time.perf_counter() - start
+
+    endpoints = recorder.summary()
+    requests = sum(e["count"] for e in endpoints.values())
+    errors = sum(e["errors"] for e in endpoints.values())
+    return {
+        "seeded_users": seeded,
+        "duration_s": round(duration, 3),
+        "journeys": args.concurrency * args.journeys,
+        "journeys_completed": sum(completed),
+        "requests": requests,
+        "errors": errors,
+        "error_rate": round(errors / requests, 4) if requests else 0.0,
+        "throughput_rps": round(requests / duration, 2) if duration else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Server:
+    """
+    Runs perf.stub_app:app under uvicorn in a subprocess.
+    """
+
+    def __init__(self, database_url: str, workers: int = 1, llm_latency_ms: float = 50,
+                 env: Dict[str, str] = None):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.workers = workers
+        self.env = dict(os.environ, DATABASE_URL=database_url, LOADTEST_LLM_LATENCY_MS=str(llm_latency_ms))
+        # Virtual users send X-User-Id and get their own rate limit buckets, but they all share
+        # one address, like users behind a NAT: size its bucket for the whole load, and lift the
+        # write limit, which also covers the anonymous sign-ups that only have the address
+        for name, value in (("ADMISSION_ADDRESS_FACTOR", "1000"), ("ADMISSION_WRITE_RATE", "10000"),
+                            ("ADMISSION_WRITE_BURST", "10000")):
+            self.env.setdefault(name, value)
+        self.env.update(env or {})
+        self.log = tempfile.NamedTemporaryFile(prefix="loadtest-server-", suffix=".log", delete=False)
+        self.process = None
+
+    def __enter__(self) -> "Server":
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "perf.stub_app:app", "--host", "127.0.0.1",
+             "--port", str(self.port), "--workers", str(self.workers), "--log-level", "warning",
+             "--no-access-log"],
+            cwd=BACKEND_DIR, env=self.env, stdout=self.log, stderr=subprocess.STDOUT
+        )
+        self._wait_ready()
+        return self
+
+    def _wait_ready(self, timeout: float = 30.0):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited during startup, see {self.log.name}")
+            try:
+                if httpx.get(f"{self.url}/health", timeout=1.0).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"Server not ready after {timeout}s, see {self.log.name}")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log.close()
+
+
+def baseline_path(name: str) -> str:
+    return os.path.join(BASELINE_DIR, f"loadtest_{name}.json")
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], threshold: float,
+            min_delta_ms: float) -> List[str]:
+    """
+    Compare a run with a baseline.
+
+    Args:
+        result: Current run
+        baseline: Stored baseline run
+        threshold: Allowed relative regression (0.2 = 20%)
+        min_delta_ms: Ignore latency regressions smaller than this in absolute terms
+
+    Returns:
+        List of regression descriptions (empty when within threshold)
+    """
+    regressions = []
+    if result["throughput_rps"] < baseline["throughput_rps"] * (1 - threshold):
+        regressions.append(
+            f"throughput {result['throughput_rps']} req/s < baseline {baseline['throughput_rps']} req/s"
+        )
+    for endpoint, current in result["endpoints"].items():
+        previous = baseline["endpoints"].get(endpoint)
+        if not previous:
+            continue
+        for stat in ("p95_ms", "p99_ms"):
+            limit = previous[stat] * (1 + threshold)
+            if current[stat] > limit and current[stat] - previous[stat] >= min_delta_ms:
+                regressions.append(f"{endpoint} {stat} {current[stat]} > baseline {previous[stat]}")
+    return regressions
+
+
+def print_report(name: str, result: Dict[str, Any], baseline: Optional[Dict[str, Any]]):
+    print(f"\n== {name}: {result['requests']} requests in {result['duration_s']}s, "
+          f"{result['throughput_rps']} req/s, error rate {result['error_rate']:.2%}")
+    print(f"{'endpoint':<46}{'count':>7}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'base p95':>10}")
+    for endpoint, stats in result["endpoints"].items():
+        base = (baseline or {}).get("endpoints", {}).get(endpoint, {}).get("p95_ms", "-")
+        print(f"{endpoint:<46}{stats['count']:>7}{stats['errors']:>5}{stats['p50_ms']:>9}"
+              f"{stats['p95_ms']:>9}{stats['p99_ms']:>9}{base:>10}")
+
+
+def target_database_url(backend: str, args, workdir: str) -> str:
+    if backend == "sqlite":
+        return f"sqlite:///{os.path.join(workdir, 'loadtest.db')}"
+    url = args.database_url or os.getenv("LOADTEST_POSTGRES_URL")
+    if not url:
+        raise SystemExit("PostgreSQL target needs --database-url or LOADTEST_POSTGRES_URL")
+    return url
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="End-to-end API load test")
+    parser.add_argument("--backend", choices=["sqlite", "postgres", "both"], default="sqlite")
+    parser.add_argument("--database-url", help="PostgreSQL URL (default: LOADTEST_POSTGRES_URL)")
+    parser.add_argument("--url", help="Load test an already running server instead of booting one")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent virtual users")
+    parser.add_argument("--journeys", type=int, default=20, help="Journeys per virtual user")
+    parser.add_argument("--warmup", type=int, default=10, help="Unrecorded warm-up journeys")
+    parser.add_argument("--seed-users", type=int, default=50)
+    parser.add_argument("--seed-assessments", type=int, default=5, help="Assessments per seeded user")
+    parser.add_argument("--llm-latency-ms", type=float, default=50, help="Stub LLM latency")
+    parser.add_argument("--seed", type=int, default=1234, help="Random seed")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--baseline-name", help="Baseline name (default: backend name)")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed regression (0.2 = 20%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="Ignore smaller latency regressions")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--output", help="Write results JSON to this path")
+    args = parser.parse_args(argv)
+
+    if httpx is None:
+        raise SystemExit("The load test needs httpx: pip install httpx")
+
+    if args.url:
+        targets = [("external", None)]
+    else:
+        targets = [(b, b) for b in (["sqlite", "postgres"] if args.backend == "both" else [args.backend])]
+
+    failed = False
+    results = {}
+    for name, backend in targets:
+        with tempfile.TemporaryDirectory(prefix="loadtest-") as workdir:
+            if backend is None:
+                result = asyncio.run(run_load(args.url, args))
+            else:
+                # A local PostgreSQL usually has no SSL
+                env = {"DATABASE_SSLMODE": os.getenv("DATABASE_SSLMODE", "disable")} if backend == "postgres" else {}
+                with Server(target_database_url(backend, args, workdir), args.workers,
+                            args.llm_latency_ms, env) as server:
+                    result = asyncio.run(run_load(server.url, args))
+
+        result["config"] = {
+            "backend": name, "workers": args.workers, "concurrency": args.concurrency,
+            "journeys": args.journeys, "seed_users": args.seed_users,
+            "seed_assessments": args.seed_assessments, "llm_latency_ms": args.llm_latency_ms,
+        }
+        results[name] = result
+
+        path = baseline_path(args.baseline_name or name)
+        baseline = None
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        print_report(name, result, baseline)
+
+        if result["error_rate"] > args.max_error_rate:
+            print(f"FAIL: error rate {result['error_rate']:.2%} above {args.max_error_rate:.2%}")
+            failed = True
+
+        if args.save_baseline:
+            os.makedirs(BASELINE_DIR, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2)
+            print(f"Baseline saved to {path}")
+        elif baseline:
+            regressions = compare(result, baseline, args.threshold, args.min_delta_ms)
+            for regression in regressions:
+                print(f"REGRESSION: {regression}")
+            failed = failed or bool(regressions)
+        else:
+            print(f"No baseline at {path}; run with --save-baseline to create one")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
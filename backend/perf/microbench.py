@@ -0,0 +1,277 @@
+"""
+Micro-benchmarks for per-request hot paths: scoring, classification,
+row/JSON serialization, prompt building and trend updates.
+
+Inputs are synthetic with a fixed seed and cover every branch of the
+normalize_* functions. Each benchmark reports ns/op (loop overhead
+subtracted) and per-call allocation (peak and retained bytes via
+tracemalloc). Runs are appended to a JSON history file so the effect of an
+optimization shows up as a delta against an earlier run.
+
+Usage (from the backend directory):
+    python -m perf.microbench --label before-change
+    python -m perf.microbench --label after-change --compare before-change
+    python -m perf.microbench --filter scoring --no-save
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.database import row_to_dict, dict_to_json, json_to_dict
+from app.schemas import AssessmentResponse
+from app.services.adaptive import AdaptiveFollowUp
+from app.services.ai_agent import AIRecoveryAgent
+from app.services.assessment_responses import AssessmentResponses
+from app.services.classification import BurnoutClassifier
+from app.services.scoring import BurnoutScoringEngine
+from app.services.trends import TrendEngine
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+HISTORY_PATH = os.path.join(RESULTS_DIR, "microbench_history.json")
+
+# Branch-covering values for the piecewise normalizers
+WORK_HOURS = [0.0, 6.0, 8.0, 9.5, 11.0, 12.0, 14.0]          # <=8, (8,12), >=12
+SLEEP_HOURS = [3.0, 5.5, 6.5, 7.0, 8.0, 9.0, 9.5, 11.0]       # <6, [6,7), [7,9], (9,10], >10
+SCREEN_HOURS = [2.0, 4.0, 6.0, 10.0, 12.0, 16.0]              # <=4, (4,12), >=12
+SCORES = [-5.0, 0.0, 12.5, 25.0, 25.5, 40.0, 50.0, 63.0, 75.0, 88.0, 100.0, 120.0]
+
+
+def build_inputs(seed: int, size: int = 64) -> Dict[str, List[Any]]:
+    """
+    Build fixed-seed synthetic inputs for every benchmark.
+    """
+    rng = random.Random(seed)
+
+    responses = []
+    for i in range(size):
+        responses.append(AssessmentResponse(
+            daily_work_hours=WORK_HOURS[i % len(WORK_HOURS)],
+            sleep_duration=SLEEP_HOURS[i % len(SLEEP_HOURS)],
+            sleep_quality=rng.randint(1, 5),
+            emotional_exhaustion=rng.randint(1, 5),
+            motivation_level=rng.randint(1, 5),
+            screen_time=SCREEN_HOURS[i % len(SCREEN_HOURS)],
+            perceived_stress=rng.randint(1, 5),
+        ))
+    response_dicts = [r.dict() for r in responses]
+
+    # Real sqlite3.Row objects, as returned by execute_query before conversion
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute(
+        "CREATE TABLE assessments (assessment_id INTEGER, user_id INTEGER, daily_work_hours REAL, "
+        "sleep_duration REAL, sleep_quality SMALLINT, emotional_exhaustion SMALLINT, motivation_level SMALLINT, "
+        "screen_time REAL, perceived_stress SMALLINT, burnout_score REAL, burnout_stage TEXT, created_at TEXT)"
+    )
+    for i, r in enumerate(response_dicts):
+        score = BurnoutScoringEngine.calculate_score(responses[i])["score"]
+        conn.execute(
+            "INSERT INTO assessments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (i + 1, i % 7 + 1, *AssessmentResponses.values(responses[i]), score,
+             BurnoutClassifier.classify(score)["stage"], f"2024-01-{i % 28 + 1:02d} 10:{i % 60:02d}:00")
+        )
+    rows = conn.execute("SELECT * FROM assessments").fetchall()
+    conn.close()
+
+    plans = [AIRecoveryAgent()._get_fallback_recommendations({"stage_key": stage_key}).dict()
+             for stage_key in BurnoutClassifier.THRESHOLDS]
+
+    contexts = []
+    for i, r in enumerate(response_dicts):
+        score = BurnoutScoringEngine.calculate_score(responses[i])["score"]
+        classification = BurnoutClassifier.classify(score)
+        contexts.append({
+            "score": score,
+            "stage": classification["stage"],
+            "stage_key": classification["stage_key"],
+            "responses": r,
+            "description": classification["description"],
+        })
+
+    # Trend states with a week between scores, and the next score for each
+    trend_states, state, at = [], TrendEngine.empty_state(), 1704067200.0
+    for i in range(size):
+        at += 7 * 86400 + rng.randint(-86400, 86400)
+        state = TrendEngine.update(state, rng.uniform(20, 80), at)
+        trend_states.append(state)
+
+    return {
+        "responses": responses,
+        "work_hours": [rng.choice(WORK_HOURS) for _ in range(size)],
+        "sleep_hours": [rng.choice(SLEEP_HOURS) for _ in range(size)],
+        "screen_hours": [rng.choice(SCREEN_HOURS) for _ in range(size)],
+        "scores": [SCORES[i % len(SCORES)] for i in range(size)],
+        "rows": rows,
+        "json_values": response_dicts + plans,
+        "json_strings": [json.dumps(v) for v in response_dicts + plans],
+        "contexts": contexts,
+        "trend_updates": [(s, rng.uniform(20, 80), s["last_at"] + 7 * 86400) for s in trend_states],
+        "trend_states": trend_states,
+    }
+
+
+def benchmarks(inputs: Dict[str, List[Any]]) -> List[Tuple[str, Callable[[Any], Any], List[Any]]]:
+    """
+    (name, function of one input, inputs) for every benchmark.
+    """
+    agent = AIRecoveryAgent()
+    return [
+        ("scoring.normalize_work_hours", BurnoutScoringEngine.normalize_work_hours, inputs["work_hours"]),
+        ("scoring.normalize_sleep_duration", BurnoutScoringEngine.normalize_sleep_duration, inputs["sleep_hours"]),
+        ("scoring.normalize_screen_time", BurnoutScoringEngine.normalize_screen_time, inputs["screen_hours"]),
+        ("scoring.calculate_score", BurnoutScoringEngine.calculate_score, inputs["responses"]),
+        ("classification.classify", BurnoutClassifier.classify, inputs["scores"]),
+        ("database.row_to_dict", row_to_dict, inputs["rows"]),
+        ("assessment_responses.to_dict", AssessmentResponses.to_dict, inputs["rows"]),
+        ("database.dict_to_json", dict_to_json, inputs["json_values"]),
+        ("database.json_to_dict", json_to_dict, inputs["json_strings"]),
+        ("ai_agent._build_prompt", agent._build_prompt, inputs["contexts"]),
+        ("trends.update", lambda args: TrendEngine.update(*args), inputs["trend_updates"]),
+        ("adaptive.analyze_trend", lambda state: AdaptiveFollowUp.analyze_trend(state, state["last_score"]),
+         inputs["trend_states"]),
+    ]
+
+
+def _loop(fn: Callable[[Any], Any], values: List[Any], loops: int) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(loops):
+        for value in values:
+            fn(value)
+    return time.perf_counter_ns() - start
+
+
+def _noop(value: Any) -> Any:
+    return value
+
+
+def measure_time(fn: Callable[[Any], Any], values: List[Any], min_time: float, repeat: int) -> Dict[str, float]:
+    """
+    Time fn over the inputs; ns/op is the median round minus the cost of calling a no-op.
+    """
+    # Calibrate loops so that one round takes at least min_time
+    loops = 1
+    while _loop(fn, values, loops) < min_time * 1e9:
+        loops *= 2
+
+    ops = loops * len(values)
+    rounds = [_loop(fn, values, loops) / ops for _ in range(repeat)]
+    overhead = min(_loop(_noop, values, loops) / ops for _ in range(repeat))
+    median = statistics.median(rounds)
+    return {
+        "ns_per_op": round(max(0.0, median - overhead), 1),
+        "ns_per_op_min": round(max(0.0, min(rounds) - overhead), 1),
+        "stdev_pct": round(100 * statistics.pstdev(rounds) / median, 1) if median else 0.0,
+        "ops_per_round": ops,
+    }
+
+
+def measure_allocations(fn: Callable[[Any], Any], values: List[Any]) -> Dict[str, float]:
+    """
+    Average peak and retained traced memory per call.
+    """
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for value in values:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            result = fn(value)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+            del result
+    finally:
+        tracemalloc.stop()
+    return {
+        "alloc_peak_bytes": round(sum(peaks) / len(peaks), 1),
+        "alloc_retained_bytes": round(sum(retained) / len(retained), 1),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history() -> List[Dict[str, Any]]:
+    if not os.path.exists(HISTORY_PATH):
+        return []
+    with open(HISTORY_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def find_reference(history: List[Dict[str, Any]], label: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Latest run with the given label, or the latest run when no label is given."""
+    for run in reversed(history):
+        if label is None or run.get("label") == label:
+            return run
+    return None
+
+
+def print_report(results: Dict[str, Dict[str, float]], reference: Optional[Dict[str, Any]]):
+    ref_results = reference["results"] if reference else {}
+    if reference:
+        print(f"Compared with run '{reference.get('label') or '-'}' ({reference['timestamp']}, "
+              f"commit {reference.get('git_commit') or '-'})")
+    print(f"{'benchmark':<36}{'ns/op':>11}{'±%':>7}{'peak B':>10}{'kept B':>9}{'ref ns/op':>11}{'delta':>9}")
+    for name, r in results.items():
+        ref = ref_results.get(name)
+        ref_ns = f"{ref['ns_per_op']:.1f}" if ref else "-"
+        delta = f"{100 * (r['ns_per_op'] / ref['ns_per_op'] - 1):+.1f}%" if ref and ref["ns_per_op"] else "-"
+        print(f"{name:<36}{r['ns_per_op']:>11.1f}{r['stdev_pct']:>7.1f}{r['alloc_peak_bytes']:>10.0f}"
+              f"{r['alloc_retained_bytes']:>9.0f}{ref_ns:>11}{delta:>9}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Hot-path micro-benchmarks")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per round")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed rounds per benchmark")
+    parser.add_argument("--label", help="Label stored with this run, e.g. a branch or change name")
+    parser.add_argument("--compare", help="Compare with the latest run with this label (default: latest run)")
+    parser.add_argument("--no-save", action="store_true", help="Do not append this run to the history")
+    args = parser.parse_args(argv)
+
+    inputs = build_inputs(args.seed)
+    results = {}
+    for name, fn, values in benchmarks(inputs):
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = {**measure_time(fn, values, args.min_time, args.repeat), **measure_allocations(fn, values)}
+
+    history = load_history()
+    print_report(results, find_reference(history, args.compare))
+
+    if not args.no_save:
+        history.append({
+            "label": args.label,
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "seed": args.seed,
+            "results": results,
+        })
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        with open(HISTORY_PATH, "w", encoding="utf-8") as f:
+            json.dump(history, f, indent=2)
+        print(f"Saved to {HISTORY_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Storage and scan cost of assessment responses: JSON document vs typed columns.
+
+Fills a throwaway SQLite database with perf.datagen (or uses --database-url),
+reverts migration 0008 to get the JSON layout back, measures it, re-applies
+0008 and measures again:
+- size of the assessments table and its indexes, after VACUUM
+- median time of queries that read the answers of many rows: an aggregate
+  over every row, an unindexed filter and a page of full rows converted to
+  API dicts
+
+Use a copy, never production: the migration is reverted while it runs.
+
+Usage (from the backend directory):
+    python -m perf.response_storage --users 5000
+    python -m perf.response_storage --database-url postgresql://postgres@localhost/burnout_perf
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+TYPED_VERSION = 8
+
+
+def answer(layout: str, is_postgres: bool, field: str) -> str:
+    """SQL expression reading one answer in the given layout ("json" or "typed")."""
+    if layout == "typed":
+        return field
+    if is_postgres:
+        return f"(responses->>'{field}')::float8"
+    return f"json_extract(responses, '$.{field}')"
+
+
+def build_queries(layout: str, is_postgres: bool) -> Dict[str, str]:
+    """Scan queries for a layout; the page query takes a LIMIT parameter."""
+    placeholder = "%s" if is_postgres else "?"
+    hours = ", ".join(
+        f"AVG({answer(layout, is_postgres, field)})" for field in ("daily_work_hours", "sleep_duration", "screen_time")
+    )
+    return {
+        "aggregate (AVG hours by stage)": f"SELECT burnout_stage, {hours} FROM assessments GROUP BY burnout_stage",
+        "filter (screen_time > 10)":
+            f"SELECT COUNT(*) FROM assessments WHERE {answer(layout, is_postgres, 'screen_time')} > 10",
+        "page of rows as dicts":
+            f"SELECT * FROM assessments ORDER BY assessment_id DESC LIMIT {placeholder}",
+    }
+
+
+def table_bytes(is_postgres: bool) -> int:
+    """Size of the assessments table and its indexes, after reclaiming free space."""
+    from app.database import get_connection
+
+    conn = get_connection()
+    try:
+        if is_postgres:
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute("VACUUM FULL ANALYZE assessments")
+            cursor.execute("SELECT SUM(pg_total_relation_size(relid)) FROM pg_partition_tree('assessments')")
+        else:
+            conn.isolation_level = None
+            cursor = conn.cursor()
+            cursor.execute("VACUUM")
+            cursor.execute(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                "(SELECT name FROM sqlite_master WHERE tbl_name = 'assessments')"
+            )
+        return int(cursor.fetchone()[0])
+    finally:
+        conn.close()
+
+
+def time_query(sql: str, params: tuple, convert: Callable[[Any], Any], repeat: int) -> float:
+    """Median milliseconds to execute, fetch and convert every row, on one connection."""
+    from app.database import get_connection
+
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            cursor.execute(sql, params)
+            for row in cursor.fetchall():
+                convert(row)
+            timings.append((time.perf_counter() - start) * 1000)
+        return round(statistics.median(timings), 3)
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def capture(layout: str, is_postgres: bool, page: int, repeat: int) -> Dict[str, Any]:
+    from app.database import row_to_dict
+    from app.services.assessment_responses import AssessmentResponses
+
+    if layout == "typed":
+        to_dict = AssessmentResponses.to_dict
+    else:
+        def to_dict(row):
+            return row_to_dict(row, json_fields=["responses"])
+
+    timings = {}
+    for name, sql in build_queries(layout, is_postgres).items():
+        if sql.endswith("LIMIT %s") or sql.endswith("LIMIT ?"):
+            timings[name] = time_query(sql, (page,), to_dict, repeat)
+        else:
+            timings[name] = time_query(sql, (), lambda row: row, repeat)
+    return {"bytes": table_bytes(is_postgres), "timings": timings}
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Assessment response storage: JSON document vs typed columns")
+    parser.add_argument("--database-url", help="Database to use (default: throwaway SQLite filled by perf.datagen)")
+    parser.add_argument("--users", type=int, default=5000, help="Users generated for the throwaway database")
+    parser.add_argument("--page", type=int, default=1000, help="Rows in the page-of-rows query")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed executions per query")
+    args = parser.parse_args(argv)
+
+    tmp = None
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp.name, 'responses.db')}"
+        from perf import datagen
+        datagen.main(["--users", str(args.users), "--workers", "1"])
+
+    # Imported after DATABASE_URL is set, since app.database reads it at import time
+    from app.database import execute_query, init_db, IS_POSTGRES
+    from app.migrations.runner import MigrationRunner
+
+    init_db()
+    MigrationRunner.upgrade()
+    rows = execute_query("SELECT COUNT(*) AS n FROM assessments", fetch_one=True, name="response_storage.count")["n"]
+    if not rows:
+        print("No assessments in the database; nothing to measure")
+        return 1
+
+    try:
+        MigrationRunner.downgrade(TYPED_VERSION - 1)
+        before = capture("json", IS_POSTGRES, args.page, args.repeat)
+    finally:
+        MigrationRunner.upgrade()
+    after = capture("typed", IS_POSTGRES, args.page, args.repeat)
+
+    print(f"{rows} assessments ({'PostgreSQL' if IS_POSTGRES else 'SQLite'})\n")
+    print(f"{'':<34}{'JSON':>12}{'typed':>12}{'change':>9}")
+    b, a = before["bytes"], after["bytes"]
+    print(f"{'table + indexes (bytes)':<34}{b:>12}{a:>12}{(a - b) / b * 100:>8.0f}%")
+    print(f"{'bytes per row':<34}{b / rows:>12.1f}{a / rows:>12.1f}")
+    for name, ms in before["timings"].items():
+        typed_ms = after["timings"][name]
+        speedup = f"{ms / typed_ms:.1f}x" if typed_ms else "-"
+        print(f"{name + ' (ms)':<34}{ms:>12.3f}{typed_ms:>12.3f}{speedup:>9}")
+
+    if tmp:
+        tmp.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
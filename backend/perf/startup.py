@@ -0,0 +1,127 @@
+"""
+Cold-start profile of the API.
+
+Boots the app in fresh interpreter processes against a throwaway SQLite
+database and reports the startup profiler's phase timings. The first boot
+applies the schema; later boots find its checksum recorded and skip the DDL.
+With --importtime the slowest imports (python -X importtime) are listed too.
+
+Usage (from the backend directory):
+    python -m perf.startup
+    python -m perf.startup --runs 5 --importtime 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs the same startup handlers uvicorn would, then prints the report
+BOOT_SNIPPET = """
+import asyncio, json
+from app.main import app
+from app.services.startup_profile import StartupProfiler
+asyncio.run(app.router.startup())
+print("STARTUP_REPORT " + json.dumps(StartupProfiler.report(), default=str))
+"""
+
+
+def boot(env: Dict[str, str], importtime: bool = False) -> Dict[str, Any]:
+    """
+    Boot the app once in a new process.
+
+    Returns:
+        Startup report, plus the raw importtime lines when requested
+    """
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", BOOT_SNIPPET]
+    proc = subprocess.run(cmd, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Boot failed:\n{proc.stderr[-2000:]}")
+
+    report = None
+    for line in proc.stdout.splitlines():
+        if line.startswith("STARTUP_REPORT "):
+            report = json.loads(line[len("STARTUP_REPORT "):])
+    if report is None:
+        raise RuntimeError("Boot did not print a startup report")
+    if importtime:
+        report["importtime"] = [l for l in proc.stderr.splitlines() if l.startswith("import time:")]
+    return report
+
+
+def slowest_imports(lines: List[str], limit: int) -> List[Dict[str, Any]]:
+    """
+    Top-level packages by cumulative import time.
+    """
+    packages = {}
+    for line in lines:
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        # A package's own line has the largest cumulative time of its modules
+        package = parts[2].strip().split(".")[0]
+        cumulative = int(parts[1])
+        packages[package] = max(packages.get(package, 0), cumulative)
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)
+    return [{"package": name, "cumulative_ms": round(us / 1000, 1)} for name, us in ranked[:limit]]
+
+
+def summarize(reports: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Median duration of each phase across reports, in first-seen order."""
+    durations: Dict[str, List[float]] = {}
+    for report in reports:
+        for phase in report["phases"]:
+            durations.setdefault(phase["phase"], []).append(phase["duration_ms"])
+        durations.setdefault("total", []).append(report["total_ms"])
+    return {phase: {"median_ms": round(statistics.median(values), 1), "max_ms": max(values)}
+            for phase, values in durations.items()}
+
+
+def print_summary(title: str, summary: Dict[str, Dict[str, float]]):
+    print(title)
+    print(f"  {'phase':<24}{'median ms':>11}{'max ms':>10}")
+    for phase, stats in summary.items():
+        print(f"  {phase:<24}{stats['median_ms']:>11.1f}{stats['max_ms']:>10.1f}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Cold-start profile of the API")
+    parser.add_argument("--runs", type=int, default=3, help="Warm-schema boots after the first boot")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N",
+                        help="Also list the N slowest top-level imports")
+    parser.add_argument("--json", action="store_true", help="Print the raw reports as JSON")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+        env.pop("METRICS_MULTIPROC_DIR", None)
+        env.pop("SCHEMA_FORCE_INIT", None)
+
+        first = boot(env)
+        warm = [boot(env, importtime=bool(args.importtime) and i == 0) for i in range(args.runs)]
+
+    if args.json:
+        print(json.dumps({"first_boot": first, "warm_boots": warm}, indent=2, default=str))
+        return 0
+
+    print_summary("First boot (schema applied)", summarize([first]))
+    if warm:
+        print_summary(f"Later boots (schema checksum matched, {len(warm)} runs)", summarize(warm))
+        if args.importtime:
+            print("Slowest imports (cumulative)")
+            for entry in slowest_imports(warm[0].pop("importtime"), args.importtime):
+                print(f"  {entry['package']:<32}{entry['cumulative_ms']:>10.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,9 @@
+"""
+ASGI entry point for load tests: the real application with a stubbed LLM.
+Run with `uvicorn perf.stub_app:app` from the backend directory.
+"""
+from perf.stub_llm import install
+
+install()
+
+from app.main import app  # noqa: E402
@@ -0,0 +1,60 @@
+"""
+Deterministic stand-in for the Gemini client.
+Replaces AIRecoveryAgent._get_gemini_client with a model that sleeps for a
+fixed latency and returns a valid plan, so load tests exercise the full LLM
+path (prompt building, parsing, accounting) without network calls or quota.
+"""
+import json
+import os
+import re
+import time
+
+from app.services.ai_agent import AIRecoveryAgent
+
+STUB_PLAN = {
+    "daily_actions": ["Take a 10-minute break every 90 minutes", "Stop screens 1 hour before bed"],
+    "weekly_goals": ["Plan two evenings without work", "Walk outdoors three times"],
+    "behavioral_suggestions": ["Batch notifications into set times", "Set a fixed end to the workday"],
+    "caution_notes": ["Consult a healthcare professional if symptoms persist"],
+    "disclaimer": "This is not medical advice.",
+}
+
+
+_PROFILE_LABEL = re.compile(r'^PROFILE "([^"]+)":', re.MULTILINE)
+
+
+class _StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+        self.usage_metadata = None
+
+
+class StubModel:
+    """
+    Minimal GenerativeModel replacement.
+    """
+
+    def __init__(self, latency_ms: float):
+        self.latency_ms = latency_ms
+
+    def generate_content(self, prompt, generation_config=None):
+        time.sleep(self.latency_ms / 1000.0)
+        labels = _PROFILE_LABEL.findall(prompt)
+        if labels:
+            # Batch prompts expect one plan per profile label
+            return _StubResponse(json.dumps({label: STUB_PLAN for label in labels}))
+        return _StubResponse(json.dumps(STUB_PLAN))
+
+
+def install(latency_ms: float = None):
+    """
+    Route all LLM calls to StubModel.
+
+    Args:
+        latency_ms: Simulated LLM latency (default: LOADTEST_LLM_LATENCY_MS or 50)
+    """
+    if latency_ms is None:
+        latency_ms = float(os.getenv("LOADTEST_LLM_LATENCY_MS", "50"))
+    model = StubModel(latency_ms)
+    os.environ.setdefault("GOOGLE_GEMINI_API_KEY", "stub")
+    AIRecoveryAgent._get_gemini_client = lambda self, system_instruction=None: model
@@ -0,0 +1,22 @@
+"""
+Shared fixtures: a throwaway SQLite database, configured before the app is imported.
+"""
+import os
+import tempfile
+
+_DB_DIR = tempfile.mkdtemp(prefix="burnout-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ.setdefault("SHARED_CACHE_ENABLED", "false")
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Apply the schema and migrations once per test session."""
+    from app.database import init_db
+    from app.migrations.runner import MigrationRunner
+
+    init_db()
+    MigrationRunner.upgrade()
+    yield
@@ -0,0 +1,79 @@
+"""
+TrendEngine: the vectorized recompute and the backdated-score rebuild must
+match folding each user's history in order.
+"""
+import random
+
+import pytest
+
+from app.database import get_db
+from app.services.trends import SECONDS_PER_DAY, STATE_COLUMNS, TrendEngine, epoch_seconds
+
+
+def random_rows(rng: random.Random, users: int):
+    """(user_id, epoch, score) rows ordered by user and time, with repeats and ties."""
+    rows = []
+    for user_id in range(1, users + 1):
+        at = 1.7e9 + rng.uniform(0, 30) * SECONDS_PER_DAY
+        for _ in range(rng.randint(1, 25)):
+            at += rng.choice([0.0, 3600.0, rng.uniform(0, 14) * SECONDS_PER_DAY])
+            # Coarse scores give flat steps and long streaks, fine ones cross STREAK_MIN_CHANGE
+            score = float(rng.choice([50, 55, 60])) if rng.random() < 0.4 else round(rng.uniform(0, 100), 1)
+            rows.append((user_id, at, score))
+    return rows
+
+
+def assert_states_equal(expected, actual):
+    for column in STATE_COLUMNS:
+        if isinstance(expected[column], float):
+            assert actual[column] == pytest.approx(expected[column], rel=1e-9, abs=1e-6), column
+        else:
+            assert actual[column] == expected[column], column
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_numpy_states_match_fold(seed):
+    pytest.importorskip("numpy")
+    rows = random_rows(random.Random(seed), users=200)
+
+    expected = TrendEngine._states_python(rows)
+    actual = TrendEngine._states_numpy(rows)
+
+    assert actual.keys() == expected.keys()
+    for user_id, state in expected.items():
+        assert_states_equal(state, actual[user_id])
+
+
+def test_observe_in_rebuilds_on_backdated_score(database):
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO users (name, age_range, occupation_type) VALUES (?, ?, ?)",
+            ("Trend Test", "26-35", "student")
+        )
+        user_id = cursor.lastrowid
+
+    def add_progress(score, timestamp):
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(
+                "INSERT INTO progress (user_id, weekly_score, timestamp) VALUES (?, ?, ?)",
+                (user_id, score, timestamp)
+            )
+            return TrendEngine.observe_in(cursor, user_id, "progress", score, timestamp)
+
+    history = [(40.0, "2026-01-01 09:00:00"), (55.0, "2026-01-08 09:00:00"), (70.0, "2026-01-15 09:00:00")]
+    for score, timestamp in history:
+        state = add_progress(score, timestamp)
+    # Arrives last but happened between the first two
+    backdated = (30.0, "2026-01-04 09:00:00")
+    state = add_progress(*backdated)
+
+    ordered = sorted(history + [backdated], key=lambda point: point[1])
+    expected = TrendEngine.fold([(score, epoch_seconds(timestamp)) for score, timestamp in ordered])
+    assert_states_equal(expected, state)
+    assert state["observations"] == 4
+    assert state["last_score"] == 70.0
+    assert state["previous_score"] == 55.0
+
@@ -18,6 +18,15 @@ const api = axios.create({
   },
 });
 
+// Identify the current user so rate limits apply per user rather than per network address
+api.interceptors.request.use((config) => {
+  const userId = localStorage.getItem('userId');
+  if (userId) {
+    config.headers['X-User-Id'] = userId;
+  }
+  return config;
+});
+
 // User endpoints
 export const createUser = async (userData) => {
   try {